@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import desc, func
 from sqlalchemy.orm import Session
 
+from app.api.routes.videos import build_hls_url, build_media_urls
 from app.core.security import get_current_user
 from app.db import models
 from app.db.database import get_db
@@ -16,7 +17,7 @@ router = APIRouter()
 
 
 @router.get("/videos", response_model=List[PublicVideoResponse], status_code=status.HTTP_200_OK)
-async def list_public_videos(
+def list_public_videos(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(50, ge=1, le=100, description="Max records to return"),
     db: Session = Depends(get_db),
@@ -47,7 +48,8 @@ async def list_public_videos(
                 "player_name": f"{video.user.first_name} {video.user.last_name}",
                 "city": video.user.city,
                 "country": video.user.country,
-                "processed_url": f"https://anb.com/videos/processed/{video.id}.mp4",
+                **build_media_urls(video, "https://anb.com/videos/processed"),
+                "hls_url": build_hls_url(video, "https://anb.com/videos/processed"),
                 "votes": video.vote_count,
                 "uploaded_at": video.created_at,
             }
@@ -57,7 +59,7 @@ async def list_public_videos(
 
 
 @router.post("/videos/{video_id}/vote", response_model=VoteResponse, status_code=status.HTTP_200_OK)
-async def vote_for_video(
+def vote_for_video(
     video_id: str,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
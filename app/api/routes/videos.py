@@ -1,32 +1,111 @@
 """Video endpoints for ANB Rising Stars Showcase"""
 
-from typing import List
+import os
+from typing import Callable, List, Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
 
+from app.core.concurrency import run_blocking
 from app.core.config import settings
 from app.core.security import get_current_user
-from app.core.storage import storage
+from app.core.storage import (
+    HashingReader,
+    SizeLimitedReader,
+    StorageSizeLimitError,
+    StorageUploadError,
+    StorageWriteReceipt,
+    storage,
+)
 from app.db import models
 from app.db.database import get_db
-from app.schemas.video import VideoDeleteResponse, VideoDetailResponse, VideoUploadResponse
-from app.services.queue import sqs_service
+from app.schemas.video import (
+    VideoDeleteResponse,
+    VideoDetailResponse,
+    VideoUploadResponse,
+    VideoUploadURLRequest,
+    VideoUploadURLResponse,
+)
+from app.services.outbox import add_processing_message, outbox_dispatcher
+from app.services.queue import BULK, NORMAL, PRIORITY
 
 router = APIRouter()
 
 
+def _store_upload(file: UploadFile, file_path: str) -> StorageWriteReceipt:
+    """
+    Stream an uploaded file to storage without loading it into memory.
+
+    The write is verified from the backend's receipt (bytes stored vs. bytes
+    read, plus Content-MD5/fsync when STORAGE_VERIFY_WRITES is on) instead of
+    an extra existence check against storage. The content is hashed on the
+    way through.
+
+    Returns:
+        Write receipt for the stored file, with its sha256
+
+    Raises:
+        StorageSizeLimitError: If the upload grows past MAX_VIDEO_SIZE
+        StorageUploadError: If the receipt does not match what was read
+    """
+    file.file.seek(0)
+    reader = SizeLimitedReader(file.file, settings.MAX_VIDEO_SIZE)
+    hashing = HashingReader(reader)
+    try:
+        receipt = storage.upload_fileobj(hashing, file_path)
+    except StorageSizeLimitError:
+        storage.delete_file(file_path)
+        raise
+
+    if receipt.size != reader.bytes_read:
+        storage.delete_file(file_path)
+        raise StorageUploadError(
+            f"File was not saved properly: stored {receipt.size} of {reader.bytes_read} bytes"
+        )
+    receipt.sha256 = hashing.hexdigest()
+    return receipt
+
+
+def _lock_content(db: Session, sha256: str) -> None:
+    """
+    Serialize the uploads and deletes of one content-addressed original
+
+    Takes a transaction-level advisory lock, released by the session's next
+    commit or rollback. A delete then can't remove the file while an identical
+    upload is saving a video that points at it.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": int(sha256[:15], 16)})
+
+
+def _deduplicate_upload(db: Session, file_path: str, sha256: str) -> str:
+    """
+    Move a stored upload to its content address, or drop it if that file is stored already
+
+    Locks the content (see _lock_content) until the caller commits the video.
+
+    Returns:
+        The content-addressed path the video should use as its original
+    """
+    _lock_content(db, sha256)
+    content_path = _content_path(sha256)
+    storage.move_file_if_absent(file_path, content_path)
+    return content_path
+
+
 @router.post("/upload", response_model=VideoUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_video(
     title: str = Form(...),
     file: UploadFile = File(...),
+    bulk: bool = Form(False),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     Allow users to upload videos
 
-    Starts the async processing of the video
+    Starts the async processing of the video. Batch imports can set bulk to
+    queue it in the bulk lane, behind interactive uploads (see _processing_lane).
     """
 
     # Validate video file existence
@@ -46,65 +125,284 @@ async def upload_video(
         )
 
     new_video_id = models.generate_uuid()
+    video_file_path, processed_file_path = _build_storage_paths(new_video_id)
 
-    # Build storage paths based on backend (S3 or local)
-    if settings.STORAGE_BACKEND == "s3":
-        video_file_path = f"{settings.S3_UPLOAD_PREFIX}{new_video_id}.mp4"
-        processed_file_path = f"{settings.S3_PROCESSED_PREFIX}{new_video_id}.mp4"
-    else:
-        video_file_path = f"{settings.UPLOAD_BASE_DIR}/{new_video_id}.mp4"
-        processed_file_path = f"{settings.PROCESSED_BASE_DIR}/{new_video_id}.mp4"
+    # Stream the file to the storage backend (local or S3) in fixed-size chunks,
+    # enforcing the size limit as bytes arrive instead of reading it whole.
+    # Blocking storage, DB and SQS calls run on the bounded I/O pool so the event
+    # loop keeps serving other requests meanwhile.
+    try:
+        sha256 = (await run_blocking(_store_upload, file, video_file_path)).sha256
+        if settings.DEDUPLICATE_UPLOADS:
+            video_file_path = await run_blocking(_deduplicate_upload, db, video_file_path, sha256)
+    except StorageSizeLimitError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="File size exceeds limit"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save uploaded file: {str(e)}",
+        )
 
-    # Create database record
+    # Create database record once the file is safely stored
     video = models.Video(
         id=new_video_id,
         user_id=current_user.id,
         title=title,
         original_file_path=video_file_path,
         processed_file_path=processed_file_path,
+        source_sha256=sha256,
     )
+    await run_blocking(_save_video, db, video, bulk)
 
-    db.add(video)
-    db.commit()
-    db.refresh(video)
-
-    # Upload file using storage backend (local or S3)
-    try:
-        # Reset file pointer to beginning
-        file.file.seek(0)
-        # Read the entire content into memory
-        content = file.file.read()
+    return {
+        "video_id": new_video_id,
+        "user_id": str(current_user.id),
+    }
 
-        # Upload using storage backend
-        storage.upload_file(content, video_file_path)
 
-        # Verify upload
-        if not storage.file_exists(video_file_path):
-            raise FileNotFoundError("File was not saved properly")
+@router.post(
+    "/upload-url", response_model=VideoUploadURLResponse, status_code=status.HTTP_201_CREATED
+)
+def create_upload_url(
+    data: VideoUploadURLRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Step 1 of a direct upload: reserve a video and get a presigned S3 form.
 
-    except Exception as e:
+    The client POSTs the file straight to S3 with the returned url and fields,
+    so upload bytes never pass through nginx or the API workers. Then it calls
+    POST /{video_id}/complete-upload to start processing.
+    """
+    if settings.STORAGE_BACKEND != "s3":
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to save uploaded file: {str(e)}",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Direct uploads are only available with S3 storage",
         )
 
-    # Send message to SQS for asynchronous video processing (Entrega 4)
+    new_video_id = models.generate_uuid()
+    video_file_path, processed_file_path = _build_storage_paths(new_video_id)
+
     try:
-        sqs_service.send_message(
-            video_id=new_video_id, metadata={"title": title, "user_id": str(current_user.id)}
+        presigned = storage.get_presigned_upload(
+            video_file_path,
+            max_size=settings.MAX_VIDEO_SIZE,
+            expiration=settings.S3_PRESIGNED_UPLOAD_EXPIRATION,
         )
     except Exception as e:
-        # If SQS fails, we still have the video uploaded but not queued for processing
-        # Log the error but don't fail the upload
-        print(f"Warning: Failed to queue video for processing: {e}")
-        # In production, you might want to retry or alert
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create upload URL: {str(e)}",
+        )
+
+    video = models.Video(
+        id=new_video_id,
+        user_id=current_user.id,
+        title=data.title,
+        original_file_path=video_file_path,
+        processed_file_path=processed_file_path,
+        status="awaiting_upload",
+    )
+    db.add(video)
+    db.commit()
 
     return {
         "video_id": new_video_id,
-        "user_id": str(current_user.id),
+        "upload_url": presigned["url"],
+        "fields": presigned["fields"],
+        "expires_in": settings.S3_PRESIGNED_UPLOAD_EXPIRATION,
+    }
+
+
+@router.post(
+    "/{video_id}/complete-upload",
+    response_model=VideoUploadResponse,
+    status_code=status.HTTP_200_OK,
+)
+def complete_upload(
+    video_id: str,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Step 2 of a direct upload: confirm the object landed in S3 and enqueue it.
+
+    Returns:
+        200: Upload confirmed and queued for processing
+        403: User is not the video owner
+        404: Video not found
+        409: Video is not awaiting an upload, or the file is not in storage yet
+    """
+    video = db.query(models.Video).filter(models.Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Video not found")
+
+    if video.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Forbidden: this video does not belong to you",
+        )
+
+    if video.status != "awaiting_upload":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Video upload was already completed"
+        )
+
+    if not storage.file_exists(video.original_file_path):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Uploaded file not found in storage"
+        )
+
+    # Status change and processing message commit together (transactional outbox)
+    video.status = "pending"
+    message = add_processing_message(db, video, _processing_lane(db, video))
+    db.commit()
+    outbox_dispatcher.dispatch(message)
+
+    return {"video_id": str(video.id), "user_id": str(current_user.id)}
+
+
+def _processing_lane(db: Session, video: models.Video, bulk: bool = False) -> str:
+    """
+    Queue lane for a video's processing message
+
+    A user's first video goes to the priority lane, so new users see a result
+    quickly however long the queue is. Videos of users who already have
+    BULK_LANE_BACKLOG videos waiting, or uploaded with bulk, go to the bulk
+    lane; everything else is normal.
+    """
+    if bulk:
+        return BULK
+
+    counts = dict(
+        db.query(models.Video.status, func.count(models.Video.id))
+        .filter(models.Video.user_id == video.user_id, models.Video.id != video.id)
+        .group_by(models.Video.status)
+        .all()
+    )
+    if not counts:
+        return PRIORITY
+    if counts.get("pending", 0) + counts.get("processing", 0) >= settings.BULK_LANE_BACKLOG:
+        return BULK
+    return NORMAL
+
+
+def _save_video(db: Session, video: models.Video, bulk: bool = False) -> None:
+    """
+    Persist a new video record and its processing message in one transaction
+
+    The message is handed to the batch dispatcher after the commit (the outbox
+    relay retries it if that fails), so queue outages or latency never affect
+    the upload response and no video is left pending without a message.
+    """
+    db.add(video)
+    message = add_processing_message(db, video, _processing_lane(db, video, bulk))
+    db.commit()
+    db.refresh(video)
+    outbox_dispatcher.dispatch(message)
+
+
+def _build_storage_paths(video_id: str) -> tuple[str, str]:
+    """Build original and processed storage paths based on backend (S3 or local)"""
+    if settings.STORAGE_BACKEND == "s3":
+        return (
+            f"{settings.S3_UPLOAD_PREFIX}{video_id}.mp4",
+            f"{settings.S3_PROCESSED_PREFIX}{video_id}.mp4",
+        )
+    return (
+        f"{settings.UPLOAD_BASE_DIR}/{video_id}.mp4",
+        f"{settings.PROCESSED_BASE_DIR}/{video_id}.mp4",
+    )
+
+
+def local_url(base: str) -> Callable[[str], str]:
+    """URL builder for local storage: files are served from base by file name"""
+    return lambda path: f"{base}/{os.path.basename(path)}"
+
+
+def _content_path(sha256: str) -> str:
+    """Content address of an upload: identical files share one stored original"""
+    if settings.STORAGE_BACKEND == "s3":
+        return f"{settings.S3_UPLOAD_PREFIX}{sha256}.mp4"
+    return f"{settings.UPLOAD_BASE_DIR}/{sha256}.mp4"
+
+
+def build_renditions(video: models.Video, url_for: Callable[[str], str]) -> List[dict]:
+    """ABR ladder of a processed video with a URL per rendition (empty for single-output videos)"""
+    return [
+        {
+            "height": rendition["height"],
+            "width": rendition["width"],
+            "bandwidth": rendition["bandwidth"],
+            "url": url_for(rendition["path"]),
+        }
+        for rendition in video.renditions or []
+    ]
+
+
+def build_previews(video: models.Video, url_for: Callable[[str], str]) -> dict:
+    """poster_url and sprite (with its URL) of a processed video, None when not produced"""
+    sprite = None
+    if video.sprite:
+        sprite = {key: value for key, value in video.sprite.items() if key != "path"}
+        sprite["url"] = url_for(video.sprite["path"])
+    return {
+        "poster_url": url_for(video.poster_path) if video.poster_path else None,
+        "sprite": sprite,
     }
 
 
+def build_hls_url(video: models.Video, local_base: str) -> Optional[str]:
+    """
+    URL of the video's HLS master playlist, if it was packaged
+
+    Playlists reference their segments relatively, so on S3 they are served
+    from HLS_BASE_URL (a CDN or public origin in front of the bucket); a
+    presigned playlist URL would not cover its segments.
+    """
+    path = video.hls_playlist_path
+    if not path:
+        return None
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.HLS_BASE_URL:
+            return None
+        return f"{settings.HLS_BASE_URL.rstrip('/')}/{path}"
+    package, playlist = os.path.split(path)
+    return f"{local_base}/{os.path.basename(package)}/{playlist}"
+
+
+def _presigned_url(path: str) -> str:
+    return storage.get_presigned_url(path, expiration=3600)
+
+
+def media_url(local_base: str) -> Callable[[str], str]:
+    """URL builder for the storage backend: presigned on S3, local_url(local_base) otherwise"""
+    if settings.STORAGE_BACKEND == "s3":
+        return _presigned_url
+    return local_url(local_base)
+
+
+def build_media_urls(video: models.Video, local_base: str) -> dict:
+    """
+    processed_url, renditions, poster_url and sprite of a processed video (see media_url)
+
+    A failed presign leaves them empty instead of failing the response.
+    """
+    url_for = media_url(local_base)
+    try:
+        return {
+            "processed_url": url_for(video.processed_file_path),
+            "renditions": build_renditions(video, url_for),
+            **build_previews(video, url_for),
+        }
+    except Exception as e:
+        print(f"Error generating presigned URL: {e}")
+        return {"processed_url": None, "renditions": [], "poster_url": None, "sprite": None}
+
+
 def _build_video_data(video: models.Video) -> dict:
     """Build video data dictionary with basic info"""
     return {
@@ -121,18 +419,10 @@ def _add_processed_info(video_data: dict, video: models.Video) -> None:
     video_data["processed_at"] = (
         video.updated_at.isoformat() if hasattr(video, "updated_at") else None
     )
+    video_data["hls_url"] = build_hls_url(video, "https://anb.com/videos/processed")
 
     # Generate presigned URL for S3, or regular URL for local storage
-    if settings.STORAGE_BACKEND == "s3":
-        try:
-            video_data["processed_url"] = storage.get_presigned_url(
-                video.processed_file_path, expiration=3600
-            )
-        except Exception as e:
-            print(f"Error generating presigned URL: {e}")
-            video_data["processed_url"] = None
-    else:
-        video_data["processed_url"] = f"https://anb.com/videos/processed/{video.id}.mp4"
+    video_data.update(build_media_urls(video, "https://anb.com/videos/processed"))
 
 
 @router.get("/", response_model=List[VideoDetailResponse], status_code=status.HTTP_200_OK)
@@ -176,6 +466,8 @@ def get_video_detail(
     # Generate URLs based on storage backend
     original_url = None
     processed_url = None
+    renditions: List[dict] = []
+    previews = {"poster_url": None, "sprite": None}
 
     if settings.STORAGE_BACKEND == "s3":
         try:
@@ -186,13 +478,18 @@ def get_video_detail(
                 processed_url = storage.get_presigned_url(
                     video.processed_file_path, expiration=3600
                 )
+                renditions = build_renditions(video, _presigned_url)
+                previews = build_previews(video, _presigned_url)
         except Exception as e:
             print(f"Error generating presigned URLs: {e}")
     else:
         # Local storage URLs
-        original_url = f"https://anb.com/uploads/{video.id}.mp4"
+        original_url = local_url("https://anb.com/uploads")(video.original_file_path)
         if video.status == "processed":
-            processed_url = f"https://anb.com/processed/{video.id}.mp4"
+            url_for = local_url("https://anb.com/processed")
+            processed_url = url_for(video.processed_file_path)
+            renditions = build_renditions(video, url_for)
+            previews = build_previews(video, url_for)
 
     # Crear la respuesta
     return {
@@ -203,6 +500,13 @@ def get_video_detail(
         "processed_at": video.updated_at.isoformat() if hasattr(video, "updated_at") else None,
         "original_url": original_url,
         "processed_url": processed_url,
+        "renditions": renditions,
+        "hls_url": (
+            build_hls_url(video, "https://anb.com/processed")
+            if video.status == "processed"
+            else None
+        ),
+        **previews,
         "votes": video.vote_count,
     }
 
@@ -248,7 +552,58 @@ async def delete_video(
         403: User is not the video owner
         404: Video not found
     """
+    return await run_blocking(_delete_video, video_id, current_user, db)
+
+
+def _is_shared(db: Session, video: models.Video, column) -> bool:
+    """True if another video points at the same stored file (DEDUPLICATE_UPLOADS, output cache)"""
+    return (
+        db.query(models.Video)
+        .filter(column == getattr(video, column.key), models.Video.id != video.id)
+        .count()
+        > 0
+    )
+
+
+def _is_content_addressed(video: models.Video) -> bool:
+    """True if the video's original is stored under its SHA-256 (DEDUPLICATE_UPLOADS)"""
+    return bool(video.source_sha256) and video.original_file_path == _content_path(
+        video.source_sha256
+    )
 
+
+def _delete_processed_files(
+    video: models.Video, files_deleted: List[str], files_not_found: List[str]
+) -> None:
+    """Delete the processed file, renditions, preview images and HLS package of a video"""
+    deleted, not_found = _delete_video_file(video.processed_file_path, "processed")
+    if deleted:
+        files_deleted.append("processed")
+    if not_found:
+        files_not_found.append("processed")
+
+    # Delete extra renditions (the first entry is the processed file itself)
+    for rendition in (video.renditions or [])[1:]:
+        _delete_video_file(rendition["path"], f"{rendition['height']}p rendition")
+
+    # Delete the preview images
+    for path, file_type in (
+        (video.poster_path, "poster"),
+        ((video.sprite or {}).get("path"), "sprite"),
+    ):
+        if path:
+            _delete_video_file(path, file_type)
+
+    # Delete the HLS package (playlists and segments)
+    if video.hls_playlist_path:
+        try:
+            storage.delete_directory(os.path.dirname(video.hls_playlist_path))
+        except Exception as e:
+            print(f"Error deleting HLS package: {e}")
+
+
+def _delete_video(video_id: str, current_user: models.User, db: Session) -> dict:
+    """Blocking part of delete_video: DB checks, storage deletes and row removal"""
     # 1. Check if video exists
     video = db.query(models.Video).filter(models.Video.id == video_id).first()
 
@@ -274,19 +629,24 @@ async def delete_video(
     files_deleted = []
     files_not_found = []
 
-    # Delete original file
-    deleted, not_found = _delete_video_file(video.original_file_path, "original")
-    if deleted:
-        files_deleted.append("original")
-    if not_found:
-        files_not_found.append("original")
-
-    # Delete processed file
-    deleted, not_found = _delete_video_file(video.processed_file_path, "processed")
-    if deleted:
-        files_deleted.append("processed")
-    if not_found:
-        files_not_found.append("processed")
+    # Delete original file, unless an identical upload still uses it. The content
+    # stays locked until the commit below, so no upload can start using it meanwhile
+    if _is_content_addressed(video):
+        _lock_content(db, video.source_sha256)
+    if not _is_shared(db, video, models.Video.original_file_path):
+        deleted, not_found = _delete_video_file(video.original_file_path, "original")
+        if deleted:
+            files_deleted.append("original")
+        if not_found:
+            files_not_found.append("original")
+
+    # Outputs reused from (or by) a cache hit stay for the other videos
+    if not _is_shared(db, video, models.Video.processed_file_path):
+        _delete_processed_files(video, files_deleted, files_not_found)
+        # Don't let the cache hand the deleted outputs to a later upload
+        db.query(models.ProcessedOutput).filter(
+            models.ProcessedOutput.processed_file_path == video.processed_file_path
+        ).delete()
 
     # 6. Delete video record from database
     db.delete(video)
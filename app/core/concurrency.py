@@ -0,0 +1,37 @@
+"""Helpers to run blocking I/O from async endpoints without stalling the event loop"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Dedicated, bounded pool for blocking work (SQLAlchemy, boto3) issued from async
+# handlers. Kept separate from Starlette's default threadpool so an upload burst
+# cannot take every thread that sync endpoints such as /health rely on.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_IO_THREADS, thread_name_prefix="blocking-io"
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable on the bounded I/O pool and await its result
+
+    Args:
+        func: Synchronous function to run
+        *args, **kwargs: Arguments forwarded to func
+
+    Returns:
+        Whatever func returns (exceptions are re-raised in the caller)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Stop the blocking I/O pool (called on application shutdown)"""
+    _executor.shutdown(wait=wait)
@@ -11,6 +11,9 @@ class Settings(BaseSettings):
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api"
     MAX_VIDEO_SIZE: int = 10 * 1024 * 1024  # 10 MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1 MB read/write chunks for streamed uploads
+    # Threads available to async endpoints for blocking DB/S3/SQS calls
+    BLOCKING_IO_THREADS: int = 16
 
     # File Storage
     # Storage backend: 'local' or 's3'
@@ -22,11 +25,28 @@ class Settings(BaseSettings):
     PROCESSED_BASE_DIR: str = "/app/media/processed"
     APP_BASE_DIR: str = "/app"  # Container/EC2 working directory
 
+    # Integrity-check every write: MD5 while streaming, Content-MD5 on S3 PUTs/parts
+    # and fsync on local disk. Uploads are verified from the write receipt either way.
+    STORAGE_VERIFY_WRITES: bool = False
+    # Store uploads under their SHA-256 (<hash>.mp4 in the upload directory)
+    # so identical files are kept once
+    DEDUPLICATE_UPLOADS: bool = True
+    # Reuse the outputs already made from the same source (SHA-256) with the
+    # same processing parameters instead of transcoding again (see app.worker.cache)
+    PROCESSED_OUTPUT_CACHE: bool = True
+
     # AWS S3 Configuration (uses IAM Role by default, no keys needed)
     AWS_S3_BUCKET: str = ""  # Set in production
     AWS_REGION: str = "us-east-1"
     S3_UPLOAD_PREFIX: str = "uploads/"
     S3_PROCESSED_PREFIX: str = "processed/"
+    # Objects at or above the threshold are sent as multipart uploads whose parts
+    # are transferred in parallel (S3 requires parts of at least 5 MB)
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024  # 8 MB
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024  # 8 MB
+    S3_MULTIPART_CONCURRENCY: int = 4
+    # Lifetime of presigned POST forms for direct-to-S3 uploads
+    S3_PRESIGNED_UPLOAD_EXPIRATION: int = 15 * 60  # 15 minutes
 
     # Database
     DATABASE_URL: str
@@ -36,8 +56,83 @@ class Settings(BaseSettings):
     DB_POOL_RECYCLE: int = 3600
 
     # SQS Configuration (Entrega 4 - replaces Celery/Redis)
-    SQS_QUEUE_URL: str = ""  # Main processing queue URL
+    SQS_QUEUE_URL: str = ""  # Main processing queue URL (the normal lane)
     SQS_DLQ_URL: str = ""  # Dead Letter Queue URL
+    # Processing lanes: queues of the priority and bulk lanes (empty = use the
+    # normal queue) and how often workers serve each lane relative to the others
+    SQS_PRIORITY_QUEUE_URL: str = ""
+    SQS_BULK_QUEUE_URL: str = ""
+    SQS_LANE_WEIGHTS: str = "priority=6,normal=3,bulk=1"
+    # A user's first video goes to the priority lane; uploads of users with this
+    # many videos already waiting for processing go to the bulk lane
+    BULK_LANE_BACKLOG: int = 5
+    # Max time a message waits in SQSBatchProducer for a batch to fill up
+    SQS_BATCH_LINGER_MS: int = 20
+
+    # Videos transcoded in parallel per worker (0 = one per available CPU)
+    WORKER_CONCURRENCY: int = 0
+    # "pool": each pool process fetches, transcodes and publishes a video in turn;
+    # "pipeline": separate fetch/transcode/publish stages overlap consecutive videos
+    WORKER_MODE: str = "pool"
+    PIPELINE_FETCH_THREADS: int = 1  # Concurrent source downloads in pipeline mode
+    PIPELINE_PUBLISH_THREADS: int = 1  # Concurrent output uploads in pipeline mode
+    PIPELINE_QUEUE_SIZE: int = 1  # Videos waiting between two stages
+    PIPELINE_STATS_INTERVAL: int = 300  # Seconds between per-stage throughput logs
+    # Transcoding engine: "ffmpeg" (single-pass filter graph) or "moviepy" (legacy)
+    TRANSCODER_ENGINE: str = "ffmpeg"
+    FFMPEG_BINARY: str = ""  # Empty = IMAGEIO_FFMPEG_EXE, PATH, then imageio-ffmpeg's binary
+    FFMPEG_THREADS: int = 0  # 0 = let ffmpeg decide
+    # Encoding profile: "fast", "balanced" or "archival" (messages may override it
+    # with metadata.encoding_profile)
+    ENCODING_PROFILE: str = "balanced"
+    # Extra, smaller renditions written from the same decode, e.g. "360,480" (the
+    # 720p output is always the top rendition); empty = a single output
+    OUTPUT_RENDITIONS: str = ""
+    # Segment processed videos into HLS (playlist + segments next to the MP4)
+    HLS_PACKAGING: bool = False
+    HLS_SEGMENT_SECONDS: int = 4
+    # Public origin (e.g. a CDN) serving processed files; needed for S3 playlist URLs
+    # because presigned playlists can't sign their segment URIs
+    HLS_BASE_URL: str = ""
+    # Poster frame and thumbnail sprite sheet, from the same decode as the video
+    PREVIEW_IMAGES: bool = True
+    PREVIEW_FORMAT: str = "jpg"  # "jpg" or "webp"
+    POSTER_SECONDS: float = 1  # Poster frame time; the first frame on shorter videos
+    SPRITE_INTERVAL: float = 2  # Seconds between sprite thumbnails
+    SPRITE_COLUMNS: int = 5
+    SPRITE_THUMBNAIL_HEIGHT: int = 90
+    TRANSCODE_TIMEOUT: int = 15 * 60  # Kill an ffmpeg run after 15 minutes
+    WATERMARK_FONT: str = ""  # TrueType font path; empty = Pillow's bundled font
+    WATERMARK_CACHE_DIR: str = ""  # Rendered watermark PNGs; empty = <tmp>/watermarks
+    # Storage prefix to share rendered watermarks across workers (empty = don't share)
+    WATERMARK_STORAGE_PREFIX: str = ""
+    # Fetch only the bytes of an S3 source needed for the first max_duration seconds
+    SOURCE_RANGE_READS: bool = True
+    SOURCE_PROBE_BYTES: int = 64 * 1024  # First ranged read, usually enough to find moov
+    # Scratch space for S3 staging files; point it at a tmpfs or instance-local disk
+    WORKER_SCRATCH_DIR: str = ""  # Empty = <tmp>/video-worker
+    WORKER_SCRATCH_JOB_BYTES: int = 256 * 1024 * 1024  # Disk one job may need (source + output)
+    WORKER_SCRATCH_RESERVE: int = 256 * 1024 * 1024  # Free space always left on the filesystem
+    WORKER_SCRATCH_QUOTA: int = 0  # Max bytes under WORKER_SCRATCH_DIR (0 = no quota)
+    # Visibility heartbeat: every interval, in-flight messages are made invisible
+    # for another SQS_VISIBILITY_EXTENSION seconds, for up to SQS_HEARTBEAT_MAX_AGE
+    SQS_HEARTBEAT_INTERVAL: int = 60
+    SQS_VISIBILITY_EXTENSION: int = 300
+    SQS_HEARTBEAT_MAX_AGE: int = 6 * 60 * 60  # Give up on hung transcodes after 6 hours
+    # Processing lease on the video row, renewed by the same heartbeat. Keep it
+    # above SQS_HEARTBEAT_INTERVAL and below SQS_VISIBILITY_EXTENSION, so the
+    # lease of a crashed worker has expired by the time its message reappears
+    VIDEO_LEASE_SECONDS: int = 180
+
+    # Transactional outbox relay (publishes processing messages written with the video)
+    OUTBOX_RELAY_ENABLED: bool = True  # Run the relay inside each API process
+    OUTBOX_POLL_INTERVAL: float = 1.0  # Seconds between polls when the outbox is drained
+    OUTBOX_BATCH_SIZE: int = 10  # Rows per SendMessageBatch call (SQS maximum is 10)
+    OUTBOX_MAX_BACKOFF: int = 300  # Upper bound in seconds for retry backoff
+    # Publish new rows right after commit through SQSBatchProducer; the relay only
+    # picks a row up if it is still unpublished after this many seconds
+    OUTBOX_DISPATCH_ENABLED: bool = True
+    OUTBOX_DISPATCH_GRACE: int = 10
 
     # JWT Security
     SECRET_KEY: str
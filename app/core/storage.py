@@ -1,12 +1,22 @@
 """Storage abstraction layer for local and S3 storage"""
 
+import base64
+import hashlib
+import io
+import logging
 import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
 
 import boto3
 from botocore.exceptions import ClientError
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class StorageError(Exception):
     """Base exception for storage operations"""
@@ -32,21 +42,172 @@ class StorageURLError(StorageError):
     pass
 
 
+class StorageSizeLimitError(StorageUploadError):
+    """Exception raised when a streamed upload exceeds its size limit"""
+
+    pass
+
+
+class SizeLimitedReader:
+    """
+    File-like wrapper that enforces a maximum size while the stream is consumed.
+
+    Lets storage backends read an upload chunk by chunk without knowing its
+    size beforehand, failing as soon as the limit is crossed.
+    """
+
+    def __init__(self, fileobj: BinaryIO, max_bytes: int):
+        self._fileobj = fileobj
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, raising StorageSizeLimitError past max_bytes"""
+        if size is None or size < 0:
+            # Never read more than one byte past the limit in a single call
+            size = self.max_bytes - self.bytes_read + 1
+
+        chunk = self._fileobj.read(size)
+        self.bytes_read += len(chunk)
+
+        if self.bytes_read > self.max_bytes:
+            raise StorageSizeLimitError(f"Upload exceeds maximum size of {self.max_bytes} bytes")
+
+        return chunk
+
+
+class HashingReader:
+    """
+    File-like wrapper that computes the SHA-256 of a stream as it is consumed.
+
+    Gives uploads a content address without a second pass over the data.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._fileobj.read(size)
+        self._digest.update(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        """Hex SHA-256 of everything read so far"""
+        return self._digest.hexdigest()
+
+
+@dataclass
+class StorageWriteReceipt:
+    """
+    Proof of a completed write returned by upload_fileobj.
+
+    Callers verify the upload from the receipt instead of probing storage again.
+    checksum is the hex MD5 of the content, only set when STORAGE_VERIFY_WRITES
+    is enabled (the backend then also had the write integrity-checked).
+    sha256 is set by callers that hashed the stream (see HashingReader).
+    """
+
+    path: str
+    size: int
+    etag: Optional[str] = None
+    checksum: Optional[str] = None
+    sha256: Optional[str] = None
+
+
+def _md5(data: bytes = b""):
+    """MD5 used as a transfer checksum (not for security)"""
+    return hashlib.md5(data, usedforsecurity=False)
+
+
+def _read_full(fileobj: BinaryIO, size: int) -> bytes:
+    """Read exactly size bytes unless EOF comes first (streams may return short reads)"""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = fileobj.read(size - len(buffer))
+        if not chunk:
+            break
+        buffer += chunk
+    return bytes(buffer)
+
+
+def _iter_parts(fileobj: BinaryIO, part_size: int, initial: bytes = b"") -> Iterator[bytes]:
+    """Split a stream (preceded by already-read bytes) into part_size chunks"""
+    buffer = bytearray(initial)
+    while True:
+        if len(buffer) < part_size:
+            buffer += _read_full(fileobj, part_size - len(buffer))
+        if not buffer:
+            return
+        yield bytes(buffer[:part_size])
+        del buffer[:part_size]
+
+
 class StorageBackend:
-    """Abstract storage backend"""
+    """
+    Abstract storage backend
+
+    The stream methods (upload_fileobj, download_fileobj, iter_file) are the
+    primitives; the bytes-based methods are thin wrappers kept for callers
+    that already hold small payloads in memory.
+    """
 
     def upload_file(self, file_data: bytes, file_path: str) -> str:
         """Upload file and return the storage path"""
+        return self.upload_fileobj(io.BytesIO(file_data), file_path).path
+
+    def upload_fileobj(self, fileobj: BinaryIO, file_path: str) -> StorageWriteReceipt:
+        """Upload a file-like object in chunks and return a write receipt"""
         raise NotImplementedError
 
     def download_file(self, file_path: str) -> bytes:
         """Download file and return bytes"""
+        buffer = io.BytesIO()
+        self.download_fileobj(file_path, buffer)
+        return buffer.getvalue()
+
+    def download_fileobj(self, file_path: str, fileobj: BinaryIO) -> None:
+        """Download file into a writable file-like object in chunks"""
+        raise NotImplementedError
+
+    def iter_file(self, file_path: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the file contents in chunks of at most chunk_size bytes"""
+        raise NotImplementedError
+
+    def read_range(self, file_path: str, offset: int, length: int) -> bytes:
+        """Read up to length bytes starting at offset (fewer at end of file)"""
+        raise NotImplementedError
+
+    def download_range_fileobj(
+        self, file_path: str, offset: int, length: int, fileobj: BinaryIO
+    ) -> int:
+        """Stream up to length bytes starting at offset into fileobj; return bytes written"""
+        raise NotImplementedError
+
+    def get_file_size(self, file_path: str) -> int:
+        """Size of the stored file in bytes"""
         raise NotImplementedError
 
     def delete_file(self, file_path: str) -> bool:
         """Delete file, return True if successful"""
         raise NotImplementedError
 
+    def delete_directory(self, directory: str) -> int:
+        """Delete every file under directory (an S3 key prefix), return how many were deleted"""
+        raise NotImplementedError
+
+    def move_file_if_absent(self, source_path: str, destination_path: str) -> bool:
+        """
+        Move a stored file to destination_path unless a file is already there
+
+        The check and the write are one atomic operation, and the destination
+        never shows a partial file. The source is removed either way.
+
+        Returns:
+            True if the file was moved, False if destination_path already existed
+        """
+        raise NotImplementedError
+
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists"""
         raise NotImplementedError
@@ -59,21 +220,72 @@ class StorageBackend:
 class LocalStorage(StorageBackend):
     """Local filesystem storage"""
 
-    def upload_file(self, file_data: bytes, file_path: str) -> str:
-        """Upload file to local filesystem"""
-        # Ensure directory exists
+    def upload_fileobj(self, fileobj: BinaryIO, file_path: str) -> StorageWriteReceipt:
+        """
+        Copy a file-like object to the local filesystem in chunks.
+
+        With STORAGE_VERIFY_WRITES the content is hashed while copying and
+        fsync'ed before returning, so the receipt reflects durable data.
+        """
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        digest = _md5() if settings.STORAGE_VERIFY_WRITES else None
+        size = 0
+
+        try:
+            with open(file_path, "wb") as f:
+                while chunk := fileobj.read(settings.UPLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                if digest is not None:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            # Don't leave a truncated file behind
+            self.delete_file(file_path)
+            raise
 
-        # Write file
-        with open(file_path, "wb") as f:
-            f.write(file_data)
+        return StorageWriteReceipt(
+            path=file_path, size=size, checksum=digest.hexdigest() if digest else None
+        )
 
-        return file_path
+    def download_fileobj(self, file_path: str, fileobj: BinaryIO) -> None:
+        """Copy a local file into a writable file-like object in chunks"""
+        with open(file_path, "rb") as f:
+            shutil.copyfileobj(f, fileobj, settings.UPLOAD_CHUNK_SIZE)
 
-    def download_file(self, file_path: str) -> bytes:
-        """Download file from local filesystem"""
+    def iter_file(self, file_path: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield a local file in chunks"""
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
         with open(file_path, "rb") as f:
-            return f.read()
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def read_range(self, file_path: str, offset: int, length: int) -> bytes:
+        """Read a byte range of a local file"""
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def download_range_fileobj(
+        self, file_path: str, offset: int, length: int, fileobj: BinaryIO
+    ) -> int:
+        """Copy a byte range of a local file into fileobj in chunks"""
+        written = 0
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            while written < length:
+                chunk = f.read(min(settings.UPLOAD_CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                fileobj.write(chunk)
+                written += len(chunk)
+        return written
+
+    def get_file_size(self, file_path: str) -> int:
+        """Size of a local file"""
+        return os.path.getsize(file_path)
 
     def delete_file(self, file_path: str) -> bool:
         """Delete file from local filesystem"""
@@ -85,6 +297,25 @@ class LocalStorage(StorageBackend):
         except Exception:
             return False
 
+    def move_file_if_absent(self, source_path: str, destination_path: str) -> bool:
+        """Hard-link the file to its new path (fails if it exists), then unlink the old one"""
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        try:
+            os.link(source_path, destination_path)
+            moved = True
+        except FileExistsError:
+            moved = False
+        os.remove(source_path)
+        return moved
+
+    def delete_directory(self, directory: str) -> int:
+        """Delete a directory tree from the local filesystem"""
+        if not os.path.isdir(directory):
+            return 0
+        count = sum(len(files) for _, _, files in os.walk(directory))
+        shutil.rmtree(directory, ignore_errors=True)
+        return count
+
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists in local filesystem"""
         return os.path.exists(file_path)
@@ -102,7 +333,7 @@ class S3Storage(StorageBackend):
         # Boto3 automatically uses IAM Role from EC2 instance metadata
         # For LocalStack, use AWS_ENDPOINT_URL from environment
         endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        
+
         if endpoint_url:
             # LocalStack mode
             self.s3_client = boto3.client(
@@ -115,23 +346,137 @@ class S3Storage(StorageBackend):
         else:
             # Production mode - use IAM Role
             self.s3_client = boto3.client("s3", region_name=settings.AWS_REGION)
-        
+
         self.bucket = settings.AWS_S3_BUCKET
 
     def upload_file(self, file_data: bytes, file_path: str) -> str:
         """Upload file to S3"""
+        if len(file_data) >= settings.S3_MULTIPART_THRESHOLD:
+            return self.upload_fileobj(io.BytesIO(file_data), file_path).path
+        return self._put_object(file_data, file_path).path
+
+    def upload_fileobj(self, fileobj: BinaryIO, file_path: str) -> StorageWriteReceipt:
+        """
+        Stream a file-like object to S3 without buffering it whole in memory.
+
+        Reads up to S3_MULTIPART_THRESHOLD bytes first: smaller objects go out
+        in a single PUT, larger ones switch to a parallel multipart upload.
+        """
+        head = _read_full(fileobj, settings.S3_MULTIPART_THRESHOLD)
+        if len(head) < settings.S3_MULTIPART_THRESHOLD:
+            return self._put_object(head, file_path)
+
+        return self._multipart_upload(
+            _iter_parts(fileobj, settings.S3_MULTIPART_PART_SIZE, head), file_path
+        )
+
+    def _put_object(self, data: bytes, file_path: str) -> StorageWriteReceipt:
+        """Upload in a single PUT (S3 checks Content-MD5 when verifying writes)"""
+        extra_args: Dict[str, str] = {}
+        checksum = None
+        if settings.STORAGE_VERIFY_WRITES:
+            digest = _md5(data)
+            checksum = digest.hexdigest()
+            extra_args["ContentMD5"] = base64.b64encode(digest.digest()).decode()
+
         try:
             # Use the file_path as the S3 key (already includes prefix)
-            self.s3_client.put_object(
+            response = self.s3_client.put_object(
                 Bucket=self.bucket,
                 Key=file_path,
-                Body=file_data,
+                Body=data,
                 ContentType=self._get_content_type(file_path),
+                **extra_args,
             )
-            return file_path
         except ClientError as e:
             raise StorageUploadError(f"Failed to upload to S3: {str(e)}")
 
+        return StorageWriteReceipt(
+            path=file_path, size=len(data), etag=response.get("ETag"), checksum=checksum
+        )
+
+    def _multipart_upload(self, parts: Iterator[bytes], file_path: str) -> StorageWriteReceipt:
+        """
+        Upload parts concurrently on a bounded thread pool.
+
+        At most S3_MULTIPART_CONCURRENCY parts are held in memory at a time.
+        Any failure aborts the multipart upload so no orphaned parts are billed.
+        """
+        try:
+            upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=file_path,
+                ContentType=self._get_content_type(file_path),
+            )["UploadId"]
+        except ClientError as e:
+            raise StorageUploadError(f"Failed to upload to S3: {str(e)}")
+
+        concurrency = max(1, settings.S3_MULTIPART_CONCURRENCY)
+        completed: List[Dict] = []
+        digest = _md5() if settings.STORAGE_VERIFY_WRITES else None
+        size = 0
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix="s3-multipart"
+            ) as pool:
+                in_flight = set()
+                for part_number, data in enumerate(parts, start=1):
+                    if len(in_flight) >= concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        completed.extend(future.result() for future in done)
+                    size += len(data)
+                    if digest is not None:
+                        digest.update(data)
+                    in_flight.add(
+                        pool.submit(self._upload_part, file_path, upload_id, part_number, data)
+                    )
+                completed.extend(future.result() for future in in_flight)
+
+            response = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=file_path,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(completed, key=lambda p: p["PartNumber"])},
+            )
+        except Exception as e:
+            self._abort_multipart_upload(file_path, upload_id)
+            if isinstance(e, ClientError):
+                raise StorageUploadError(f"Failed to upload to S3: {str(e)}")
+            raise
+
+        return StorageWriteReceipt(
+            path=file_path,
+            size=size,
+            etag=response.get("ETag"),
+            checksum=digest.hexdigest() if digest else None,
+        )
+
+    def _upload_part(self, file_path: str, upload_id: str, part_number: int, data: bytes) -> Dict:
+        """Upload a single part (Content-MD5 checked when verifying) and return its entry"""
+        extra_args: Dict[str, str] = {}
+        if settings.STORAGE_VERIFY_WRITES:
+            extra_args["ContentMD5"] = base64.b64encode(_md5(data).digest()).decode()
+
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=file_path,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+            **extra_args,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def _abort_multipart_upload(self, file_path: str, upload_id: str) -> None:
+        """Abort a multipart upload, logging (not raising) if the abort fails"""
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=file_path, UploadId=upload_id
+            )
+        except ClientError as e:
+            logger.error(f"Failed to abort multipart upload {upload_id} for {file_path}: {e}")
+
     def download_file(self, file_path: str) -> bytes:
         """Download file from S3"""
         try:
@@ -140,6 +485,69 @@ class S3Storage(StorageBackend):
         except ClientError as e:
             raise StorageDownloadError(f"Failed to download from S3: {str(e)}")
 
+    def download_fileobj(self, file_path: str, fileobj: BinaryIO) -> None:
+        """Stream an S3 object into a writable file-like object"""
+        try:
+            self.s3_client.download_fileobj(self.bucket, file_path, fileobj)
+        except ClientError as e:
+            raise StorageDownloadError(f"Failed to download from S3: {str(e)}")
+
+    def iter_file(self, file_path: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield an S3 object in chunks straight from the response body"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=file_path)
+        except ClientError as e:
+            raise StorageDownloadError(f"Failed to download from S3: {str(e)}")
+
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size or settings.UPLOAD_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def read_range(self, file_path: str, offset: int, length: int) -> bytes:
+        """Read a byte range of an S3 object with a ranged GET"""
+        if length <= 0:
+            return b""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=file_path, Range=f"bytes={offset}-{offset + length - 1}"
+            )
+            return response["Body"].read()
+        except ClientError as e:
+            raise StorageDownloadError(f"Failed to read range from S3: {str(e)}")
+
+    def download_range_fileobj(
+        self, file_path: str, offset: int, length: int, fileobj: BinaryIO
+    ) -> int:
+        """Stream a ranged GET body into fileobj without buffering the range"""
+        if length <= 0:
+            return 0
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=file_path, Range=f"bytes={offset}-{offset + length - 1}"
+            )
+        except ClientError as e:
+            raise StorageDownloadError(f"Failed to read range from S3: {str(e)}")
+
+        body = response["Body"]
+        written = 0
+        try:
+            for chunk in body.iter_chunks(settings.UPLOAD_CHUNK_SIZE):
+                fileobj.write(chunk)
+                written += len(chunk)
+        finally:
+            body.close()
+        return written
+
+    def get_file_size(self, file_path: str) -> int:
+        """Size of an S3 object (HeadObject)"""
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket, Key=file_path)
+            return response["ContentLength"]
+        except ClientError as e:
+            raise StorageDownloadError(f"Failed to get object size from S3: {str(e)}")
+
     def delete_file(self, file_path: str) -> bool:
         """Delete file from S3"""
         try:
@@ -148,6 +556,46 @@ class S3Storage(StorageBackend):
         except ClientError:
             return False
 
+    def move_file_if_absent(self, source_path: str, destination_path: str) -> bool:
+        """Conditional server-side copy (If-None-Match: *, up to 5 GB), then delete the source"""
+        try:
+            self.s3_client.copy_object(
+                Bucket=self.bucket,
+                Key=destination_path,
+                CopySource={"Bucket": self.bucket, "Key": source_path},
+                IfNoneMatch="*",
+            )
+            moved = True
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in (
+                "PreconditionFailed",
+                "ConditionalRequestConflict",
+            ):
+                raise StorageError(f"Failed to move {source_path} in S3: {str(e)}")
+            moved = False
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=source_path)
+        except ClientError as e:
+            raise StorageError(f"Failed to delete {source_path} from S3: {str(e)}")
+        return moved
+
+    def delete_directory(self, directory: str) -> int:
+        """Delete every object under the directory/ key prefix"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        deleted = 0
+        try:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=directory.rstrip("/") + "/"):
+                keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+                if keys:
+                    # A listing page holds at most 1000 keys, the DeleteObjects limit
+                    self.s3_client.delete_objects(
+                        Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True}
+                    )
+                    deleted += len(keys)
+        except ClientError as e:
+            raise StorageError(f"Failed to delete {directory} from S3: {str(e)}")
+        return deleted
+
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists in S3"""
         try:
@@ -172,6 +620,34 @@ class S3Storage(StorageBackend):
         except ClientError as e:
             raise StorageURLError(f"Failed to generate presigned URL: {str(e)}")
 
+    def get_presigned_upload(
+        self, file_path: str, max_size: int, expiration: int = 900
+    ) -> Dict[str, Any]:
+        """
+        Generate a presigned POST form so clients can upload straight to S3.
+
+        S3 enforces the size limit (content-length-range) and a video/* content
+        type, so oversized or non-video uploads never reach the bucket. The
+        fields carry the Content-Type of file_path's extension, so a form posted
+        as returned satisfies the policy.
+
+        Returns:
+            dict with the form "url" and the "fields" to send along with the file
+        """
+        try:
+            return self.s3_client.generate_presigned_post(
+                Bucket=self.bucket,
+                Key=file_path,
+                Fields={"Content-Type": self._get_content_type(file_path)},
+                Conditions=[
+                    ["content-length-range", 1, max_size],
+                    ["starts-with", "$Content-Type", "video/"],
+                ],
+                ExpiresIn=expiration,
+            )
+        except ClientError as e:
+            raise StorageURLError(f"Failed to generate presigned upload: {str(e)}")
+
     def _get_content_type(self, file_path: str) -> str:
         """Determine content type based on file extension"""
         ext = os.path.splitext(file_path)[1].lower()
@@ -182,6 +658,9 @@ class S3Storage(StorageBackend):
             ".jpg": "image/jpeg",
             ".jpeg": "image/jpeg",
             ".png": "image/png",
+            ".webp": "image/webp",
+            ".m3u8": "application/vnd.apple.mpegurl",
+            ".ts": "video/mp2t",
         }
         return content_types.get(ext, "application/octet-stream")
 
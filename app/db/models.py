@@ -4,7 +4,19 @@ import uuid
 from datetime import datetime
 
 import bcrypt
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, UniqueConstraint
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
@@ -69,13 +81,36 @@ class Video(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     user = relationship("User", back_populates="videos")
     votes = relationship("Vote", back_populates="video", cascade="all, delete-orphan")
+    outbox_messages = relationship(
+        "OutboxMessage", back_populates="video", cascade="all, delete-orphan"
+    )
 
     title = Column(String, nullable=False)
     original_file_path = Column(String, nullable=False)
     processed_file_path = Column(String, nullable=False)
-    # pending, processing, completed, failed
+    # awaiting_upload (direct uploads only), pending, processing, completed, failed
     status = Column(String, nullable=False, default="pending")
+    # Processing lease of the worker handling the video (see app.worker.lease)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
     is_published = Column(Boolean, nullable=False, default=False)
+    # SHA-256 of the uploaded file (None = not hashed, e.g. direct uploads)
+    source_sha256 = Column(String(64), nullable=True, index=True)
+    # Bytes of the original read from storage by the worker (None = read locally)
+    source_bytes_read = Column(BigInteger, nullable=True)
+    # How the worker produced the output (full, overlay, copy) and the CPU it took
+    transcode_strategy = Column(String, nullable=True)
+    transcode_cpu_seconds = Column(Float, nullable=True)
+    # ABR ladder, top rendition first: [{"height", "width", "bandwidth", "path"}, ...]
+    # (None = only processed_file_path was produced)
+    renditions = Column(JSON, nullable=True)
+    # HLS master playlist next to the MP4 (None = not packaged)
+    hls_playlist_path = Column(String, nullable=True)
+    # Preview images next to the MP4 (None = not produced); the sprite sheet is
+    # {"path", "interval", "columns", "rows", "width", "height"}, width and
+    # height being those of one thumbnail
+    poster_path = Column(String, nullable=True)
+    sprite = Column(JSON, nullable=True)
 
     @hybrid_property
     def vote_count(self):
@@ -104,3 +139,59 @@ class Vote(Base):
 
     def __repr__(self):
         return f"<Vote user={self.user_id} video={self.video_id}>"
+
+
+class OutboxMessage(Base):
+    """
+    Transactional outbox - processing messages waiting to be published to SQS
+
+    Rows are written in the same transaction as the video change that produces
+    them and published later by the outbox relay, so a queue outage can delay
+    processing but never lose it.
+    """
+
+    __tablename__ = "outbox_messages"
+
+    video_id = Column(UUID(as_uuid=True), ForeignKey("videos.id"), nullable=False, index=True)
+    video = relationship("Video", back_populates="outbox_messages")
+
+    # JSON message body, exactly as it will be sent to the queue
+    payload = Column(Text, nullable=False)
+    # Processing lane whose queue the message goes to (None = normal)
+    lane = Column(String(16), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    published_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(String, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxMessage video={self.video_id} published={self.published_at is not None}>"
+
+
+class ProcessedOutput(Base):
+    """
+    Derived-artifact cache: the outputs one pipeline version made from one source
+
+    Keyed by the source's SHA-256 and a hash of every processing parameter
+    (see app.worker.cache.pipeline_version), so a changed parameter or a
+    bumped OUTPUT_FORMAT_VERSION simply misses, while entries of other
+    versions stay valid.
+    """
+
+    __tablename__ = "processed_outputs"
+
+    source_sha256 = Column(String(64), nullable=False)
+    pipeline_version = Column(String(64), nullable=False)
+    # Same meaning as the Video columns of the same name
+    processed_file_path = Column(String, nullable=False, index=True)
+    renditions = Column(JSON, nullable=True)
+    hls_playlist_path = Column(String, nullable=True)
+    poster_path = Column(String, nullable=True)
+    sprite = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("source_sha256", "pipeline_version", name="uq_processed_output_key"),
+    )
+
+    def __repr__(self):
+        return f"<ProcessedOutput {self.source_sha256[:12]} {self.pipeline_version[:12]}>"
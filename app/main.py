@@ -12,9 +12,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 
 from app.api.routes import auth, health, public, videos
+from app.core.concurrency import shutdown_executor
 from app.core.config import settings
 from app.db.base import Base
 from app.db.database import engine
+from app.services.outbox import OutboxRelay, outbox_dispatcher
 
 
 @asynccontextmanager
@@ -29,7 +31,17 @@ async def lifespan(app: FastAPI):  # pragma: no cover
         finally:
             conn.execute(text("SELECT pg_advisory_unlock(123456789)"))
             conn.commit()
+
+    relay = OutboxRelay()
+    if settings.OUTBOX_RELAY_ENABLED:
+        relay.start()
+    if settings.OUTBOX_DISPATCH_ENABLED:
+        outbox_dispatcher.start()
     yield
+    # Flush batched messages before the relay stops
+    outbox_dispatcher.close()
+    relay.stop()
+    shutdown_executor()
 
 
 app = FastAPI(
@@ -1,6 +1,6 @@
 """Video schemas"""
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -18,6 +18,41 @@ class VideoUploadResponse(BaseModel):
     user_id: str
 
 
+class VideoUploadURLRequest(BaseModel):
+    """Schema for requesting a direct-to-storage upload"""
+
+    title: str = Field(..., min_length=1)
+
+
+class VideoUploadURLResponse(BaseModel):
+    """Presigned form the client must POST the file to"""
+
+    video_id: str
+    upload_url: str
+    fields: Dict[str, str]
+    expires_in: int
+
+
+class RenditionResponse(BaseModel):
+    """One rendition of a processed video, for clients choosing a bitrate"""
+
+    height: int
+    width: Optional[int] = None
+    bandwidth: int = Field(..., description="Average bitrate in bits per second")
+    url: Optional[str] = None
+
+
+class SpriteResponse(BaseModel):
+    """Thumbnail sprite sheet: a columns x rows grid, one thumbnail every interval seconds"""
+
+    url: Optional[str] = None
+    interval: float
+    columns: int
+    rows: int
+    width: int = Field(..., description="Width of one thumbnail in pixels")
+    height: int = Field(..., description="Height of one thumbnail in pixels")
+
+
 class VideoDetailResponse(BaseModel):
     """Full video information"""
 
@@ -28,6 +63,11 @@ class VideoDetailResponse(BaseModel):
     processed_at: Optional[str] = None
     original_url: Optional[str] = None
     processed_url: Optional[str] = None
+    # Top rendition first; empty when only processed_url was produced
+    renditions: List[RenditionResponse] = []
+    hls_url: Optional[str] = None  # HLS master playlist, when the video was packaged
+    poster_url: Optional[str] = None
+    sprite: Optional[SpriteResponse] = None
     votes: Optional[int] = 0
 
 
@@ -1,9 +1,11 @@
 """Vote schemas"""
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
+from app.schemas.video import RenditionResponse, SpriteResponse
+
 
 class VoteResponse(BaseModel):
     """Response after voting"""
@@ -22,6 +24,11 @@ class PublicVideoResponse(BaseModel):
     city: str
     country: str
     processed_url: str
+    # Top rendition first; empty when only processed_url was produced
+    renditions: List[RenditionResponse] = []
+    hls_url: Optional[str] = None  # HLS master playlist, when the video was packaged
+    poster_url: Optional[str] = None
+    sprite: Optional[SpriteResponse] = None
     votes: int
     uploaded_at: datetime
 
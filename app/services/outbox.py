@@ -0,0 +1,237 @@
+"""Transactional outbox relay - publishes pending outbox rows to SQS"""
+
+import logging
+import threading
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import OutboxMessage, Video
+from app.services.queue import SQSBatchProducer, SQSService, sqs_service
+
+logger = logging.getLogger(__name__)
+
+
+def add_processing_message(db: Session, video: Video, lane: Optional[str] = None) -> OutboxMessage:
+    """
+    Stage a processing message for a video in the caller's transaction
+
+    lane picks the queue it is published to (None = normal, see SQSService).
+
+    Nothing is sent here: the row becomes visible to the relay only when the
+    caller commits, together with the video change that produced it. Pass the
+    committed row to outbox_dispatcher.dispatch() to publish it right away.
+    """
+    message = OutboxMessage(
+        video=video,
+        payload=SQSService.build_message_body(
+            str(video.id), {"title": video.title, "user_id": str(video.user_id)}
+        ),
+        lane=lane,
+    )
+    if outbox_dispatcher.running:
+        # Give the dispatcher a head start so the relay doesn't send it a second time
+        message.next_attempt_at = datetime.utcnow() + timedelta(
+            seconds=settings.OUTBOX_DISPATCH_GRACE
+        )
+    db.add(message)
+    return message
+
+
+class OutboxDispatcher:
+    """
+    Publishes freshly committed outbox rows without waiting for the relay poll
+
+    Rows go through an SQSBatchProducer, so concurrent uploads share
+    SendMessageBatch calls. A row is marked published once SQS accepts it;
+    anything that fails is left for the relay to retry after the grace period.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._producer: Optional[SQSBatchProducer] = None
+
+    @property
+    def running(self) -> bool:
+        return self._producer is not None
+
+    def start(self, producer: Optional[SQSBatchProducer] = None) -> None:
+        """Start dispatching (until then dispatch() is a no-op)"""
+        self._producer = producer or SQSBatchProducer()
+
+    def close(self) -> None:
+        """Flush buffered messages and stop dispatching"""
+        producer, self._producer = self._producer, None
+        if producer:
+            producer.close()
+
+    def dispatch(self, message: OutboxMessage) -> None:
+        """Hand a committed outbox row to the batch producer"""
+        producer = self._producer
+        if producer is None:
+            return
+        message_id = message.id
+        try:
+            future = producer.submit(str(message.video_id), body=message.payload, lane=message.lane)
+        except RuntimeError:
+            return  # Shutting down; the relay will pick the row up
+        future.add_done_callback(lambda f: self._mark_published(message_id, f))
+
+    def _mark_published(self, message_id: uuid.UUID, future: Future) -> None:
+        """Record a successful send; failures stay pending for the relay"""
+        if future.cancelled() or future.exception() is not None:
+            logger.warning(
+                f"Outbox message {message_id} not sent, leaving it to the relay: "
+                f"{None if future.cancelled() else future.exception()}"
+            )
+            return
+
+        db = self.session_factory()
+        try:
+            db.query(OutboxMessage).filter(
+                OutboxMessage.id == message_id, OutboxMessage.published_at.is_(None)
+            ).update({OutboxMessage.published_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to mark outbox message {message_id} as published: {e}")
+        finally:
+            db.close()
+
+
+class OutboxRelay:
+    """
+    Polls the outbox and publishes pending rows in SendMessageBatch calls
+
+    Rows are locked with FOR UPDATE SKIP LOCKED, so several relays (one per
+    API task) can run side by side without sending the same row twice.
+    Failed entries are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        queue: Optional[SQSService] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.session_factory = session_factory
+        self.queue = queue or sqs_service
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def relay_once(self) -> int:
+        """
+        Publish one batch of due outbox rows
+
+        Returns:
+            Number of rows published
+        """
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            rows = (
+                db.query(OutboxMessage)
+                .filter(OutboxMessage.published_at.is_(None))
+                .filter(OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not rows:
+                db.commit()
+                return 0
+
+            entries = {row.id.hex: row for row in rows}
+            result = self.queue.send_message_batch(
+                [
+                    {
+                        "id": entry_id,
+                        "video_id": str(row.video_id),
+                        "body": row.payload,
+                        "lane": row.lane,
+                    }
+                    for entry_id, row in entries.items()
+                ]
+            )
+
+            for entry_id in result["successful"]:
+                entries[entry_id].published_at = now
+            for entry_id, error in result["failed"].items():
+                row = entries[entry_id]
+                row.attempts += 1
+                row.last_error = error[:500]
+                row.next_attempt_at = now + timedelta(seconds=self._backoff(row.attempts))
+                logger.warning(
+                    f"Outbox message for video {row.video_id} failed "
+                    f"(attempt {row.attempts}): {error}"
+                )
+
+            db.commit()
+            return len(result["successful"])
+
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def run(self) -> None:
+        """Relay until stop() is called; drains back-to-back while batches are full"""
+        logger.info("Outbox relay started")
+        while not self._stop.is_set():
+            try:
+                published = self.relay_once()
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}", exc_info=True)
+                published = 0
+
+            if published < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        logger.info("Outbox relay stopped")
+
+    def start(self) -> None:
+        """Run the relay on a background daemon thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop the background thread, letting an in-flight batch finish"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @staticmethod
+    def _backoff(attempts: int) -> int:
+        """Seconds to wait before retrying after the given number of attempts"""
+        return min(2**attempts, settings.OUTBOX_MAX_BACKOFF)
+
+
+# Singleton instance, started by the API lifespan
+outbox_dispatcher = OutboxDispatcher()
+
+
+def main():  # pragma: no cover
+    """Run the relay as a standalone process"""
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    relay = OutboxRelay()
+    try:
+        relay.run()
+    except KeyboardInterrupt:
+        relay.stop()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
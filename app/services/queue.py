@@ -1,9 +1,14 @@
 """SQS Queue Service for video processing - Entrega 4"""
 
+import itertools
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
@@ -12,9 +17,94 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# SendMessageBatch accepts at most 10 entries per call
+SQS_MAX_BATCH_SIZE = 10
+
+# Processing lanes, each backed by its own queue (see SQSService.lane_urls)
+PRIORITY = "priority"
+NORMAL = "normal"
+BULK = "bulk"
+LANES = (PRIORITY, NORMAL, BULK)
+
+# Receipt handles of messages from extra lanes remembered per service; far more
+# than a worker ever has in flight, so only abandoned handles are evicted
+_MAX_TRACKED_HANDLES = 10_000
+
+
+def parse_lane_weights(value: str) -> Dict[str, int]:
+    """
+    Parse SQS_LANE_WEIGHTS ("priority=6,normal=3,bulk=1") into {lane: weight}
+
+    Lanes left out get a weight of 1.
+
+    Raises:
+        ValueError: If a lane is unknown or a weight is not a positive integer
+    """
+    weights = dict.fromkeys(LANES, 1)
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        lane, _, weight = item.partition("=")
+        lane = lane.strip()
+        if lane not in LANES:
+            raise ValueError(f"Unknown processing lane: {lane}")
+        weights[lane] = int(weight)
+        if weights[lane] <= 0:
+            raise ValueError(f"Invalid weight for lane {lane}: {weight.strip()}")
+    return weights
+
+
+class LaneScheduler:
+    """
+    Smooth weighted round robin over processing lanes
+
+    Every round each lane with messages earns its weight in credit and the
+    lane that is served pays back the total earned. With every lane busy,
+    lanes are served in proportion to their weights and interleaved (6/3/1
+    serves priority six times, normal three times and bulk once per ten
+    receives). A lane found empty earns nothing and gives up any credit it
+    has saved, so a lane that was idle for a while can't starve the others
+    when it fills up again.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = dict(weights)
+        self._credit = dict.fromkeys(self.weights, 0)
+        self._lock = threading.Lock()
+
+    def order(self) -> List[str]:
+        """Lanes in the order to try them this round, the one whose turn it is first"""
+        with self._lock:
+            return sorted(self.weights, key=lambda lane: -(self._credit[lane] + self.weights[lane]))
+
+    def record(self, served: Optional[str], idle: Iterable[str] = ()) -> None:
+        """Close a round: served delivered messages (None = no lane did), idle lanes were empty"""
+        idle = set(idle)
+        with self._lock:
+            for lane in idle:
+                self._credit[lane] = min(self._credit[lane], 0)
+            if served is None:
+                return
+            earning = [lane for lane in self.weights if lane not in idle]
+            for lane in earning:
+                self._credit[lane] += self.weights[lane]
+            self._credit[served] -= sum(self.weights[lane] for lane in earning)
+
+
+class SQSBatchEntryError(Exception):
+    """Raised (through the entry's future) when SQS rejects a batched message"""
+
 
 class SQSService:
-    """Service for interacting with AWS SQS for video processing tasks"""
+    """
+    Service for interacting with AWS SQS for video processing tasks
+
+    Messages go to one of several lanes (priority, normal, bulk), each with its
+    own queue. The normal lane is SQS_QUEUE_URL; lanes without a queue URL of
+    their own fall back to it. With more than one lane, receive_messages polls
+    them in the weighted order of a LaneScheduler. Receipt handles are mapped
+    back to their queue, so deletes and visibility changes need no lane.
+    """
 
     def __init__(self):
         """Initialize SQS client and queue configuration"""
@@ -36,11 +126,45 @@ class SQSService:
         
         self.queue_url = settings.SQS_QUEUE_URL
         self.dlq_url = settings.SQS_DLQ_URL
+        # lane -> queue URL of every lane with a queue (the normal lane always)
+        self.lane_urls = {NORMAL: self.queue_url}
+        for lane, url in (
+            (PRIORITY, settings.SQS_PRIORITY_QUEUE_URL),
+            (BULK, settings.SQS_BULK_QUEUE_URL),
+        ):
+            if url and url != self.queue_url:
+                self.lane_urls[lane] = url
+        weights = parse_lane_weights(settings.SQS_LANE_WEIGHTS)
+        self.scheduler = LaneScheduler(
+            {lane: weights[lane] for lane in LANES if lane in self.lane_urls}
+        )
+        # receipt_handle -> queue URL, for messages received from another queue than queue_url
+        self._handle_urls: "OrderedDict[str, str]" = OrderedDict()
+        self._handles_lock = threading.Lock()
 
         logger.info(f"SQS Service initialized with queue: {self.queue_url}")
 
+    def lane_url(self, lane: Optional[str] = None) -> str:
+        """Queue URL of a lane (None = normal); lanes without their own queue use the normal one"""
+        return self.lane_urls.get(lane or NORMAL, self.queue_url)
+
+    def _remember(self, receipt_handle: str, queue_url: str) -> None:
+        if queue_url == self.queue_url:
+            return
+        with self._handles_lock:
+            self._handle_urls[receipt_handle] = queue_url
+            while len(self._handle_urls) > _MAX_TRACKED_HANDLES:
+                self._handle_urls.popitem(last=False)
+
+    def _handle_url(self, receipt_handle: str, forget: bool = False) -> str:
+        """Queue a message was received from"""
+        with self._handles_lock:
+            if forget:
+                return self._handle_urls.pop(receipt_handle, self.queue_url)
+            return self._handle_urls.get(receipt_handle, self.queue_url)
+
     def send_message(
-        self, video_id: str, metadata: Optional[Dict[str, Any]] = None
+        self, video_id: str, metadata: Optional[Dict[str, Any]] = None, lane: Optional[str] = None
     ) -> Optional[str]:
         """
         Send a video processing task to the SQS queue
@@ -48,6 +172,7 @@ class SQSService:
         Args:
             video_id: Unique identifier for the video to process
             metadata: Optional additional metadata about the video
+            lane: Processing lane (None = normal)
 
         Returns:
             Message ID if successful, None if failed
@@ -56,11 +181,9 @@ class SQSService:
             ClientError: If there's an error sending the message to SQS
         """
         try:
-            message_body = {"video_id": video_id, "metadata": metadata or {}}
-
             response = self.sqs.send_message(
-                QueueUrl=self.queue_url,
-                MessageBody=json.dumps(message_body),
+                QueueUrl=self.lane_url(lane),
+                MessageBody=self.build_message_body(video_id, metadata),
                 MessageAttributes={"VideoId": {"StringValue": video_id, "DataType": "String"}},
             )
 
@@ -72,23 +195,101 @@ class SQSService:
             logger.error(f"Failed to send message for video {video_id}: {e}")
             raise
 
-    def receive_messages(self, max_messages: int = 1, wait_time: int = 20) -> List[Dict[str, Any]]:
+    @staticmethod
+    def build_message_body(video_id: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Serialize a video processing task the way the worker expects it
+
+        Args:
+            video_id: Unique identifier for the video to process
+            metadata: Optional additional metadata about the video
+
+        Returns:
+            JSON message body
+        """
+        return json.dumps({"video_id": video_id, "metadata": metadata or {}})
+
+    def send_message_batch(self, entries: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Send pre-built messages with SendMessageBatch (10 entries per API call)
+
+        Args:
+            entries: Dicts with "id" (unique within the call, alphanumeric/-/_),
+                "video_id", "body" (see build_message_body) and optionally
+                "lane" (None = normal); each lane's entries go to its queue
+
+        Returns:
+            {"successful": {id: MessageId}, "failed": {id: error message}}.
+            A ClientError on a whole request marks every entry of that request
+            as failed instead of raising, so callers can retry per entry.
+        """
+        successful: Dict[str, str] = {}
+        failed: Dict[str, str] = {}
+
+        by_queue: Dict[str, List[Dict[str, str]]] = {}
+        for entry in entries:
+            by_queue.setdefault(self.lane_url(entry.get("lane")), []).append(entry)
+        chunks = [
+            (queue_url, queue_entries[start : start + SQS_MAX_BATCH_SIZE])
+            for queue_url, queue_entries in by_queue.items()
+            for start in range(0, len(queue_entries), SQS_MAX_BATCH_SIZE)
+        ]
+
+        for queue_url, chunk in chunks:
+            try:
+                response = self.sqs.send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {
+                            "Id": entry["id"],
+                            "MessageBody": entry["body"],
+                            "MessageAttributes": {
+                                "VideoId": {"StringValue": entry["video_id"], "DataType": "String"}
+                            },
+                        }
+                        for entry in chunk
+                    ],
+                )
+            except ClientError as e:
+                logger.error(f"Failed to send batch of {len(chunk)} message(s): {e}")
+                failed.update({entry["id"]: str(e) for entry in chunk})
+                continue
+
+            for result in response.get("Successful", []):
+                successful[result["Id"]] = result["MessageId"]
+            for result in response.get("Failed", []):
+                failed[result["Id"]] = f"{result.get('Code')}: {result.get('Message', '')}"
+
+        logger.info(f"Batch send: {len(successful)} sent, {len(failed)} failed")
+        return {"successful": successful, "failed": failed}
+
+    def receive_messages(
+        self, max_messages: int = 1, wait_time: int = 20, lane: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
         """
         Receive messages from the SQS queue (long polling)
 
+        Without a lane, every lane is polled in the scheduler's weighted order
+        until one returns messages (see _receive_weighted).
+
         Args:
             max_messages: Maximum number of messages to receive (1-10)
             wait_time: Long polling wait time in seconds (0-20)
+            lane: Only receive from this lane
 
         Returns:
-            List of message dictionaries
+            List of message dictionaries, each with a "Lane" key
 
         Raises:
             ClientError: If there's an error receiving messages from SQS
         """
+        if lane is None and len(self.lane_urls) > 1:
+            return self._receive_weighted(max_messages, wait_time)
+
+        queue_url = self.lane_url(lane)
         try:
             response = self.sqs.receive_message(
-                QueueUrl=self.queue_url,
+                QueueUrl=queue_url,
                 MaxNumberOfMessages=max_messages,
                 WaitTimeSeconds=wait_time,  # Enable long polling
                 MessageAttributeNames=["All"],
@@ -96,6 +297,9 @@ class SQSService:
             )
 
             messages = response.get("Messages", [])
+            for message in messages:
+                message["Lane"] = lane or NORMAL
+                self._remember(message["ReceiptHandle"], queue_url)
             logger.debug(f"Received {len(messages)} message(s) from queue")
             return messages
 
@@ -103,6 +307,32 @@ class SQSService:
             logger.error(f"Failed to receive messages: {e}")
             raise
 
+    def _receive_weighted(self, max_messages: int, wait_time: int) -> List[Dict[str, Any]]:
+        """
+        Receive one batch from the first lane, in weighted order, that has messages
+
+        Lanes are probed without waiting (WaitTimeSeconds=0), so empty lanes
+        ahead of a busy one cost a round trip each, not a wait. If all are
+        empty, the heaviest lane is long-polled for wait_time, so an idle
+        worker picks up urgent work first; messages that reach the other lanes
+        meanwhile (or that a short poll missed) are found by the next call.
+        """
+        order = self.scheduler.order()
+        for i, lane in enumerate(order):
+            messages = self.receive_messages(max_messages, 0, lane)
+            if messages:
+                self.scheduler.record(lane, idle=order[:i])
+                return messages
+
+        self.scheduler.record(None, idle=order)
+        if wait_time <= 0:
+            return []
+        heaviest = max(order, key=lambda lane: self.scheduler.weights[lane])
+        messages = self.receive_messages(max_messages, wait_time, heaviest)
+        if messages:
+            self.scheduler.record(heaviest)
+        return messages
+
     def delete_message(self, receipt_handle: str) -> bool:
         """
         Delete a message from the queue after successful processing
@@ -114,7 +344,9 @@ class SQSService:
             True if deletion was successful, False otherwise
         """
         try:
-            self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
+            self.sqs.delete_message(
+                QueueUrl=self._handle_url(receipt_handle, forget=True), ReceiptHandle=receipt_handle
+            )
             logger.debug(f"Deleted message with receipt handle: {receipt_handle[:50]}...")
             return True
 
@@ -135,7 +367,9 @@ class SQSService:
         """
         try:
             self.sqs.change_message_visibility(
-                QueueUrl=self.queue_url, ReceiptHandle=receipt_handle, VisibilityTimeout=timeout
+                QueueUrl=self._handle_url(receipt_handle),
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=timeout,
             )
             logger.debug(f"Extended visibility timeout to {timeout}s")
             return True
@@ -144,16 +378,72 @@ class SQSService:
             logger.error(f"Failed to change visibility timeout: {e}")
             return False
 
-    def get_queue_attributes(self) -> Dict[str, Any]:
+    def change_visibility_timeout_batch(
+        self, receipt_handles: List[str], timeout: int
+    ) -> Dict[str, str]:
+        """
+        Extend the visibility timeout of several in-flight messages (10 per API call)
+
+        Args:
+            receipt_handles: Receipt handles from the received messages
+            timeout: New visibility timeout in seconds, counted from now
+
+        Returns:
+            {receipt_handle: error code} for the handles that were not extended
+        """
+        failed: Dict[str, str] = {}
+
+        for queue_url, handles in self._by_queue(receipt_handles).items():
+            failed.update(self._change_visibility_batch(queue_url, handles, timeout))
+        return failed
+
+    def _by_queue(self, receipt_handles: Iterable[str]) -> Dict[str, List[str]]:
+        """Receipt handles grouped by the queue their messages came from"""
+        by_queue: Dict[str, List[str]] = {}
+        for handle in receipt_handles:
+            by_queue.setdefault(self._handle_url(handle), []).append(handle)
+        return by_queue
+
+    def _change_visibility_batch(
+        self, queue_url: str, receipt_handles: List[str], timeout: int
+    ) -> Dict[str, str]:
+        """change_visibility_timeout_batch for the messages of one queue"""
+        failed: Dict[str, str] = {}
+
+        for start in range(0, len(receipt_handles), SQS_MAX_BATCH_SIZE):
+            chunk = dict(enumerate(receipt_handles[start : start + SQS_MAX_BATCH_SIZE]))
+            try:
+                response = self.sqs.change_message_visibility_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {"Id": str(i), "ReceiptHandle": handle, "VisibilityTimeout": timeout}
+                        for i, handle in chunk.items()
+                    ],
+                )
+            except ClientError as e:
+                logger.error(f"Failed to change visibility of {len(chunk)} message(s): {e}")
+                code = e.response.get("Error", {}).get("Code", "ClientError")
+                failed.update({handle: code for handle in chunk.values()})
+                continue
+
+            for result in response.get("Failed", []):
+                failed[chunk[int(result["Id"])]] = result.get("Code", "Unknown")
+
+        return failed
+
+    def get_queue_attributes(self, lane: Optional[str] = None) -> Dict[str, Any]:
         """
         Get queue attributes including approximate number of messages
 
+        Args:
+            lane: Processing lane (None = normal)
+
         Returns:
             Dictionary with queue attributes
         """
         try:
             response = self.sqs.get_queue_attributes(
-                QueueUrl=self.queue_url,
+                QueueUrl=self.lane_url(lane),
                 AttributeNames=[
                     "ApproximateNumberOfMessages",
                     "ApproximateNumberOfMessagesNotVisible",
@@ -186,5 +476,131 @@ class SQSService:
             return 0
 
 
+class SQSBatchProducer:
+    """
+    Coalesces individual sends into SendMessageBatch calls
+
+    submit() buffers the message and returns a Future right away. A background
+    thread sends the buffer as soon as it holds 10 entries or the oldest entry
+    has waited linger_ms, so a burst of N requests costs about N / 10 queue
+    round trips instead of N. Each future resolves to the SQS MessageId, or
+    fails with SQSBatchEntryError when that entry was rejected.
+    """
+
+    def __init__(self, service: Optional[SQSService] = None, linger_ms: Optional[int] = None):
+        self.service = service or sqs_service
+        linger_ms = settings.SQS_BATCH_LINGER_MS if linger_ms is None else linger_ms
+        self.linger = linger_ms / 1000
+        self._ids = itertools.count()
+        self._buffer: List[Tuple[Dict[str, str], Future, float]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        video_id: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        body: Optional[str] = None,
+        lane: Optional[str] = None,
+    ) -> Future:
+        """
+        Queue a video processing task for the next batch
+
+        Args:
+            video_id: Unique identifier for the video to process
+            metadata: Optional additional metadata (ignored when body is given)
+            body: Pre-built message body, e.g. an outbox payload
+            lane: Processing lane (None = normal)
+
+        Returns:
+            Future resolving to the SQS MessageId
+
+        Raises:
+            RuntimeError: If the producer has been closed
+        """
+        entry = {
+            "id": str(next(self._ids)),
+            "video_id": video_id,
+            "body": body or SQSService.build_message_body(video_id, metadata),
+            "lane": lane,
+        }
+        future: Future = Future()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SQSBatchProducer is closed")
+            self._buffer.append((entry, future, time.monotonic()))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sqs-batch-producer", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+        return future
+
+    def flush(self) -> None:
+        """Send everything buffered so far, without waiting for the linger period"""
+        with self._cond:
+            pending, self._buffer = self._buffer, []
+        for start in range(0, len(pending), SQS_MAX_BATCH_SIZE):
+            self._send(pending[start : start + SQS_MAX_BATCH_SIZE])
+
+    def close(self, timeout: float = 10) -> None:
+        """Stop accepting messages and flush the buffer (call on shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self) -> None:
+        """Background loop: wait for a full batch or the linger deadline, then send"""
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return  # close() flushes whatever is left
+
+                deadline = self._buffer[0][2] + self.linger
+                while len(self._buffer) < SQS_MAX_BATCH_SIZE and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._buffer[:SQS_MAX_BATCH_SIZE]
+                del self._buffer[:SQS_MAX_BATCH_SIZE]
+
+            self._send(batch)
+
+    def _send(self, batch: List[Tuple[Dict[str, str], Future, float]]) -> None:
+        """Send one batch and resolve its futures entry by entry"""
+        # Entries whose future was cancelled while buffered are dropped
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            result = self.service.send_message_batch([entry for entry, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch send of {len(batch)} message(s) failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for entry, future, _ in batch:
+            message_id = result["successful"].get(entry["id"])
+            if message_id is not None:
+                future.set_result(message_id)
+            else:
+                error = result["failed"].get(entry["id"], "missing from SendMessageBatch response")
+                future.set_exception(
+                    SQSBatchEntryError(f"Message for video {entry['video_id']} failed: {error}")
+                )
+
+
 # Singleton instance
 sqs_service = SQSService()
@@ -0,0 +1,90 @@
+"""Processed-output cache: outputs keyed by source checksum and pipeline version"""
+
+import hashlib
+import json
+import logging
+from dataclasses import asdict, replace
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.db.models import ProcessedOutput
+from app.worker.transcoding import TranscodeSpec, get_profile
+
+logger = logging.getLogger(__name__)
+
+# Bump when a code change alters the outputs made from the same parameters
+OUTPUT_FORMAT_VERSION = 1
+
+# Columns describing a video's processed output, shared by Video and ProcessedOutput
+OUTPUT_COLUMNS = ("processed_file_path", "renditions", "hls_playlist_path", "poster_path", "sprite")
+
+
+def pipeline_version(spec: TranscodeSpec, engine: str) -> str:
+    """
+    Hash of every parameter that shapes the outputs made from a source
+
+    Covers the spec (trim length, height, watermark text and font, codecs,
+    renditions, keyframes, preview images), the encoding profile it resolves
+    to, the engine, HLS packaging and OUTPUT_FORMAT_VERSION. Changing any of
+    them yields a new version, so only entries made with the old value miss.
+    """
+    parameters = {
+        "format": OUTPUT_FORMAT_VERSION,
+        "engine": engine,
+        "spec": asdict(replace(spec, profile=None)),
+        "profile": asdict(get_profile(spec.profile)),
+        "watermark_font": settings.WATERMARK_FONT,
+        "hls_segment_seconds": settings.HLS_SEGMENT_SECONDS if settings.HLS_PACKAGING else None,
+    }
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+def lookup(db: Session, source_sha256: str, version: str) -> Optional[ProcessedOutput]:
+    """
+    Cached outputs of a source for a pipeline version
+
+    An entry whose processed file is gone from storage is stale: it is
+    removed and reported as a miss.
+    """
+    entry = (
+        db.query(ProcessedOutput)
+        .filter(
+            ProcessedOutput.source_sha256 == source_sha256,
+            ProcessedOutput.pipeline_version == version,
+        )
+        .first()
+    )
+    if entry is None:
+        return None
+
+    if not storage.file_exists(entry.processed_file_path):
+        logger.warning(f"Cached output {entry.processed_file_path} is missing; dropping the entry")
+        db.delete(entry)
+        db.commit()
+        return None
+    return entry
+
+
+def store(db: Session, source_sha256: str, version: str, outputs: Dict[str, Any]) -> None:
+    """
+    Record outputs (values of OUTPUT_COLUMNS) under (source_sha256, version) and commit
+
+    Call once the outputs are in storage. If another worker cached the same
+    key first, its entry is kept; the rest of the session is unaffected.
+    """
+    entry = ProcessedOutput(
+        source_sha256=source_sha256,
+        pipeline_version=version,
+        **{column: outputs[column] for column in OUTPUT_COLUMNS},
+    )
+    try:
+        with db.begin_nested():
+            db.add(entry)
+    except IntegrityError:
+        logger.info(f"Output of {source_sha256[:12]} was already cached")
+        return
+    db.commit()
@@ -0,0 +1,152 @@
+"""Visibility-timeout heartbeat for messages being processed by the worker"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.services.queue import SQSService, sqs_service
+from app.worker.lease import renew_leases, worker_id
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the message is gone or can't be extended any more; retrying is pointless
+_PERMANENT_ERRORS = {
+    "ReceiptHandleIsInvalid",
+    "MessageNotInflight",
+    "AWS.SimpleQueueService.MessageNotInflight",
+    "InvalidParameterValue",  # Total visibility would exceed the 12 hour SQS limit
+}
+
+
+class VisibilityHeartbeat:
+    """
+    Keeps in-flight messages invisible while their videos are transcoded
+
+    A background thread periodically resets the visibility timeout of every
+    tracked message to `extension` seconds from now (one
+    ChangeMessageVisibilityBatch call per 10 messages), so a transcode longer
+    than the queue's visibility timeout is not redelivered to another worker.
+    Tracking stops when the message is untracked (deleted or abandoned), when
+    SQS reports the handle as no longer valid, or after max_age seconds so a
+    hung transcode is eventually retried elsewhere.
+
+    Messages tracked with a video ID also have the video's processing lease
+    renewed on every beat (see app.worker.lease), so the lease lives exactly
+    as long as the message is kept invisible. Workers claim their videos with
+    the heartbeat's owner ID, worker_id() of the process that created it
+    unless given.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[SQSService] = None,
+        interval: Optional[float] = None,
+        extension: Optional[int] = None,
+        max_age: Optional[float] = None,
+        owner: Optional[str] = None,
+    ):
+        self.queue = queue or sqs_service
+        self.interval = interval or settings.SQS_HEARTBEAT_INTERVAL
+        self.extension = extension or settings.SQS_VISIBILITY_EXTENSION
+        self.max_age = max_age or settings.SQS_HEARTBEAT_MAX_AGE
+        self.owner = owner or worker_id()
+        # receipt_handle -> monotonic time it started being tracked
+        self._tracked: Dict[str, float] = {}
+        # receipt_handle -> video ID whose lease is renewed with the message
+        self._leases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, receipt_handle: str, video_id: Optional[str] = None) -> None:
+        """Start extending a message's visibility (and the lease of video_id)"""
+        with self._lock:
+            self._tracked[receipt_handle] = time.monotonic()
+            if video_id:
+                self._leases[receipt_handle] = video_id
+
+    def untrack(self, receipt_handle: str) -> None:
+        """Stop extending a message's visibility (call before deleting or abandoning it)"""
+        with self._lock:
+            self._tracked.pop(receipt_handle, None)
+            self._leases.pop(receipt_handle, None)
+
+    @contextmanager
+    def keep_alive(self, receipt_handle: str, video_id: Optional[str] = None) -> Iterator[None]:
+        """Track a message for the duration of the block"""
+        self.track(receipt_handle, video_id)
+        try:
+            yield
+        finally:
+            self.untrack(receipt_handle)
+
+    @property
+    def tracked(self) -> int:
+        with self._lock:
+            return len(self._tracked)
+
+    def beat(self) -> int:
+        """
+        Extend the visibility of every tracked message once
+
+        Returns:
+            Number of messages extended
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [h for h, since in self._tracked.items() if now - since >= self.max_age]
+            for handle in expired:
+                del self._tracked[handle]
+                self._leases.pop(handle, None)
+            handles = list(self._tracked)
+            leases = {h: self._leases[h] for h in handles if h in self._leases}
+
+        for _ in expired:
+            logger.warning(
+                f"Message in flight for over {self.max_age}s, no longer extending its visibility"
+            )
+        if not handles:
+            return 0
+
+        failed = self.queue.change_visibility_timeout_batch(handles, self.extension)
+
+        for handle, code in failed.items():
+            if code in _PERMANENT_ERRORS:
+                logger.warning(f"Dropping message from heartbeat: {code}")
+                self.untrack(handle)
+
+        extended = len(handles) - len(failed)
+        logger.debug(f"Heartbeat extended {extended} message(s) by {self.extension}s")
+
+        # Leases of messages SQS just refused to extend are left to expire
+        video_ids = [video_id for h, video_id in leases.items() if h not in failed]
+        if video_ids:
+            try:
+                renew_leases(video_ids, self.owner)
+            except Exception as e:
+                logger.error(f"Could not renew processing leases: {e}")
+        return extended
+
+    def run(self) -> None:
+        """Beat every interval until stop() is called"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.error(f"Visibility heartbeat error: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """Run the heartbeat on a background daemon thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="visibility-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop the background thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,117 @@
+"""Processing leases: at most one worker processes a video at a time"""
+
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Video
+
+
+class VideoLeased(Exception):
+    """Raised when a video can't be claimed because another worker holds its lease"""
+
+
+def worker_id() -> str:
+    """
+    Lease owner ID of the calling process
+
+    Call it once in the worker's main process and pass the result to the
+    pool processes; their own PIDs would never match the heartbeat's.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_video(db: Session, video_id: str, owner: str) -> bool:
+    """
+    Atomically take the processing lease of a video and mark it processing
+
+    A single conditional UPDATE, so of several workers handed the same
+    video (duplicate SQS deliveries) exactly one wins. The claim fails if
+    the video is already processed or another worker holds a lease that
+    hasn't expired; an expired lease (crashed worker) is taken over.
+    Commits the session.
+
+    Returns:
+        True if this worker now owns the video
+    """
+    now = datetime.utcnow()
+    claimed = (
+        db.query(Video)
+        .filter(
+            Video.id == video_id,
+            Video.status != "processed",
+            or_(Video.lease_expires_at.is_(None), Video.lease_expires_at < now),
+        )
+        .update(
+            {
+                Video.status: "processing",
+                Video.lease_owner: owner,
+                Video.lease_expires_at: now + timedelta(seconds=settings.VIDEO_LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def finish_video(db: Session, video_id: str, owner: str, status: str, **values) -> bool:
+    """
+    Set the final status of a video and clear its lease, if owner still holds it
+
+    A single conditional UPDATE, like claim_video: a worker whose lease expired
+    and was taken over can't overwrite the status, outputs or lease of the new
+    owner. Commits the session.
+
+    Args:
+        values: Other columns set with the status (e.g. the processed outputs)
+
+    Returns:
+        True if owner held the lease and the video was updated
+    """
+    finished = (
+        db.query(Video)
+        .filter(Video.id == video_id, Video.lease_owner == owner)
+        .update(
+            {**values, "status": status, "lease_owner": None, "lease_expires_at": None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return finished == 1
+
+
+def renew_leases(video_ids: Iterable[str], owner: str) -> int:
+    """
+    Push back the expiry of the leases held by owner (see VisibilityHeartbeat)
+
+    Returns:
+        Number of leases renewed
+    """
+    video_ids = list(video_ids)
+    if not video_ids:
+        return 0
+
+    db = SessionLocal()
+    try:
+        renewed = (
+            db.query(Video)
+            .filter(Video.id.in_(video_ids), Video.lease_owner == owner)
+            .update(
+                {
+                    Video.lease_expires_at: datetime.utcnow()
+                    + timedelta(seconds=settings.VIDEO_LEASE_SECONDS)
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return renewed
+    finally:
+        db.close()
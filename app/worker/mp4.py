@@ -0,0 +1,405 @@
+"""
+Minimal MP4/MOV box reader
+
+Only what the worker needs to fetch part of a source video and to decide how
+to transcode it: locate the moov box with ranged reads, work out how many
+leading bytes of the file hold the samples for the first N seconds of every
+track, and read codecs, dimensions and duration from the track headers.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+class MP4Error(Exception):
+    """Raised when a file can't be handled by this reader (not MP4, fragmented, corrupt)"""
+
+
+@dataclass(frozen=True)
+class Box:
+    """A box header: type, absolute offset, total size and header length"""
+
+    type: bytes
+    offset: int
+    size: int
+    header_size: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    @property
+    def payload_offset(self) -> int:
+        return self.offset + self.header_size
+
+
+def parse_box_header(data: bytes, offset: int, base: int = 0, limit: Optional[int] = None) -> Box:
+    """
+    Parse the box header at data[offset - base:]
+
+    Args:
+        data: Buffer holding the header
+        offset: Absolute file offset of the box
+        base: Absolute file offset of data[0]
+        limit: Absolute offset where the enclosing box (or file) ends
+
+    Raises:
+        MP4Error: If the header is truncated or its size is invalid
+    """
+    start = offset - base
+    if len(data) - start < 8:
+        raise MP4Error(f"Truncated box header at {offset}")
+
+    size, box_type = struct.unpack(">I4s", data[start : start + 8])
+    header_size = 8
+    if size == 1:
+        if len(data) - start < 16:
+            raise MP4Error(f"Truncated box header at {offset}")
+        size = struct.unpack(">Q", data[start + 8 : start + 16])[0]
+        header_size = 16
+    elif size == 0:
+        if limit is None:
+            raise MP4Error(f"Box {box_type!r} at {offset} extends to an unknown end")
+        size = limit - offset
+
+    if size < header_size:
+        raise MP4Error(f"Invalid size {size} for box {box_type!r} at {offset}")
+    return Box(box_type, offset, size, header_size)
+
+
+def iter_boxes(data: bytes, start: int, end: int, base: int = 0) -> Iterator[Box]:
+    """Yield the boxes laid out back to back between absolute offsets start and end"""
+    offset = start
+    while offset + 8 <= end:
+        box = parse_box_header(data, offset, base, limit=end)
+        yield box
+        offset = box.end
+
+
+def find_top_level_boxes(
+    read: Callable[[int, int], bytes], file_size: int, head: bytes = b""
+) -> List[Box]:
+    """
+    List top-level boxes up to and including moov
+
+    Headers inside `head` (the first bytes of the file, if already fetched)
+    are parsed for free; headers beyond it cost one small ranged read each,
+    skipping over mdat without reading it.
+
+    Args:
+        read: Callable(offset, length) -> bytes reading from the source
+        file_size: Total size of the source
+        head: Bytes already read from offset 0
+
+    Raises:
+        MP4Error: If there is no moov box or the layout is invalid
+    """
+    boxes: List[Box] = []
+    offset = 0
+    while offset + 8 <= file_size:
+        if offset + 16 <= len(head):
+            box = parse_box_header(head, offset, limit=file_size)
+        else:
+            box = parse_box_header(read(offset, 16), offset, base=offset, limit=file_size)
+        if box.type == b"moof":
+            raise MP4Error("Fragmented MP4 is not supported")
+        boxes.append(box)
+        if box.type == b"moov":
+            return boxes
+        offset = box.end
+
+    raise MP4Error("No moov box found")
+
+
+def _full_box_payload(data: bytes, box: Box, base: int) -> Tuple[int, bytes]:
+    """Return (version, payload after version/flags) of a full box"""
+    payload = data[box.payload_offset - base : box.end - base]
+    return payload[0], payload[4:]
+
+
+def _find_child(data: bytes, parent: Box, box_type: bytes, base: int) -> Optional[Box]:
+    for child in iter_boxes(data, parent.payload_offset, parent.end, base):
+        if child.type == box_type:
+            return child
+    return None
+
+
+def _find_path(data: bytes, parent: Box, path: List[bytes], base: int) -> Optional[Box]:
+    box: Optional[Box] = parent
+    for box_type in path:
+        if box is None:
+            return None
+        box = _find_child(data, box, box_type, base)
+    return box
+
+
+def _timescale(data: bytes, mdhd: Box, base: int) -> int:
+    version, payload = _full_box_payload(data, mdhd, base)
+    # creation/modification times are 8 bytes each in version 1, 4 in version 0
+    return struct.unpack(">I", payload[16:20] if version == 1 else payload[8:12])[0]
+
+
+def _sample_durations(data: bytes, stts: Box, base: int) -> Iterator[int]:
+    _, payload = _full_box_payload(data, stts, base)
+    (count,) = struct.unpack(">I", payload[:4])
+    for i in range(count):
+        sample_count, delta = struct.unpack(">II", payload[4 + i * 8 : 12 + i * 8])
+        for _ in range(sample_count):
+            yield delta
+
+
+def _samples_per_chunk(data: bytes, stsc: Box, base: int, chunk_count: int) -> List[int]:
+    _, payload = _full_box_payload(data, stsc, base)
+    (count,) = struct.unpack(">I", payload[:4])
+    entries = [struct.unpack(">III", payload[4 + i * 12 : 16 + i * 12])[:2] for i in range(count)]
+
+    per_chunk = []
+    for i, (first_chunk, samples) in enumerate(entries):
+        last_chunk = entries[i + 1][0] - 1 if i + 1 < len(entries) else chunk_count
+        per_chunk += [samples] * (last_chunk - first_chunk + 1)
+    return per_chunk
+
+
+def _chunk_offsets(data: bytes, stbl: Box, base: int) -> List[int]:
+    box = _find_child(data, stbl, b"stco", base)
+    fmt, width = ">I", 4
+    if box is None:
+        box = _find_child(data, stbl, b"co64", base)
+        fmt, width = ">Q", 8
+    if box is None:
+        raise MP4Error("Track has no chunk offset table")
+
+    _, payload = _full_box_payload(data, box, base)
+    (count,) = struct.unpack(">I", payload[:4])
+    return [
+        struct.unpack(fmt, payload[4 + i * width : 4 + (i + 1) * width])[0] for i in range(count)
+    ]
+
+
+def _sample_sizes(data: bytes, stbl: Box, base: int) -> Tuple[int, List[int]]:
+    """Return (sample_count, per-sample sizes)"""
+    box = _find_child(data, stbl, b"stsz", base)
+    if box is None:
+        raise MP4Error("Track has no sample size table")
+
+    _, payload = _full_box_payload(data, box, base)
+    uniform, count = struct.unpack(">II", payload[:8])
+    if uniform:
+        return count, [uniform] * count
+    return count, list(struct.unpack(f">{count}I", payload[8 : 8 + count * 4]))
+
+
+def _track_prefix_end(data: bytes, trak: Box, seconds: float, base: int) -> int:
+    """End offset of the last sample of this track that starts before `seconds`"""
+    mdhd = _find_path(data, trak, [b"mdia", b"mdhd"], base)
+    stbl = _find_path(data, trak, [b"mdia", b"minf", b"stbl"], base)
+    if mdhd is None or stbl is None:
+        raise MP4Error("Track without media header or sample table")
+
+    stts = _find_child(data, stbl, b"stts", base)
+    stsc = _find_child(data, stbl, b"stsc", base)
+    if stts is None or stsc is None:
+        raise MP4Error("Track without time-to-sample or sample-to-chunk table")
+
+    limit = seconds * _timescale(data, mdhd, base)
+    offsets = _chunk_offsets(data, stbl, base)
+    sample_count, sizes = _sample_sizes(data, stbl, base)
+    durations = _sample_durations(data, stts, base)
+
+    sample = 0
+    dts = 0
+    end = 0
+    for chunk_offset, samples_in_chunk in zip(
+        offsets, _samples_per_chunk(data, stsc, base, len(offsets))
+    ):
+        position = chunk_offset
+        for _ in range(samples_in_chunk):
+            if sample >= sample_count or dts >= limit:
+                return end
+            end = max(end, position + sizes[sample])
+            position += sizes[sample]
+            dts += next(durations, 0)
+            sample += 1
+    return end
+
+
+def prefix_length(moov_data: bytes, moov: Box, seconds: float) -> int:
+    """
+    Bytes from the start of the file needed to decode the first `seconds` of every track
+
+    Args:
+        moov_data: Bytes of the moov box
+        moov: The moov box header (absolute offsets)
+        seconds: Duration to keep
+
+    Raises:
+        MP4Error: If the sample tables are missing or malformed
+    """
+    base = moov.offset
+    try:
+        ends = [
+            _track_prefix_end(moov_data, trak, seconds, base)
+            for trak in iter_boxes(moov_data, moov.payload_offset, moov.end, base)
+            if trak.type == b"trak"
+        ]
+    except (struct.error, IndexError) as e:
+        raise MP4Error(f"Malformed sample tables: {e}") from e
+
+    if not ends:
+        raise MP4Error("moov has no tracks")
+    return max(ends)
+
+
+# tkhd matrix of a track displayed as stored (no rotation or flip)
+_IDENTITY_MATRIX = (0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+# esds objectTypeIndication values for AAC (MPEG-4 and MPEG-2 AAC profiles)
+_AAC_OBJECT_TYPES = {0x40, 0x66, 0x67, 0x68}
+
+# H.264 profiles that are always 8-bit 4:2:0 (baseline, main, extended, high)
+_H264_420_PROFILES = {66, 77, 88, 100}
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """What the worker needs to know about a source before transcoding it"""
+
+    duration: float
+    video_codec: Optional[str] = None  # "h264", or the sample entry type, e.g. "hvc1"
+    width: int = 0
+    height: int = 0
+    rotated: bool = False
+    yuv420: bool = False  # 8-bit 4:2:0, i.e. playable everywhere as-is
+    audio_codec: Optional[str] = None  # "aac", or the sample entry type
+
+
+def _descriptor(payload: bytes, offset: int) -> Tuple[int, int, int]:
+    """Return (tag, payload offset, payload length) of an MPEG-4 descriptor"""
+    tag = payload[offset]
+    length = 0
+    offset += 1
+    for _ in range(4):
+        byte = payload[offset]
+        offset += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, offset, length
+
+
+def _esds_object_type(data: bytes, esds: Box, base: int) -> Optional[int]:
+    _, payload = _full_box_payload(data, esds, base)
+    tag, offset, _ = _descriptor(payload, 0)
+    if tag != 0x03:  # ES_Descriptor
+        return None
+    flags = payload[offset + 2]
+    offset += 3
+    if flags & 0x80:  # streamDependenceFlag
+        offset += 2
+    if flags & 0x40:  # URL_Flag
+        offset += 1 + payload[offset]
+    if flags & 0x20:  # OCRstreamFlag
+        offset += 2
+    tag, offset, _ = _descriptor(payload, offset)
+    if tag != 0x04:  # DecoderConfigDescriptor
+        return None
+    return payload[offset]
+
+
+def _handler_type(data: bytes, trak: Box, base: int) -> bytes:
+    hdlr = _find_path(data, trak, [b"mdia", b"hdlr"], base)
+    if hdlr is None:
+        return b""
+    _, payload = _full_box_payload(data, hdlr, base)
+    return payload[4:8]
+
+
+def _sample_entry(data: bytes, trak: Box, base: int) -> Optional[Box]:
+    stsd = _find_path(data, trak, [b"mdia", b"minf", b"stbl", b"stsd"], base)
+    if stsd is None:
+        return None
+    # Full box header plus the 4-byte entry count precede the first entry
+    offset = stsd.payload_offset + 8
+    return parse_box_header(data, offset, base, limit=stsd.end) if offset < stsd.end else None
+
+
+def _video_info(data: bytes, trak: Box, entry: Box, base: int) -> dict:
+    # Visual sample entry: 8 bytes of sample entry fields, 16 reserved, then width/height
+    start = entry.payload_offset - base
+    width, height = struct.unpack(">HH", data[start + 24 : start + 28])
+
+    tkhd = _find_child(data, trak, b"tkhd", base)
+    rotated = False
+    if tkhd is not None:
+        version, payload = _full_box_payload(data, tkhd, base)
+        matrix_offset = (32 if version == 1 else 20) + 16
+        matrix = struct.unpack(">9i", payload[matrix_offset : matrix_offset + 36])
+        rotated = matrix != _IDENTITY_MATRIX
+
+    codec = entry.type.decode("latin-1")
+    yuv420 = False
+    if entry.type in (b"avc1", b"avc3"):
+        codec = "h264"
+        # Child boxes follow the 78 bytes of the visual sample entry
+        for child in iter_boxes(data, entry.payload_offset + 78, entry.end, base):
+            if child.type == b"avcC":
+                yuv420 = data[child.payload_offset - base + 1] in _H264_420_PROFILES
+    return {
+        "video_codec": codec,
+        "width": width,
+        "height": height,
+        "rotated": rotated,
+        "yuv420": yuv420,
+    }
+
+
+def _audio_codec(data: bytes, entry: Box, base: int) -> str:
+    if entry.type != b"mp4a":
+        return entry.type.decode("latin-1")
+    # Audio sample entry (version 0): 8 + 20 bytes of fields before child boxes
+    for child in iter_boxes(data, entry.payload_offset + 28, entry.end, base):
+        if child.type == b"esds":
+            if _esds_object_type(data, child, base) in _AAC_OBJECT_TYPES:
+                return "aac"
+    return "mp4a"
+
+
+def media_info(moov_data: bytes, moov: Box) -> MediaInfo:
+    """
+    Codecs, dimensions and duration of the first video and audio tracks
+
+    Args:
+        moov_data: Bytes of the moov box
+        moov: The moov box header (absolute offsets)
+
+    Raises:
+        MP4Error: If the headers are missing or malformed
+    """
+    base = moov.offset
+    try:
+        mvhd = _find_child(moov_data, moov, b"mvhd", base)
+        if mvhd is None:
+            raise MP4Error("moov has no movie header")
+        version, payload = _full_box_payload(moov_data, mvhd, base)
+        if version == 1:
+            timescale, duration = struct.unpack(">IQ", payload[16:28])
+        else:
+            timescale, duration = struct.unpack(">II", payload[8:16])
+        fields = {"duration": duration / timescale if timescale else 0.0}
+
+        for trak in iter_boxes(moov_data, moov.payload_offset, moov.end, base):
+            if trak.type != b"trak":
+                continue
+            handler = _handler_type(moov_data, trak, base)
+            entry = _sample_entry(moov_data, trak, base)
+            if entry is None:
+                continue
+            if handler == b"vide" and "video_codec" not in fields:
+                fields.update(_video_info(moov_data, trak, entry, base))
+            elif handler == b"soun" and "audio_codec" not in fields:
+                fields["audio_codec"] = _audio_codec(moov_data, entry, base)
+    except (struct.error, IndexError) as e:
+        raise MP4Error(f"Malformed track headers: {e}") from e
+
+    return MediaInfo(**fields)
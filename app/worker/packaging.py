@@ -0,0 +1,129 @@
+"""Packaging stage: segment processed MP4s into HLS for streaming playback"""
+
+import logging
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.worker.transcoding import TranscodeError, find_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST = "master.m3u8"
+
+
+def hls_directory(path: str) -> str:
+    """Directory (or storage prefix) of the HLS package of the MP4 at path: out.mp4 -> out_hls"""
+    return f"{os.path.splitext(path)[0]}_hls"
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One rendition to package: a local MP4 and its frame size"""
+
+    path: str
+    height: int
+    width: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.height}p"
+
+
+def _segments(playlist_path: str) -> List[Tuple[int, float]]:
+    """(bytes, seconds) of every segment of a media playlist"""
+    directory = os.path.dirname(playlist_path)
+    segments = []
+    duration = None
+    with open(playlist_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:") :].split(",")[0])
+            elif line and not line.startswith("#") and duration:
+                segments.append((os.path.getsize(os.path.join(directory, line)), duration))
+                duration = None
+    return segments
+
+
+def package_hls(
+    variants: Sequence[Variant],
+    output_dir: str,
+    segment_seconds: Optional[int] = None,
+    binary: Optional[str] = None,
+) -> str:
+    """
+    Write an HLS VOD package of variants into output_dir
+
+    Every variant is remuxed (no re-encode) into MPEG-TS segments of about
+    segment_seconds plus a media playlist, <height>p.m3u8. Segments are cut
+    on keyframes, so the encoder should place one every segment_seconds (see
+    TranscodeSpec.keyframe_interval). The master playlist lists the variants
+    top first with the peak and average bitrate measured from the segments.
+    Segment and playlist URIs are relative, so the package can be served
+    from any origin as is.
+
+    Returns:
+        Path of the master playlist
+
+    Raises:
+        TranscodeError: If ffmpeg fails
+    """
+    binary = binary or find_ffmpeg()
+    if not binary:
+        raise TranscodeError("ffmpeg binary not found")
+    segment_seconds = segment_seconds or settings.HLS_SEGMENT_SECONDS
+    os.makedirs(output_dir, exist_ok=True)
+
+    master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for variant in variants:
+        playlist = os.path.join(output_dir, f"{variant.name}.m3u8")
+        command = [
+            binary,
+            "-hide_banner",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-y",
+            "-i",
+            variant.path,
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-f",
+            "hls",
+            "-hls_time",
+            str(segment_seconds),
+            "-hls_playlist_type",
+            "vod",
+            "-hls_segment_filename",
+            os.path.join(output_dir, f"{variant.name}_%03d.ts"),
+            playlist,
+        ]
+        try:
+            result = subprocess.run(
+                command, capture_output=True, timeout=settings.TRANSCODE_TIMEOUT
+            )
+        except subprocess.TimeoutExpired as e:
+            raise TranscodeError(f"HLS packaging of {variant.name} timed out") from e
+        if result.returncode != 0:
+            stderr = result.stderr.decode(errors="replace").strip()
+            raise TranscodeError(f"HLS packaging of {variant.name} failed: {stderr[-2000:]}")
+
+        segments = _segments(playlist)
+        if not segments:
+            raise TranscodeError(f"HLS packaging of {variant.name} wrote no segments")
+        peak = max(size * 8 / seconds for size, seconds in segments)
+        average = sum(size for size, _ in segments) * 8 / sum(seconds for _, seconds in segments)
+        attributes = [f"BANDWIDTH={int(peak)}", f"AVERAGE-BANDWIDTH={int(average)}"]
+        if variant.width:
+            attributes.append(f"RESOLUTION={variant.width}x{variant.height}")
+        master += [f"#EXT-X-STREAM-INF:{','.join(attributes)}", os.path.basename(playlist)]
+
+    master_path = os.path.join(output_dir, MASTER_PLAYLIST)
+    with open(master_path, "w") as f:
+        f.write("\n".join(master) + "\n")
+    return master_path
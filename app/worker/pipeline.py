@@ -0,0 +1,349 @@
+"""Pipelined worker: fetch, transcode and publish stages joined by bounded queues"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.queue import sqs_service
+from app.worker.heartbeat import VisibilityHeartbeat
+from app.worker.lease import VideoLeased
+from app.worker.scratch import ScratchSpace
+from app.worker.sqs_worker import (
+    SlotWorker,
+    _finish_message,
+    _message_lane,
+    _message_profile,
+    _parse_message,
+)
+from app.worker.videos import (
+    VideoJob,
+    fetch_video,
+    mark_video_failed,
+    publish_video,
+    transcode_video,
+)
+
+logger = logging.getLogger(__name__)
+
+FETCH = "fetch"
+TRANSCODE = "transcode"
+PUBLISH = "publish"
+
+
+@dataclass
+class StageStats:
+    """Counters for one pipeline stage"""
+
+    threads: int
+    jobs: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+
+    def report(self, elapsed: float) -> dict:
+        """
+        Throughput of the stage over elapsed wall-clock seconds
+
+        utilization is the share of the stage's thread time spent working; the
+        stage closest to 1.0 is the bottleneck.
+        """
+        done = self.jobs + self.failures
+        return {
+            "jobs": self.jobs,
+            "failures": self.failures,
+            "jobs_per_minute": 60 * self.jobs / elapsed if elapsed > 0 else 0.0,
+            "avg_seconds": self.busy_seconds / done if done else 0.0,
+            "utilization": self.busy_seconds / (elapsed * self.threads) if elapsed > 0 else 0.0,
+        }
+
+
+@dataclass
+class _Job:
+    """A message on its way through the pipeline"""
+
+    video_id: str
+    receipt_handle: str
+    profile: Optional[str]
+    # Holds the scratch directory open from fetch until the job finishes
+    cleanup: ExitStack = field(default_factory=ExitStack)
+    video: Optional[VideoJob] = None
+    # Set by a stage that finished the video early (reused output, leased elsewhere)
+    result: Optional[dict] = None
+
+
+class PipelinedWorker(SlotWorker):
+    """
+    Overlaps downloads, transcodes and uploads of consecutive videos
+
+    Every video goes through three stages, each with its own threads:
+    fetch (mark processing, stage the source in scratch space), transcode
+    (in the process pool, one thread per pool process) and publish (upload,
+    mark processed, delete the message). Stages are joined by queues of
+    PIPELINE_QUEUE_SIZE, so while one video encodes the next is already
+    downloading and the previous one uploading, and a slow stage stalls the
+    ones before it instead of piling up work. The worker only receives as
+    many messages as the fetch stage can take, further limited by the scratch
+    space budget; everything in the pipeline is kept invisible by the
+    visibility heartbeat, exactly like ConcurrentWorker's in-flight jobs.
+
+    Per-stage throughput is logged every PIPELINE_STATS_INTERVAL seconds and
+    at shutdown (see stats()).
+    """
+
+    # Long-poll wait for messages; stages keep running while the worker waits
+    WAIT_TIME = 20
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        fetch_threads: Optional[int] = None,
+        publish_threads: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+        heartbeat: Optional[VisibilityHeartbeat] = None,
+        scratch: Optional[ScratchSpace] = None,
+    ):
+        super().__init__(concurrency, executor_factory, heartbeat, scratch)
+        self.queue_size = queue_size or settings.PIPELINE_QUEUE_SIZE
+
+        self.stages: Dict[str, StageStats] = {
+            FETCH: StageStats(fetch_threads or settings.PIPELINE_FETCH_THREADS),
+            TRANSCODE: StageStats(self.concurrency),
+            PUBLISH: StageStats(publish_threads or settings.PIPELINE_PUBLISH_THREADS),
+        }
+        self._queues: Dict[str, queue.Queue] = {
+            name: queue.Queue(maxsize=self.queue_size) for name in self.stages
+        }
+        self._threads: List[threading.Thread] = []
+
+        # Guards the counters below; notified whenever a job moves on or finishes
+        self._changed = threading.Condition()
+        self._changes = 0
+        # Changes already seen by reap
+        self._reaped = 0
+        self._in_pipeline = 0
+        # Jobs queued for or inside the fetch stage
+        self._fetching = 0
+        self._started_at = 0.0
+        self._reported_at = 0.0
+
+    @property
+    def running_jobs(self) -> int:
+        return self._in_pipeline
+
+    @property
+    def free_slots(self) -> int:
+        """Messages the fetch stage can take without blocking the receiving thread"""
+        return self.stages[FETCH].threads + self.queue_size - self._fetching
+
+    def start(self) -> None:
+        """Clear orphaned scratch files, create the pool and start the stage threads"""
+        self.scratch.cleanup_orphans()
+        self._executor = self._executor_factory(self.concurrency)
+        self.heartbeat.start()
+
+        work = {FETCH: self._fetch, TRANSCODE: self._transcode, PUBLISH: self._publish}
+        for name, stage in self.stages.items():
+            for i in range(stage.threads):
+                thread = threading.Thread(
+                    target=self._run_stage, args=(name, work[name]), name=f"{name}-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        self._started_at = self._reported_at = time.monotonic()
+        logger.info(
+            "Worker pipeline started: "
+            + ", ".join(f"{stage.threads} {name}" for name, stage in self.stages.items())
+            + f" thread(s), queues of {self.queue_size}"
+        )
+
+    def poll(self) -> int:
+        """
+        Receive up to open_slots messages and queue them for the fetch stage
+
+        Returns:
+            Number of messages dispatched
+        """
+        slots = self.open_slots
+        if slots <= 0:
+            return 0
+
+        messages = sqs_service.receive_messages(
+            max_messages=min(10, slots), wait_time=self.WAIT_TIME
+        )
+
+        dispatched = 0
+        for message in messages:
+            video_id = _parse_message(message)
+            if video_id is None:
+                continue
+            logger.info(f"Queueing video {video_id} ({_message_lane(message)} lane)")
+            job = _Job(video_id, message["ReceiptHandle"], _message_profile(message))
+            self.heartbeat.track(job.receipt_handle, video_id)
+            with self._changed:
+                self._in_pipeline += 1
+                self._fetching += 1
+            self._queues[FETCH].put(job)
+            dispatched += 1
+        return dispatched
+
+    def reap(self, timeout: Optional[float] = 0) -> int:
+        """
+        Wait up to timeout for a job to move on or finish since the last call
+
+        The stages handle the messages themselves; this only tells the
+        receiving thread that slots or scratch space may have freed up.
+
+        Returns:
+            Number of moves since the last call
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._changes != self._reaped, timeout=timeout)
+            moved, self._reaped = self._changes - self._reaped, self._changes
+        return moved
+
+    def run_once(self) -> None:
+        """One scheduling step (see SlotWorker.run_once), logging stage stats when due"""
+        if time.monotonic() - self._reported_at >= settings.PIPELINE_STATS_INTERVAL:
+            self.log_stats()
+        super().run_once()
+
+    def shutdown(self) -> None:
+        """Stop receiving, let every job in the pipeline finish, then stop the stages"""
+        with self._changed:
+            if self._in_pipeline:
+                logger.info(f"Waiting for {self._in_pipeline} video(s) in the pipeline to finish")
+            self._changed.wait_for(lambda: not self._in_pipeline)
+
+        for name, stage in self.stages.items():
+            for _ in range(stage.threads):
+                self._queues[name].put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.heartbeat.stop()
+        self.log_stats()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-stage throughput since start (see StageStats.report)"""
+        elapsed = time.monotonic() - self._started_at
+        with self._changed:
+            return {name: stage.report(elapsed) for name, stage in self.stages.items()}
+
+    def log_stats(self) -> None:
+        self._reported_at = time.monotonic()
+        for name, report in self.stats().items():
+            logger.info(
+                f"Stage {name}: {report['jobs']} done, {report['failures']} failed, "
+                f"{report['jobs_per_minute']:.2f}/min, {report['avg_seconds']:.1f}s avg, "
+                f"{report['utilization']:.0%} busy"
+            )
+
+    # Stages
+
+    def _fetch(self, job: _Job) -> None:
+        scratch_dir = job.cleanup.enter_context(self.scratch.job(job.video_id))
+        try:
+            job.video = fetch_video(job.video_id, scratch_dir, self.heartbeat.owner, job.profile)
+        except VideoLeased as e:
+            job.result = {"status": "skipped", "message": str(e)}
+            return
+        if job.video is None:
+            job.result = {"status": "success"}
+
+    def _transcode(self, job: _Job) -> None:
+        executor = self._executor
+        try:
+            job.video = executor.submit(transcode_video, job.video).result()
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            raise
+
+    def _publish(self, job: _Job) -> None:
+        try:
+            publish_video(job.video, self.heartbeat.owner)
+        except VideoLeased as e:
+            job.result = {"status": "skipped", "message": str(e)}
+
+    def _run_stage(self, name: str, work: Callable[[_Job], None]) -> None:
+        """Stage thread: take jobs from the stage's queue until a None sentinel arrives"""
+        following = {FETCH: TRANSCODE, TRANSCODE: PUBLISH}.get(name)
+        while True:
+            job = self._queues[name].get()
+            if job is None:
+                return
+
+            start = time.monotonic()
+            try:
+                work(job)
+            except Exception as e:
+                self._record(name, start, ok=False)
+                logger.error(f"Stage {name} failed for video {job.video_id}: {e}", exc_info=True)
+                mark_video_failed(job.video_id, self.heartbeat.owner)
+                self._finish(job, {"status": "failed", "error": str(e)}, name)
+                continue
+
+            self._record(name, start, ok=True)
+            if following and job.result is None:
+                # Blocks while the next stage is busy and its queue is full
+                self._queues[following].put(job)
+                self._moved(name)
+            else:
+                self._finish(job, job.result or {"status": "success"}, name)
+
+    def _record(self, name: str, start: float, ok: bool) -> None:
+        with self._changed:
+            stage = self.stages[name]
+            stage.busy_seconds += time.monotonic() - start
+            if ok:
+                stage.jobs += 1
+            else:
+                stage.failures += 1
+
+    def _moved(self, name: str) -> None:
+        """A job left stage name for the next one"""
+        with self._changed:
+            if name == FETCH:
+                self._fetching -= 1
+            self._changes += 1
+            self._changed.notify_all()
+
+    def _finish(self, job: _Job, result: dict, name: str) -> None:
+        """Release the job's scratch space and delete or leave its message"""
+        job.cleanup.close()
+        # Stop extending before the message is deleted or left for SQS to retry
+        self.heartbeat.untrack(job.receipt_handle)
+        try:
+            succeeded = _finish_message(job.video_id, job.receipt_handle, result)
+        except Exception as e:
+            logger.error(f"Error finishing video {job.video_id}: {e}", exc_info=True)
+            succeeded = False
+
+        with self._changed:
+            if succeeded:
+                self.messages_processed += 1
+            if name == FETCH:
+                self._fetching -= 1
+            self._in_pipeline -= 1
+            self._changes += 1
+            self._changed.notify_all()
+
+    def _restart_pool(self, broken: Executor) -> None:
+        """Replace a broken pool once; the other jobs it was running fail and are retried"""
+        with self._changed:
+            if self._executor is not broken:
+                return
+            logger.error("Pool process died; restarting the pool")
+            broken.shutdown(wait=False)
+            self._executor = self._executor_factory(self.concurrency)
@@ -0,0 +1,75 @@
+"""Probe stage: inspect a source and pick the cheapest way to meet the output spec"""
+
+import logging
+import os
+from typing import Iterable, Optional
+
+from app.worker.mp4 import MediaInfo, MP4Error, find_top_level_boxes, media_info
+from app.worker.transcoding import COPY, FULL, OVERLAY, TranscodeSpec
+
+logger = logging.getLogger(__name__)
+
+
+def probe(path: str) -> Optional[MediaInfo]:
+    """
+    Read codecs, dimensions and duration of a local MP4/MOV file
+
+    Only the box headers and the moov box are read, so this works on the
+    sparse files written by fetch_source.
+
+    Returns:
+        MediaInfo, or None if the file can't be inspected (not MP4, fragmented,
+        corrupt); callers should then assume a full transcode is needed
+    """
+    try:
+        with open(path, "rb") as f:
+
+            def read(offset: int, length: int) -> bytes:
+                f.seek(offset)
+                return f.read(length)
+
+            moov = find_top_level_boxes(read, os.path.getsize(path))[-1]
+            return media_info(read(moov.offset, moov.size), moov)
+    except (MP4Error, OSError) as e:
+        logger.info(f"Could not probe {path}: {e}")
+        return None
+
+
+def _matches_output(info: MediaInfo, spec: TranscodeSpec) -> bool:
+    """True if the source streams can go into the output without re-encoding"""
+    return (
+        info.video_codec == "h264"
+        and info.yuv420
+        and not info.rotated
+        and info.height == spec.height
+        and info.width % 2 == 0
+        and info.audio_codec in (None, "aac")
+    )
+
+
+def choose_strategy(
+    info: Optional[MediaInfo], spec: TranscodeSpec, supported: Iterable[str] = (FULL,)
+) -> str:
+    """
+    Pick the cheapest transcoding strategy that still meets spec
+
+    A source that is already H.264/AAC at the output height only needs the
+    watermark burned in (OVERLAY: no scaling, audio copied); if the spec has no
+    watermark either, trimming is all that is left (COPY). Anything else, or
+    anything the probe couldn't read, is transcoded in full. Sources smaller
+    than the output height still go through FULL, which scales them up, and so
+    does any spec with extra renditions, which are scaled from decoded frames.
+
+    Args:
+        info: Probe result (None = unknown)
+        spec: Output spec
+        supported: Strategies the engine implements
+    """
+    supported = set(supported)
+    if info is None or spec.renditions or not _matches_output(info, spec):
+        return FULL
+    if not spec.watermark_text and COPY in supported:
+        return COPY
+    if OVERLAY in supported:
+        return OVERLAY
+    return FULL
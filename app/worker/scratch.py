@@ -0,0 +1,118 @@
+"""Scratch space for worker temp files: per-job directories under one budgeted root"""
+
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _allocated_bytes(path: str) -> int:
+    """Bytes allocated on disk under path (sparse files count what is actually written)"""
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_blocks * 512
+            except OSError:
+                # Removed by a finishing job while walking
+                continue
+    return total
+
+
+class ScratchSpace:
+    """
+    Per-job temp directories under a configurable root
+
+    The root (WORKER_SCRATCH_DIR) should be fast local storage: a tmpfs or
+    the instance's NVMe disk. Every job gets its own directory, removed when
+    the job ends, so nothing a job writes outlives it. The worker owns the
+    root exclusively: at startup, and after a pool process crash, any job
+    directory left behind is an orphan and is deleted.
+
+    Before accepting messages the worker asks capacity() how many more jobs
+    fit: every job is assumed to need up to WORKER_SCRATCH_JOB_BYTES, the
+    filesystem must keep WORKER_SCRATCH_RESERVE free, and the root may not
+    grow beyond WORKER_SCRATCH_QUOTA (0 = no quota besides the filesystem).
+    """
+
+    PREFIX = "job-"
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        job_bytes: Optional[int] = None,
+        reserve: Optional[int] = None,
+        quota: Optional[int] = None,
+    ):
+        self.root = (
+            root
+            or settings.WORKER_SCRATCH_DIR
+            or os.path.join(tempfile.gettempdir(), "video-worker")
+        )
+        self.job_bytes = job_bytes or settings.WORKER_SCRATCH_JOB_BYTES
+        self.reserve = settings.WORKER_SCRATCH_RESERVE if reserve is None else reserve
+        self.quota = settings.WORKER_SCRATCH_QUOTA if quota is None else quota
+
+    @contextmanager
+    def job(self, name: str) -> Iterator[str]:
+        """Create a directory for one job and remove it, whatever it holds, on exit"""
+        os.makedirs(self.root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f"{self.PREFIX}{name}-", dir=self.root)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def usage(self) -> int:
+        """Bytes allocated under the root"""
+        return _allocated_bytes(self.root)
+
+    def capacity(self, reserved_jobs: int = 0) -> int:
+        """
+        Number of additional jobs that fit in the scratch budget
+
+        Args:
+            reserved_jobs: Jobs already running, which may still grow to job_bytes each
+        """
+        os.makedirs(self.root, exist_ok=True)
+        available = shutil.disk_usage(self.root).free - self.reserve
+        if self.quota:
+            available = min(available, self.quota - self.usage())
+        return max(0, available // self.job_bytes - reserved_jobs)
+
+    def cleanup_orphans(self) -> int:
+        """
+        Delete job directories left behind by crashed jobs
+
+        Only call this while no job of this worker is running.
+
+        Returns:
+            Number of directories removed
+        """
+        if not os.path.isdir(self.root):
+            return 0
+
+        removed = 0
+        freed = 0
+        for entry in os.scandir(self.root):
+            if not (entry.name.startswith(self.PREFIX) and entry.is_dir(follow_symlinks=False)):
+                continue
+            freed += _allocated_bytes(entry.path)
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+
+        if removed:
+            logger.warning(
+                f"Removed {removed} orphaned scratch director(ies) from {self.root} "
+                f"({freed / 1024 / 1024:.1f} MB)"
+            )
+        return removed
+
+
+scratch_space = ScratchSpace()
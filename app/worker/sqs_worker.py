@@ -2,12 +2,20 @@
 
 import json
 import logging
+import os
 import signal
 import sys
 import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
 
 from app.core.config import settings
-from app.services.queue import sqs_service
+from app.services.queue import NORMAL, sqs_service
+from app.worker.heartbeat import VisibilityHeartbeat
+from app.worker.scratch import ScratchSpace, scratch_space
+from app.worker.transcoding import PROFILES
 from app.worker.videos import process_video_sync
 
 # Configure logging
@@ -27,72 +35,335 @@ def signal_handler(signum, frame):
     shutdown_requested = True
 
 
-def process_message(message: dict) -> bool:
+def _parse_message(message: dict) -> Optional[str]:
     """
-    Process a single SQS message
-
-    Args:
-        message: SQS message dictionary
+    Extract the video ID from a message, deleting it if it is malformed
 
     Returns:
-        True if processing was successful, False otherwise
+        Video ID, or None if the message can't be processed
     """
     try:
-        body = json.loads(message["Body"])
-        video_id = body["video_id"]
-        receipt_handle = message["ReceiptHandle"]
-
-        logger.info(f"Processing video {video_id}")
-
-        # Process video (synchronous function)
-        result = process_video_sync(video_id)
-
-        if result.get("status") == "success":
-            # Delete message on success
-            sqs_service.delete_message(receipt_handle)
-            logger.info(f"Successfully processed video {video_id}")
-            return True
-        else:
-            # Processing failed, but function returned
-            # Let SQS retry (message will become visible again after timeout)
-            logger.error(f"Processing failed for video {video_id}: {result.get('error')}")
-            return False
-
-    except json.JSONDecodeError as e:
+        return json.loads(message["Body"])["video_id"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
         logger.error(f"Invalid message format: {e}")
         # Delete malformed message so it doesn't block the queue
         try:
             sqs_service.delete_message(message["ReceiptHandle"])
         except Exception:
             pass
-        return False
+        return None
 
-    except Exception as e:
-        logger.error(f"Error processing message: {e}", exc_info=True)
-        # Let SQS retry by not deleting the message
+
+def _message_profile(message: dict) -> Optional[str]:
+    """
+    Encoding profile requested in the message metadata, if any
+
+    Unknown profiles are ignored (the configured default is used) rather than
+    failing the video over a bad hint.
+    """
+    try:
+        profile = json.loads(message["Body"]).get("metadata", {}).get("encoding_profile")
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return None
+    if profile is not None and profile not in PROFILES:
+        logger.warning(f"Ignoring unknown encoding profile {profile!r}")
+        return None
+    return profile
+
+
+def _message_lane(message: dict) -> str:
+    """Lane a message was received from (see SQSService.receive_messages)"""
+    return message.get("Lane", NORMAL)
+
+
+def _finish_message(video_id: str, receipt_handle: str, result: dict) -> bool:
+    """
+    Delete the message if processing succeeded; otherwise leave it for SQS to retry
+
+    A skipped video is leased by another worker, which finishes it; the
+    duplicate is deleted too, so it doesn't come back after every visibility
+    timeout and end up in the dead-letter queue.
+
+    Returns:
+        True if the video was processed
+    """
+    if result.get("status") == "success":
+        # Delete message on success
+        sqs_service.delete_message(receipt_handle)
+        logger.info(f"Successfully processed video {video_id}")
+        return True
+
+    if result.get("status") == "skipped":
+        sqs_service.delete_message(receipt_handle)
+        logger.info(f"Skipped video {video_id}: {result.get('message')}")
         return False
 
+    # Processing failed, but function returned
+    # Let SQS retry (message will become visible again after timeout)
+    logger.error(f"Processing failed for video {video_id}: {result.get('error')}")
+    return False
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use
+
+    Honours CPU affinity and, on cgroup v2 hosts such as Fargate, the container
+    CPU quota, which os.cpu_count() ignores.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return cpus
+
+
+def _init_pool_process() -> None:  # pragma: no cover - runs in the child process
+    """Prepare a pool process: leave shutdown to the parent and drop inherited DB sockets"""
+    # SIGTERM/SIGINT are sent to the whole process group; the parent decides
+    # when to stop and lets in-flight transcodes finish
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from app.db.database import engine
+
+    engine.dispose(close=False)
+
+
+class SlotWorker(ABC):
+    """
+    Base of the workers: only receives messages it can start right away
+
+    A subclass has free_slots for new messages and running_jobs holding
+    scratch space, and reap() waits for running jobs to move on. Slots are
+    further limited by the scratch space budget, so a job is only accepted if
+    its temp files fit.
+    """
+
+    # Longest wait for a running job to free a slot
+    SLOT_WAIT_TIME = 20
+    # Pause when scratch space is full and no running job will free any up
+    DISK_WAIT_TIME = 10
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+        heartbeat: Optional[VisibilityHeartbeat] = None,
+        scratch: Optional[ScratchSpace] = None,
+    ):
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY or available_cpus()
+        self._executor_factory = executor_factory or (
+            lambda workers: ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_process)
+        )
+        self._executor: Optional[Executor] = None
+        self.heartbeat = heartbeat or VisibilityHeartbeat()
+        self.scratch = scratch or scratch_space
+        self.messages_processed = 0
+
+    @property
+    @abstractmethod
+    def free_slots(self) -> int:
+        """Messages that can be taken now"""
+
+    @property
+    @abstractmethod
+    def running_jobs(self) -> int:
+        """Jobs holding scratch space"""
+
+    @property
+    def open_slots(self) -> int:
+        """Free slots whose jobs also fit in the scratch space budget"""
+        if self.free_slots <= 0:
+            return 0
+        return min(self.free_slots, self.scratch.capacity(reserved_jobs=self.running_jobs))
+
+    @abstractmethod
+    def poll(self) -> int:
+        """Receive up to open_slots messages and start them; returns how many were dispatched"""
+
+    @abstractmethod
+    def reap(self, timeout: Optional[float] = 0) -> int:
+        """Handle jobs that moved on, waiting up to timeout for at least one"""
+
+    def run_once(self) -> None:
+        """One scheduling step: fill open slots, or wait for a slot to free up"""
+        if self.open_slots > 0:
+            self.poll()
+            self.reap()
+            return
+
+        if self.free_slots > 0:
+            logger.warning(f"Scratch space {self.scratch.root} is full; not accepting messages")
+        if self.running_jobs:
+            self.reap(timeout=self.SLOT_WAIT_TIME)
+        else:
+            time.sleep(self.DISK_WAIT_TIME)
+
+
+class ConcurrentWorker(SlotWorker):
+    """
+    Receives messages in batches and transcodes them in a process pool
+
+    The worker only asks SQS for as many messages as it has free slots (at
+    most 10 per call), so every received message starts immediately and no
+    visibility timeout is spent waiting in a local backlog. While a video is
+    transcoded, a VisibilityHeartbeat keeps extending its message so long
+    transcodes are not redelivered. SQS calls stay in the parent process;
+    pool processes only run process_video_sync, claiming videos with the
+    heartbeat's lease owner ID so the leases they take are the ones it renews.
+    """
+
+    # Long-poll wait when idle vs. while transcodes are running, so finished
+    # jobs are reaped (and their messages deleted) promptly
+    IDLE_WAIT_TIME = 20
+    BUSY_WAIT_TIME = 1
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+        heartbeat: Optional[VisibilityHeartbeat] = None,
+        scratch: Optional[ScratchSpace] = None,
+    ):
+        super().__init__(concurrency, executor_factory, heartbeat, scratch)
+        # future -> (video_id, receipt_handle)
+        self.in_flight: Dict[Future, Tuple[str, str]] = {}
+
+    @property
+    def free_slots(self) -> int:
+        return self.concurrency - len(self.in_flight)
+
+    @property
+    def running_jobs(self) -> int:
+        return len(self.in_flight)
+
+    def start(self) -> None:
+        """Clear orphaned scratch files, create the pool and start the visibility heartbeat"""
+        self.scratch.cleanup_orphans()
+        self._executor = self._executor_factory(self.concurrency)
+        self.heartbeat.start()
+        logger.info(f"Worker pool started with {self.concurrency} process(es)")
+
+    def poll(self) -> int:
+        """
+        Receive up to open_slots messages and submit them to the pool
+
+        Returns:
+            Number of messages dispatched
+        """
+        slots = self.open_slots
+        if slots <= 0:
+            return 0
+
+        wait_time = self.BUSY_WAIT_TIME if self.in_flight else self.IDLE_WAIT_TIME
+        messages = sqs_service.receive_messages(max_messages=min(10, slots), wait_time=wait_time)
+
+        dispatched = 0
+        for message in messages:
+            video_id = _parse_message(message)
+            if video_id is None:
+                continue
+            logger.info(f"Processing video {video_id} ({_message_lane(message)} lane)")
+            future = self._executor.submit(
+                process_video_sync, video_id, self.heartbeat.owner, _message_profile(message)
+            )
+            self.in_flight[future] = (video_id, message["ReceiptHandle"])
+            self.heartbeat.track(message["ReceiptHandle"], video_id)
+            dispatched += 1
+        return dispatched
+
+    def reap(self, timeout: Optional[float] = 0) -> int:
+        """
+        Handle finished jobs, waiting up to timeout for at least one
+
+        Returns:
+            Number of jobs finished
+        """
+        if not self.in_flight:
+            return 0
+
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            video_id, receipt_handle = self.in_flight.pop(future)
+            # Stop extending before the message is deleted or left for SQS to retry
+            self.heartbeat.untrack(receipt_handle)
+            try:
+                if _finish_message(video_id, receipt_handle, future.result()):
+                    self.messages_processed += 1
+            except BrokenProcessPool:
+                broken = True
+                logger.error(f"Pool process died while processing video {video_id}")
+            except Exception as e:
+                # Let SQS retry by not deleting the message
+                logger.error(f"Error processing video {video_id}: {e}", exc_info=True)
+
+        if broken:
+            self._restart_pool()
+        return len(done)
+
+    def shutdown(self) -> None:
+        """Stop receiving and wait for in-flight transcodes to finish"""
+        if self.in_flight:
+            logger.info(f"Waiting for {len(self.in_flight)} in-flight video(s) to finish")
+        while self.in_flight:
+            self.reap(timeout=None)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.heartbeat.stop()
+
+    def _restart_pool(self) -> None:
+        """Replace a broken pool; messages of lost jobs reappear after their visibility timeout"""
+        for future, (video_id, receipt_handle) in list(self.in_flight.items()):
+            if future.done():
+                continue
+            logger.warning(f"Abandoning video {video_id}; SQS will redeliver it")
+            self.in_flight.pop(future)
+            self.heartbeat.untrack(receipt_handle)
+        self._executor.shutdown(wait=False)
+        # Nothing is running now; the dead jobs' files would otherwise leak
+        self.scratch.cleanup_orphans()
+        self._executor = self._executor_factory(self.concurrency)
+
 
 def _log_startup_info():  # pragma: no cover
     """Log worker startup information"""
     logger.info("=" * 80)
     logger.info("Starting SQS Video Processing Worker (Entrega 4)")
     logger.info(f"Queue URL: {settings.SQS_QUEUE_URL}")
+    for lane, weight in sqs_service.scheduler.weights.items():
+        logger.info(f"Lane {lane}: {sqs_service.lane_url(lane)} (weight {weight})")
     logger.info(f"DLQ URL: {settings.SQS_DLQ_URL}")
     logger.info(f"Region: {settings.AWS_REGION}")
+    logger.info(f"Concurrency: {settings.WORKER_CONCURRENCY or available_cpus()}")
+    logger.info(f"Mode: {settings.WORKER_MODE}")
     logger.info("=" * 80)
 
 
 def _check_initial_queue_status():  # pragma: no cover
     """Check and log initial queue status"""
     try:
-        attrs = sqs_service.get_queue_attributes()
-        logger.info("Queue status at startup:")
-        logger.info(f"  - Messages available: {attrs.get('ApproximateNumberOfMessages', 0)}")
-        logger.info(
-            f"  - Messages in flight: {attrs.get('ApproximateNumberOfMessagesNotVisible', 0)}"
-        )
-        logger.info(f"  - Messages delayed: {attrs.get('ApproximateNumberOfMessagesDelayed', 0)}")
+        for lane in sqs_service.lane_urls:
+            attrs = sqs_service.get_queue_attributes(lane)
+            logger.info(f"Queue status at startup ({lane} lane):")
+            logger.info(f"  - Messages available: {attrs.get('ApproximateNumberOfMessages', 0)}")
+            logger.info(
+                f"  - Messages in flight: {attrs.get('ApproximateNumberOfMessagesNotVisible', 0)}"
+            )
+            logger.info(
+                f"  - Messages delayed: {attrs.get('ApproximateNumberOfMessagesDelayed', 0)}"
+            )
 
         dlq_count = sqs_service.get_dlq_messages_count()
         if dlq_count > 0:
@@ -101,32 +372,6 @@ def _check_initial_queue_status():  # pragma: no cover
         logger.warning(f"Could not get initial queue status: {e}")
 
 
-def _process_messages(
-    consecutive_empty_polls: int, messages_processed: int
-) -> tuple:  # pragma: no cover
-    """Process messages from queue and return updated counters"""
-    messages = sqs_service.receive_messages(max_messages=1, wait_time=20)
-
-    if messages:
-        consecutive_empty_polls = 0
-        for message in messages:
-            if shutdown_requested:
-                logger.info("Shutdown requested, stopping message processing")
-                break
-
-            if process_message(message):
-                messages_processed += 1
-    else:
-        consecutive_empty_polls += 1
-        if consecutive_empty_polls % 3 == 0:
-            logger.debug(
-                f"No messages (empty polls: {consecutive_empty_polls}, "
-                f"total processed: {messages_processed})"
-            )
-
-    return consecutive_empty_polls, messages_processed
-
-
 def main():  # pragma: no cover
     """Main worker loop"""
     signal.signal(signal.SIGTERM, signal_handler)
@@ -135,14 +380,18 @@ def main():  # pragma: no cover
     _log_startup_info()
     _check_initial_queue_status()
 
-    consecutive_empty_polls = 0
-    messages_processed = 0
+    if settings.WORKER_MODE == "pipeline":
+        # Imported here: the pipeline builds on this module's message helpers
+        from app.worker.pipeline import PipelinedWorker
+
+        worker = PipelinedWorker()
+    else:
+        worker = ConcurrentWorker()
+    worker.start()
 
     while not shutdown_requested:
         try:
-            consecutive_empty_polls, messages_processed = _process_messages(
-                consecutive_empty_polls, messages_processed
-            )
+            worker.run_once()
         except KeyboardInterrupt:
             logger.info("Keyboard interrupt received, shutting down...")
             break
@@ -150,8 +399,12 @@ def main():  # pragma: no cover
             logger.error(f"Worker error: {e}", exc_info=True)
             time.sleep(5)
 
+    worker.shutdown()
+
     logger.info("=" * 80)
-    logger.info(f"Worker shutting down gracefully. Total messages processed: {messages_processed}")
+    logger.info(
+        f"Worker shutting down gracefully. Total messages processed: {worker.messages_processed}"
+    )
     logger.info("=" * 80)
     sys.exit(0)
 
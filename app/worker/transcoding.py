@@ -0,0 +1,506 @@
+"""Pluggable transcoding engines for the video worker"""
+
+import logging
+import math
+import os
+import shutil
+import subprocess
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.worker.watermark import watermark_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodeError(Exception):
+    """Raised when a transcoding engine fails to produce the output video"""
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """Speed/quality trade-off of the encoder, independent of the hardware it runs on"""
+
+    name: str
+    preset: str  # x264 preset
+    crf: int  # Constant rate factor: lower = better quality, bigger files
+    threads: int  # Encoder threads; 0 = FFMPEG_THREADS, then the encoder's default
+    audio_bitrate: str
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        EncodingProfile("fast", preset="veryfast", crf=26, threads=0, audio_bitrate="96k"),
+        EncodingProfile("balanced", preset="medium", crf=23, threads=0, audio_bitrate="128k"),
+        EncodingProfile("archival", preset="slow", crf=18, threads=0, audio_bitrate="192k"),
+    )
+}
+
+
+def get_profile(name: Optional[str] = None) -> EncodingProfile:
+    """
+    Return an encoding profile by name (default: ENCODING_PROFILE)
+
+    Raises:
+        ValueError: If the profile doesn't exist
+    """
+    name = name or settings.ENCODING_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile: {name}")
+    return PROFILES[name]
+
+
+# Preview image kinds (see preview_path)
+POSTER = "poster"
+SPRITE = "sprite"
+
+# Encoder options of each preview image format
+PREVIEW_FORMATS = {
+    "jpg": ["-q:v", "3"],
+    "webp": ["-quality", "80"],
+}
+
+
+@dataclass(frozen=True)
+class PreviewSpec:
+    """Poster frame and thumbnail sprite sheet written next to the output"""
+
+    format: str = "jpg"  # "jpg" or "webp"
+    poster_seconds: float = 1  # Poster frame time; the first frame on shorter videos
+    sprite_interval: float = 2  # One sprite thumbnail every this many seconds
+    sprite_columns: int = 5
+    thumbnail_height: int = 90
+
+    def __post_init__(self):
+        if self.format not in PREVIEW_FORMATS:
+            raise ValueError(f"Unknown preview format: {self.format}")
+
+    def sprite_rows(self, duration: float) -> int:
+        """Rows of the sprite sheet holding the thumbnails of duration seconds"""
+        return max(1, math.ceil(duration / self.sprite_interval / self.sprite_columns))
+
+
+@dataclass(frozen=True)
+class TranscodeSpec:
+    """What the processed video should look like"""
+
+    max_duration: float = 30
+    height: int = 720
+    watermark_text: str = "ANF Rising Stars Showcase"
+    font_size: int = 36
+    video_codec: str = "libx264"
+    audio_codec: str = "aac"
+    profile: Optional[str] = None  # Encoding profile name; None = ENCODING_PROFILE
+    # Heights of extra, smaller renditions written next to the output (see rendition_path)
+    renditions: Tuple[int, ...] = ()
+    # Force a keyframe every this many seconds (0 = encoder's choice), so HLS
+    # segments can be cut at that length and line up across renditions
+    keyframe_interval: float = 0
+    # Poster and sprite sheet taken from the output frames (None = no images)
+    previews: Optional[PreviewSpec] = None
+
+
+def parse_renditions(value: str, height: int = 720) -> Tuple[int, ...]:
+    """
+    Parse OUTPUT_RENDITIONS ("360,480,720") into extra rendition heights
+
+    The output height itself and anything above it are dropped: the main
+    output is always the top rendition.
+
+    Raises:
+        ValueError: If a height is not a positive even number
+    """
+    heights = set()
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        rendition = int(item)
+        if rendition <= 0 or rendition % 2:
+            raise ValueError(f"Invalid rendition height: {item.strip()}")
+        if rendition < height:
+            heights.add(rendition)
+    return tuple(sorted(heights, reverse=True))
+
+
+def rendition_path(path: str, height: int) -> str:
+    """Path (or storage key) of the rendition of the output at path: out.mp4 -> out_360p.mp4"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{height}p{ext}"
+
+
+def preview_path(path: str, kind: str, image_format: str) -> str:
+    """Path (or storage key) of a preview image of the output at path: out.mp4 -> out_poster.jpg"""
+    return f"{os.path.splitext(path)[0]}_{kind}.{image_format}"
+
+
+DEFAULT_SPEC = TranscodeSpec(
+    renditions=parse_renditions(settings.OUTPUT_RENDITIONS),
+    keyframe_interval=settings.HLS_SEGMENT_SECONDS if settings.HLS_PACKAGING else 0,
+    previews=(
+        PreviewSpec(
+            format=settings.PREVIEW_FORMAT,
+            poster_seconds=settings.POSTER_SECONDS,
+            sprite_interval=settings.SPRITE_INTERVAL,
+            sprite_columns=settings.SPRITE_COLUMNS,
+            thumbnail_height=settings.SPRITE_THUMBNAIL_HEIGHT,
+        )
+        if settings.PREVIEW_IMAGES
+        else None
+    ),
+)
+
+# How a source is turned into the output, cheapest last:
+# decode, scale, watermark and encode everything
+FULL = "full"
+# already at the output height with H.264/AAC: watermark and re-encode video only
+OVERLAY = "overlay"
+# nothing to change but the length: stream copy, no encoding (frames are only
+# decoded for preview images)
+COPY = "copy"
+
+
+class TranscodingEngine(ABC):
+    """Interface for transcoding engines"""
+
+    name: str = ""
+    # Strategies the engine implements; FULL is always supported
+    strategies: Tuple[str, ...] = (FULL,)
+    # Whether spec.renditions are written; other engines only write the main output
+    writes_renditions: bool = False
+    # Whether spec.previews are written
+    writes_previews: bool = False
+
+    @abstractmethod
+    def transcode(
+        self,
+        input_path: str,
+        output_path: str,
+        spec: TranscodeSpec = DEFAULT_SPEC,
+        strategy: str = FULL,
+    ) -> None:
+        """
+        Trim, scale and watermark input_path into output_path
+
+        Engines that set writes_renditions also write every height in
+        spec.renditions to rendition_path(output_path, height), and those
+        that set writes_previews the poster and sprite sheet of spec.previews
+        to preview_path(output_path, POSTER/SPRITE, format).
+
+        Args:
+            strategy: One of self.strategies, normally chosen by probe.choose_strategy
+
+        Raises:
+            TranscodeError: If the output could not be produced
+        """
+
+
+def find_ffmpeg() -> Optional[str]:
+    """
+    Locate the ffmpeg binary
+
+    Order: FFMPEG_BINARY setting, IMAGEIO_FFMPEG_EXE, ffmpeg on PATH, and
+    finally the binary bundled with imageio-ffmpeg (installed with moviepy).
+    """
+    for candidate in (settings.FFMPEG_BINARY, os.getenv("IMAGEIO_FFMPEG_EXE")):
+        if candidate and os.path.exists(candidate):
+            return candidate
+
+    on_path = shutil.which("ffmpeg")
+    if on_path:
+        return on_path
+
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+class FFmpegEngine(TranscodingEngine):
+    """
+    Single ffmpeg invocation: trim, scale and overlay in one filter graph
+
+    Frames never enter Python. The input is read only up to max_duration
+    (input-side -t), scaled and composited with the watermark PNG inside
+    ffmpeg, and the output is written with the moov atom up front
+    (+faststart) so players can start before the download finishes. The
+    watermark PNG comes from the shared watermark cache. OVERLAY skips the
+    scale and copies the audio; COPY remuxes without decoding.
+
+    Renditions come out of the same invocation: the decoded frames are
+    split, and each branch is scaled, watermarked and encoded into its own
+    output, so the source is decoded once however many renditions there are.
+    Poster and sprite sheet are branches of the same graph too, taken from
+    the top output's frames after the watermark.
+    """
+
+    name = "ffmpeg"
+    strategies = (FULL, OVERLAY, COPY)
+    writes_renditions = True
+    writes_previews = True
+
+    def __init__(
+        self,
+        binary: Optional[str] = None,
+        threads: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.binary = binary or find_ffmpeg()
+        if not self.binary:
+            raise TranscodeError("ffmpeg binary not found")
+        self.threads = settings.FFMPEG_THREADS if threads is None else threads
+        self.timeout = timeout or settings.TRANSCODE_TIMEOUT
+
+    def build_command(
+        self,
+        input_path: str,
+        output_path: str,
+        watermark_path: Optional[str],
+        spec: TranscodeSpec,
+        strategy: str = FULL,
+        renditions: Sequence[Tuple[int, str, Optional[str]]] = (),
+    ) -> List[str]:
+        """
+        Build the ffmpeg argument list (no watermark input when watermark_path is None)
+
+        Args:
+            renditions: Extra (height, output_path, watermark_path) outputs; FULL only
+        """
+        command = [
+            self.binary,
+            "-hide_banner",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-y",
+            "-t",
+            str(spec.max_duration),
+            "-i",
+            input_path,
+        ]
+        if strategy == COPY:
+            copy = ["-map", "0:v", "-map", "0:a?", "-c", "copy", "-movflags", "+faststart"]
+            if not spec.previews:
+                return command + copy + [output_path]
+            filters, preview_args = self._preview_outputs("[0:v]", spec, output_path)
+            return (
+                command
+                + ["-filter_complex", ";".join(filters)]
+                + copy
+                + [output_path]
+                + preview_args
+            )
+        if renditions and strategy != FULL:
+            raise ValueError("Renditions need the FULL strategy")
+
+        profile = get_profile(spec.profile)
+        # (label suffix, height, output path, watermark path), main output first
+        outputs = [("", spec.height, output_path, watermark_path)]
+        outputs += [(str(height), height, path, wm) for height, path, wm in renditions]
+
+        filters = []
+        sources = ["[0:v]"]
+        if len(outputs) > 1:
+            sources = [f"[in{suffix}]" for suffix, *_ in outputs]
+            filters.append(f"[0:v]split={len(outputs)}{''.join(sources)}")
+
+        output_args: List[str] = []
+        for (suffix, height, path, watermark), video in zip(outputs, sources):
+            label = f"[v{suffix}]"
+            # The top output's frames are split again for the preview images
+            end = "[vtop]" if spec.previews and not suffix else label
+            if strategy == FULL:
+                filters.append(f"{video}scale=-2:{height}[base{suffix}]")
+                video = f"[base{suffix}]"
+            if watermark:
+                command += ["-i", watermark]
+                watermark_input = command.count("-i") - 1
+                filters.append(
+                    f"{video}[{watermark_input}:v]overlay=x=(W-w)/2:y=H-h:format=auto{end}"
+                )
+            else:
+                filters.append(f"{video}null{end}")
+            output_args += self._output_args(label, spec, profile, strategy) + [path]
+
+        if spec.previews:
+            preview_filters, preview_args = self._preview_outputs(
+                "[vtop]", spec, output_path, keep="[v]"
+            )
+            filters += preview_filters
+            output_args += preview_args
+
+        return command + ["-filter_complex", ";".join(filters)] + output_args
+
+    def _preview_outputs(
+        self, video: str, spec: TranscodeSpec, output_path: str, keep: Optional[str] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Filters and output arguments of the poster and the sprite sheet
+
+        Args:
+            video: Label of the frames to take the images from
+            keep: Label to pass those frames on under, for another output
+
+        Returns:
+            (filters, output arguments)
+        """
+        previews = spec.previews
+        at = f"{previews.poster_seconds:g}"
+        rows = previews.sprite_rows(spec.max_duration)
+        branches = ([keep] if keep else []) + ["[posterin]", "[spritein]"]
+        filters = [
+            f"{video}split={len(branches)}{''.join(branches)}",
+            # The first frame and the first one at poster_seconds: the poster file
+            # is overwritten, so it ends up with the latter if the video is long enough
+            f"[posterin]select=eq(n\\,0)+gte(t\\,{at})*lt(prev_selected_t\\,{at})[poster]",
+            f"[spritein]fps=1/{previews.sprite_interval:g},"
+            f"scale=-2:{previews.thumbnail_height},"
+            f"tile={previews.sprite_columns}x{rows}[sprite]",
+        ]
+        quality = PREVIEW_FORMATS[previews.format]
+        args = ["-map", "[poster]", "-fps_mode", "passthrough"] + quality
+        args += ["-update", "1", preview_path(output_path, POSTER, previews.format)]
+        args += ["-map", "[sprite]", "-frames:v", "1"] + quality
+        args += ["-update", "1", preview_path(output_path, SPRITE, previews.format)]
+        return filters, args
+
+    def _output_args(
+        self, video: str, spec: TranscodeSpec, profile: EncodingProfile, strategy: str
+    ) -> List[str]:
+        """Mapping and encoder options of one output"""
+        args = [
+            "-map",
+            video,
+            "-map",
+            "0:a?",
+            "-c:v",
+            spec.video_codec,
+            "-preset",
+            profile.preset,
+            "-crf",
+            str(profile.crf),
+            "-pix_fmt",
+            "yuv420p",
+        ]
+        if spec.keyframe_interval:
+            args += ["-force_key_frames", f"expr:gte(t,n_forced*{spec.keyframe_interval})"]
+        if strategy == OVERLAY:
+            # The source audio already matches the output spec
+            args += ["-c:a", "copy"]
+        else:
+            args += ["-c:a", spec.audio_codec, "-b:a", profile.audio_bitrate]
+        args += ["-movflags", "+faststart"]
+
+        threads = profile.threads or self.threads
+        if threads:
+            args += ["-threads", str(threads)]
+        return args
+
+    def transcode(
+        self,
+        input_path: str,
+        output_path: str,
+        spec: TranscodeSpec = DEFAULT_SPEC,
+        strategy: str = FULL,
+    ) -> None:
+        def watermark(height: int) -> Optional[str]:
+            if strategy == COPY or not spec.watermark_text:
+                return None
+            return watermark_cache.get(spec.watermark_text, spec.font_size, height)
+
+        renditions = []
+        if strategy == FULL:
+            renditions = [
+                (height, rendition_path(output_path, height), watermark(height))
+                for height in spec.renditions
+            ]
+        command = self.build_command(
+            input_path, output_path, watermark(spec.height), spec, strategy, renditions
+        )
+        logger.debug(f"Running: {' '.join(command)}")
+
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired as e:
+            raise TranscodeError(f"ffmpeg timed out after {self.timeout}s") from e
+
+        if result.returncode != 0:
+            stderr = result.stderr.decode(errors="replace").strip()
+            raise TranscodeError(f"ffmpeg exited with {result.returncode}: {stderr[-2000:]}")
+
+
+class MoviePyEngine(TranscodingEngine):
+    """Frame-by-frame moviepy pipeline (previous implementation, kept as a fallback)"""
+
+    name = "moviepy"
+
+    def transcode(
+        self,
+        input_path: str,
+        output_path: str,
+        spec: TranscodeSpec = DEFAULT_SPEC,
+        strategy: str = FULL,
+    ) -> None:  # pragma: no cover
+        from moviepy import CompositeVideoClip, ImageClip, VideoFileClip
+
+        profile = get_profile(spec.profile)
+        original_clip = VideoFileClip(input_path)
+        try:
+            trim_duration = min(spec.max_duration, original_clip.duration)
+            clip = original_clip.subclipped(0, trim_duration)
+            clip = clip.resized(height=spec.height)
+            watermark = (
+                ImageClip(watermark_cache.get(spec.watermark_text, spec.font_size, spec.height))
+                .with_position(("center", "bottom"))
+                .with_duration(clip.duration)
+            )
+            final_clip = CompositeVideoClip([clip, watermark])
+
+            # Save the processed video
+            final_clip.write_videofile(
+                output_path,
+                codec=spec.video_codec,
+                audio_codec=spec.audio_codec,
+                preset=profile.preset,
+                threads=profile.threads or None,
+                audio_bitrate=profile.audio_bitrate,
+                ffmpeg_params=["-crf", str(profile.crf)],
+            )
+
+            # Clean up moviepy objects to free memory
+            final_clip.close()
+            clip.close()
+        finally:
+            original_clip.close()
+
+
+ENGINES = {FFmpegEngine.name: FFmpegEngine, MoviePyEngine.name: MoviePyEngine}
+
+_engines: Dict[str, TranscodingEngine] = {}
+
+
+def get_transcoder(name: Optional[str] = None) -> TranscodingEngine:
+    """
+    Return the configured engine (TRANSCODER_ENGINE), created once per process
+
+    Falls back to moviepy when the ffmpeg engine is selected but no ffmpeg
+    binary can be found.
+    """
+    name = name or settings.TRANSCODER_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcoding engine: {name}")
+
+    if name not in _engines:
+        try:
+            _engines[name] = ENGINES[name]()
+        except TranscodeError as e:
+            if name != FFmpegEngine.name:
+                raise
+            logger.warning(f"{e}; falling back to the moviepy engine")
+            _engines[name] = MoviePyEngine()
+
+    return _engines[name]
@@ -2,17 +2,35 @@
 
 import logging
 import os
-import tempfile
-
-from moviepy import CompositeVideoClip, TextClip, VideoFileClip
+import resource
+from dataclasses import dataclass, replace
+from typing import Optional
 
 from app.core.config import settings
 from app.core.storage import storage
 from app.db.database import SessionLocal
 from app.db.models import Video
+from app.worker import cache
+from app.worker.lease import VideoLeased, claim_video, finish_video
+from app.worker.packaging import MASTER_PLAYLIST, Variant, hls_directory, package_hls
+from app.worker.probe import choose_strategy, probe
+from app.worker.scratch import scratch_space
+from app.worker.source import fetch_source
+from app.worker.transcoding import (
+    DEFAULT_SPEC,
+    POSTER,
+    SPRITE,
+    TranscodeError,
+    get_transcoder,
+    preview_path,
+    rendition_path,
+)
 
 logger = logging.getLogger(__name__)
 
+# transcode_strategy of videos served from the processed-output cache
+REUSED = "reused"
+
 
 def resolve_container_path(file_path: str, fallback_base_dir: str = "/app") -> str:
     """
@@ -68,28 +86,24 @@ def ensure_directory_exists(file_path: str, fallback_base_dir: str = "/app") ->
         raise
 
 
-def _setup_file_paths(video, settings):
+def _setup_file_paths(video, settings, scratch_dir=None):
     """
     Setup file paths for video processing based on storage backend.
 
+    Args:
+        scratch_dir: Job directory for the S3 staging files (see ScratchSpace.job)
+
     Returns:
         tuple: (original_path, processed_path, temp_original, temp_processed)
     """
-    temp_original = None
-    temp_processed = None
-
     if settings.STORAGE_BACKEND == "s3":
-        # S3: Download to temp files for processing
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=".mp4"
-        ) as temp_orig, tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_proc:
-            temp_original = temp_orig.name
-            temp_processed = temp_proc.name
-
-            # Download original from S3
-            original_data = storage.download_file(video.original_file_path)
-            temp_orig.write(original_data)
-            temp_orig.flush()
+        # S3: Work on files in the job's scratch directory
+        temp_original = os.path.join(scratch_dir, "original.mp4")
+        temp_processed = os.path.join(scratch_dir, "processed.mp4")
+
+        # Fetch only the part of the original the trim will decode
+        fetch = fetch_source(video.original_file_path, temp_original, DEFAULT_SPEC.max_duration)
+        video.source_bytes_read = fetch.bytes_read
 
         return temp_original, temp_processed, temp_original, temp_processed
     else:
@@ -106,31 +120,247 @@ def _setup_file_paths(video, settings):
         return original_path, processed_path, None, None
 
 
-def _process_video_file(original_path, processed_path):  # pragma: no cover
+def _cpu_seconds() -> float:
+    """User + system CPU time of this process and its finished children (ffmpeg)"""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _process_video_file(original_path, processed_path, profile=None):  # pragma: no cover
     """
-    Apply video transformations using moviepy.
+    Trim to 30 s, scale to 720p and watermark with the configured engine.
+
+    The source is probed first so sources that already meet the output spec
+    take a cheaper path (see probe.choose_strategy).
+
+    Args:
+        profile: Encoding profile name (None = ENCODING_PROFILE)
 
     Returns:
-        None (writes to processed_path)
-    """
-    original_clip = VideoFileClip(original_path)
-    trim_duration = min(30, original_clip.duration)
-    clip = original_clip.subclipped(0, trim_duration)
-    clip = clip.resized(height=720)
-    watermark = (
-        TextClip(text="ANF Rising Stars Showcase", font_size=36, color="white")
-        .with_position(("center", "bottom"))
-        .with_duration(clip.duration)
+        tuple: (strategy, cpu_seconds) - the strategy used and the CPU time spent
+    """
+    spec = replace(DEFAULT_SPEC, profile=profile)
+    engine = get_transcoder()
+    strategy = choose_strategy(probe(original_path), spec, engine.strategies)
+
+    start = _cpu_seconds()
+    engine.transcode(original_path, processed_path, spec, strategy)
+    return strategy, _cpu_seconds() - start
+
+
+def _describe_outputs(processed_path, processed_file_path):
+    """
+    The main output and the renditions written next to it, top rendition first
+
+    Sizes and durations are read from the files, so bandwidth is the actual
+    average bitrate clients need for each rendition.
+
+    Returns:
+        list of (local_path, {"height", "width", "bandwidth", "path"}) with storage paths
+    """
+    outputs = [(DEFAULT_SPEC.height, processed_path, processed_file_path)] + [
+        (
+            height,
+            rendition_path(processed_path, height),
+            rendition_path(processed_file_path, height),
+        )
+        for height in DEFAULT_SPEC.renditions
+    ]
+    described = []
+    for height, local_path, path in outputs:
+        if not os.path.exists(local_path):
+            # The engine doesn't write renditions
+            continue
+        info = probe(local_path)
+        duration = info.duration if info and info.duration else DEFAULT_SPEC.max_duration
+        entry = {
+            "height": info.height if info else height,
+            "width": info.width if info else None,
+            "bandwidth": int(os.path.getsize(local_path) * 8 / duration),
+            "path": path,
+        }
+        described.append((local_path, entry))
+    return described
+
+
+def _rendition_manifest(processed_path, processed_file_path):
+    """
+    Rendition ladder for Video.renditions
+
+    Returns:
+        list of {"height", "width", "bandwidth", "path"}, or None if only the
+        main output exists
+    """
+    manifest = [entry for _, entry in _describe_outputs(processed_path, processed_file_path)]
+    return manifest if len(manifest) > 1 else None
+
+
+def _describe_previews(processed_path, processed_file_path):
+    """
+    Poster and sprite sheet written next to the output, for Video.poster_path/sprite
+
+    The thumbnail size is read from the sprite sheet itself.
+
+    Returns:
+        tuple: (poster storage path or None, sprite dict or None)
+    """
+    previews = DEFAULT_SPEC.previews
+    if not previews:
+        return None, None
+
+    poster = preview_path(processed_path, POSTER, previews.format)
+    poster_path = (
+        preview_path(processed_file_path, POSTER, previews.format)
+        if os.path.exists(poster)
+        else None
     )
-    final_clip = CompositeVideoClip([clip, watermark])
 
-    # Save the processed video
-    final_clip.write_videofile(processed_path, codec="libx264", audio_codec="aac")
+    sprite = None
+    sprite_file = preview_path(processed_path, SPRITE, previews.format)
+    if os.path.exists(sprite_file):
+        from PIL import Image
+
+        rows = previews.sprite_rows(DEFAULT_SPEC.max_duration)
+        with Image.open(sprite_file) as image:
+            width, height = image.size
+        sprite = {
+            "path": preview_path(processed_file_path, SPRITE, previews.format),
+            "interval": previews.sprite_interval,
+            "columns": previews.sprite_columns,
+            "rows": rows,
+            "width": width // previews.sprite_columns,
+            "height": height // rows,
+        }
+    return poster_path, sprite
+
+
+def _package_hls(processed_path, processed_file_path):
+    """
+    Segment the outputs into an HLS package next to processed_path (HLS_PACKAGING)
+
+    Packaging is optional: if it fails the MP4s are still published, just
+    without a playlist.
+
+    Returns:
+        Storage path of the master playlist, or None
+    """
+    if not settings.HLS_PACKAGING:
+        return None
+
+    variants = [
+        Variant(local_path, entry["height"], entry["width"])
+        for local_path, entry in _describe_outputs(processed_path, processed_file_path)
+    ]
+    try:
+        package_hls(variants, hls_directory(processed_path))
+    except (TranscodeError, OSError) as e:
+        logger.warning(f"HLS packaging failed for {processed_file_path}: {e}")
+        return None
+    return f"{hls_directory(processed_file_path)}/{MASTER_PLAYLIST}"
+
+
+def _upload_outputs(processed_path, processed_file_path):
+    """Stream the processed video, its renditions, previews and HLS package, if any, to storage"""
+    logger.info(f"Uploading processed video to S3: {processed_file_path}")
+    # Stream from disk; large outputs go out as a parallel multipart upload
+    with open(processed_path, "rb") as f:
+        storage.upload_fileobj(f, processed_file_path)
+
+    for height in DEFAULT_SPEC.renditions:
+        local_path = rendition_path(processed_path, height)
+        if os.path.exists(local_path):
+            with open(local_path, "rb") as f:
+                storage.upload_fileobj(f, rendition_path(processed_file_path, height))
+
+    if DEFAULT_SPEC.previews:
+        for kind in (POSTER, SPRITE):
+            local_path = preview_path(processed_path, kind, DEFAULT_SPEC.previews.format)
+            if os.path.exists(local_path):
+                with open(local_path, "rb") as f:
+                    storage.upload_fileobj(
+                        f, preview_path(processed_file_path, kind, DEFAULT_SPEC.previews.format)
+                    )
+
+    package_dir = hls_directory(processed_path)
+    if os.path.isdir(package_dir):
+        # Segments first, so the playlists never reference a missing segment
+        for name in sorted(os.listdir(package_dir), key=lambda name: name.endswith(".m3u8")):
+            with open(os.path.join(package_dir, name), "rb") as f:
+                storage.upload_fileobj(f, f"{hls_directory(processed_file_path)}/{name}")
+
+
+def _output_version(profile=None) -> str:
+    """Pipeline version of the outputs this worker makes with profile (see cache.pipeline_version)"""
+    return cache.pipeline_version(replace(DEFAULT_SPEC, profile=profile), get_transcoder().name)
+
+
+def _reuse_cached_output(db, video, owner, profile=None) -> bool:
+    """
+    Point video at cached outputs of the same source and pipeline version
+
+    The video is marked processed without fetching or transcoding anything.
+    Videos without a source checksum (direct uploads) are never cached.
 
-    # Clean up moviepy objects to free memory
-    final_clip.close()
-    clip.close()
-    original_clip.close()
+    Returns:
+        True if a cached output was found: the video needs no transcode, whether
+        this worker or one that took its lease over marks it processed
+    """
+    if not (settings.PROCESSED_OUTPUT_CACHE and video.source_sha256):
+        return False
+
+    entry = cache.lookup(db, video.source_sha256, _output_version(profile))
+    if not entry:
+        return False
+
+    video_id = video.id
+    outputs = {column: getattr(entry, column) for column in cache.OUTPUT_COLUMNS}
+    if _finish_processed(db, video_id, owner, outputs, REUSED, 0.0):
+        logger.info(f"Video {video_id} reuses cached output {outputs['processed_file_path']}")
+    return True
+
+
+def _output_columns(processed_path, processed_file_path) -> dict:
+    """Output columns (see cache.OUTPUT_COLUMNS) of a video transcoded to processed_path"""
+    renditions = _rendition_manifest(processed_path, processed_file_path)
+    poster_path, sprite = _describe_previews(processed_path, processed_file_path)
+    return {
+        "processed_file_path": processed_file_path,
+        "renditions": renditions,
+        "hls_playlist_path": _package_hls(processed_path, processed_file_path),
+        "poster_path": poster_path,
+        "sprite": sprite,
+    }
+
+
+def _cache_output(db, source_sha256, outputs, profile=None) -> None:
+    """Record a video's outputs, already in storage, in the processed-output cache"""
+    if settings.PROCESSED_OUTPUT_CACHE and source_sha256:
+        cache.store(db, source_sha256, _output_version(profile), outputs)
+
+
+def _finish_processed(db, video_id, owner, outputs, strategy, cpu_seconds) -> bool:
+    """
+    Mark a video processed with its outputs, if owner still holds its lease
+
+    Returns:
+        False if another worker took the video over; its status is left alone
+    """
+    if finish_video(
+        db,
+        video_id,
+        owner,
+        "processed",
+        is_published=True,
+        transcode_strategy=strategy,
+        transcode_cpu_seconds=cpu_seconds,
+        **outputs,
+    ):
+        return True
+    logger.warning(f"Video {video_id} was taken over by another worker; not marking it processed")
+    return False
 
 
 def _cleanup_temp_files(temp_original, temp_processed):
@@ -147,19 +377,22 @@ def _cleanup_temp_files(temp_original, temp_processed):
             pass
 
 
-def process_video_sync(video_id: str) -> dict:
+def process_video_sync(video_id: str, owner: str, profile: Optional[str] = None) -> dict:
     """
     Process video - synchronous version for SQS worker (Entrega 4)
 
     Supports both local and S3 storage backends.
-    For S3: Downloads to temp, processes, uploads back to S3
+    For S3: Downloads to a scratch job directory, processes, uploads back to S3
     For local: Processes directly on disk
 
     Args:
         video_id: UUID of the video to process
+        owner: Lease owner ID of the worker (see app.worker.lease.worker_id)
+        profile: Encoding profile name (None = ENCODING_PROFILE)
 
     Returns:
-        dict with status and message/error
+        dict with status and message/error; "skipped" if another worker
+        holds the video's lease
     """
     db = SessionLocal()
     temp_original = None
@@ -171,31 +404,42 @@ def process_video_sync(video_id: str) -> dict:
         if not video:
             return {"status": "failed", "error": "Video not found"}
 
-        # Update status to processing
-        video.status = "processing"
-        db.commit()
+        # Set status to processing, unless another worker has the video or it is done
+        if not claim_video(db, video_id, owner):
+            if video.status == "processed":
+                return {"status": "success", "message": f"Video {video_id} was already processed"}
+            logger.info(f"Video {video_id} is leased by another worker")
+            return {"status": "skipped", "message": f"Video {video_id} is leased by another worker"}
+
+        if _reuse_cached_output(db, video, owner, profile):
+            return {"status": "success", "message": f"Video {video_id} reused a cached output"}
 
         logger.info(f"Starting processing for video {video_id}")
 
-        # Setup file paths based on storage backend
-        original_path, processed_path, temp_original, temp_processed = _setup_file_paths(
-            video, settings
-        )
+        with scratch_space.job(video_id) as scratch_dir:
+            # Setup file paths based on storage backend
+            original_path, processed_path, temp_original, temp_processed = _setup_file_paths(
+                video, settings, scratch_dir
+            )
+
+            # Process the video
+            strategy, cpu_seconds = _process_video_file(original_path, processed_path, profile)
+            logger.info(
+                f"Transcoded video {video_id} ({strategy}) in {cpu_seconds:.1f} CPU seconds"
+            )
 
-        # Process the video
-        _process_video_file(original_path, processed_path)
+            outputs = _output_columns(processed_path, video.processed_file_path)
 
-        # Upload processed video if using S3
-        if settings.STORAGE_BACKEND == "s3":
-            logger.info(f"Uploading processed video to S3: {video.processed_file_path}")
-            with open(processed_path, "rb") as f:
-                processed_data = f.read()
-            storage.upload_file(processed_data, video.processed_file_path)
+            # Upload processed video if using S3
+            if settings.STORAGE_BACKEND == "s3":
+                _upload_outputs(processed_path, video.processed_file_path)
+
+        # Committed on its own, so a redelivery after a failed update hits the cache
+        _cache_output(db, video.source_sha256, outputs, profile)
 
         # Update the videos table
-        video.status = "processed"
-        video.is_published = True
-        db.commit()
+        if not _finish_processed(db, video_id, owner, outputs, strategy, cpu_seconds):
+            return {"status": "skipped", "message": f"Video {video_id} is leased by another worker"}
 
         logger.info(f"Successfully processed video {video_id}")
         return {"status": "success", "message": f"Video {video_id} processed successfully"}
@@ -203,12 +447,10 @@ def process_video_sync(video_id: str) -> dict:
     except Exception as e:
         logger.error(f"Error processing video {video_id}: {e}", exc_info=True)
 
-        # Update video status to failed
+        # Update video status to failed, unless another worker took it over
         try:
-            video = db.query(Video).filter(Video.id == video_id).first()
-            if video:
-                video.status = "failed"
-                db.commit()
+            db.rollback()
+            finish_video(db, video_id, owner, "failed")
         except Exception as db_error:
             logger.error(f"Database error while updating status to failed: {db_error}")
 
@@ -217,3 +459,104 @@ def process_video_sync(video_id: str) -> dict:
     finally:
         _cleanup_temp_files(temp_original, temp_processed)
         db.close()
+
+
+# Pipeline stages (see app.worker.pipeline): the work of process_video_sync split
+# so one video can be fetched while another is transcoded and a third published
+
+
+@dataclass
+class VideoJob:
+    """A video handed from one pipeline stage to the next"""
+
+    video_id: str
+    original_path: str
+    processed_path: str
+    processed_file_path: str  # Where publish_video stores the output
+    profile: Optional[str] = None
+    strategy: Optional[str] = None
+    cpu_seconds: float = 0.0
+
+
+def fetch_video(
+    video_id: str, scratch_dir: str, owner: str, profile: Optional[str] = None
+) -> Optional[VideoJob]:
+    """
+    Fetch stage: mark the video as processing and stage its source
+
+    For S3 the source is fetched into scratch_dir; local sources are used in place.
+
+    Returns:
+        The job for the next stages, or None if there is nothing left to do:
+        the video is already processed or it reused a cached output
+
+    Raises:
+        LookupError: If the video doesn't exist
+        VideoLeased: If another worker holds the video's lease
+    """
+    db = SessionLocal()
+    try:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            raise LookupError("Video not found")
+
+        if not claim_video(db, video_id, owner):
+            if video.status == "processed":
+                return None
+            raise VideoLeased(f"Video {video_id} is leased by another worker")
+
+        if _reuse_cached_output(db, video, owner, profile):
+            return None
+
+        original_path, processed_path, _, _ = _setup_file_paths(video, settings, scratch_dir)
+        db.commit()
+        return VideoJob(video_id, original_path, processed_path, video.processed_file_path, profile)
+    finally:
+        db.close()
+
+
+def transcode_video(job: VideoJob) -> VideoJob:
+    """Transcode stage: CPU only, no database or storage access, so it runs in a pool process"""
+    job.strategy, job.cpu_seconds = _process_video_file(
+        job.original_path, job.processed_path, job.profile
+    )
+    return job
+
+
+def publish_video(job: VideoJob, owner: str) -> None:
+    """
+    Publish stage: upload the outputs (S3) and mark the video processed
+
+    Raises:
+        LookupError: If the video doesn't exist
+        VideoLeased: If another worker took the video over
+    """
+    outputs = _output_columns(job.processed_path, job.processed_file_path)
+    if settings.STORAGE_BACKEND == "s3":
+        _upload_outputs(job.processed_path, job.processed_file_path)
+
+    db = SessionLocal()
+    try:
+        video = db.query(Video).filter(Video.id == job.video_id).first()
+        if not video:
+            raise LookupError("Video not found")
+        _cache_output(db, video.source_sha256, outputs, job.profile)
+        if not _finish_processed(db, job.video_id, owner, outputs, job.strategy, job.cpu_seconds):
+            raise VideoLeased(f"Video {job.video_id} is leased by another worker")
+    finally:
+        db.close()
+
+
+def mark_video_failed(video_id: str, owner: str) -> None:
+    """
+    Set a video's status to failed, unless another worker took it over
+
+    Logs (doesn't raise) database errors.
+    """
+    db = SessionLocal()
+    try:
+        finish_video(db, video_id, owner, "failed")
+    except Exception as e:
+        logger.error(f"Database error while updating status to failed: {e}")
+    finally:
+        db.close()
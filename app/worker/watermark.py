@@ -0,0 +1,166 @@
+"""Pre-rendered watermark overlays shared by every transcode in a worker"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.storage import StorageError, storage
+
+logger = logging.getLogger(__name__)
+
+# Output height the configured font size is designed for; other heights
+# get a proportionally scaled font so the overlay covers the same area
+REFERENCE_HEIGHT = 720
+
+# Bump when the rendering itself changes so stale PNGs are not reused
+RENDER_VERSION = 1
+
+
+def render_watermark(text: str, font_size: int, path: str, font: str = "") -> str:
+    """
+    Rasterize the watermark text into a transparent PNG
+
+    Args:
+        text: Watermark text
+        font_size: Font size in pixels
+        path: Destination PNG path
+        font: TrueType font path; empty = Pillow's bundled font
+
+    Returns:
+        path
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    image_font = (
+        ImageFont.truetype(font, font_size) if font else ImageFont.load_default(size=font_size)
+    )
+    left, top, right, bottom = image_font.getbbox(text)
+    image = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((-left, -top), text, font=image_font, fill=(255, 255, 255, 255))
+    image.save(path)
+    return path
+
+
+@dataclass(frozen=True)
+class WatermarkKey:
+    """Everything that changes the rendered overlay"""
+
+    text: str
+    font: str
+    font_size: int
+    height: int
+
+    @property
+    def scaled_font_size(self) -> int:
+        return max(1, round(self.font_size * self.height / REFERENCE_HEIGHT))
+
+    @property
+    def digest(self) -> str:
+        raw = f"{RENDER_VERSION}|{self.text}|{self.font}|{self.font_size}|{self.height}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    @property
+    def filename(self) -> str:
+        return f"watermark-{self.digest}.png"
+
+
+class WatermarkCache:
+    """
+    Watermark PNGs rendered once and reused for every video
+
+    Lookups go memory -> local cache directory -> storage (when
+    WATERMARK_STORAGE_PREFIX is set). Only a miss at every level renders the
+    text; the result is written atomically to the cache directory, which is
+    shared by all pool processes of a worker, and uploaded to storage so the
+    other workers of the deployment can download it instead of rendering.
+    """
+
+    def __init__(self, directory: Optional[str] = None, storage_prefix: Optional[str] = None):
+        self.directory = (
+            directory
+            or settings.WATERMARK_CACHE_DIR
+            or os.path.join(tempfile.gettempdir(), "watermarks")
+        )
+        self.storage_prefix = (
+            settings.WATERMARK_STORAGE_PREFIX if storage_prefix is None else storage_prefix
+        )
+        self._paths: Dict[WatermarkKey, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, text: str, font_size: int, height: int) -> str:
+        """
+        Return the path of the overlay PNG for this text, size and output height
+
+        Args:
+            text: Watermark text
+            font_size: Font size at REFERENCE_HEIGHT
+            height: Output video height
+        """
+        key = WatermarkKey(text, settings.WATERMARK_FONT, font_size, height)
+        path = self._paths.get(key)
+        if path and os.path.exists(path):
+            return path
+
+        with self._lock:
+            path = self._load(key)
+            self._paths[key] = path
+        return path
+
+    def clear(self) -> None:
+        """Forget the in-memory entries (files on disk and in storage are kept)"""
+        with self._lock:
+            self._paths.clear()
+
+    def _load(self, key: WatermarkKey) -> str:
+        path = os.path.join(self.directory, key.filename)
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".png")
+        os.close(fd)
+        try:
+            if not self._download(key, tmp_path):
+                render_watermark(key.text, key.scaled_font_size, tmp_path, key.font)
+                self._upload(key, tmp_path)
+            # Atomic, so concurrent pool processes never see a partial PNG
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return path
+
+    def _storage_path(self, key: WatermarkKey) -> str:
+        return f"{self.storage_prefix.rstrip('/')}/{key.filename}"
+
+    def _download(self, key: WatermarkKey, path: str) -> bool:
+        if not self.storage_prefix:
+            return False
+        try:
+            if not storage.file_exists(self._storage_path(key)):
+                return False
+            with open(path, "wb") as f:
+                f.write(storage.download_file(self._storage_path(key)))
+        except (StorageError, OSError) as e:
+            logger.warning(f"Could not download cached watermark {key.filename}: {e}")
+            return False
+        logger.info(f"Downloaded cached watermark {key.filename}")
+        return True
+
+    def _upload(self, key: WatermarkKey, path: str) -> None:
+        if not self.storage_prefix:
+            return
+        try:
+            with open(path, "rb") as f:
+                storage.upload_file(f.read(), self._storage_path(key))
+        except (StorageError, OSError) as e:
+            # Only costs other workers a render
+            logger.warning(f"Could not store watermark {key.filename}: {e}")
+
+
+watermark_cache = WatermarkCache()
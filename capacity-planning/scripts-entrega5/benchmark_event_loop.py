@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de GET /health y /api/public/videos durante ráfagas de uploads
+
+Mide p50/p95/p99 de las lecturas en dos fases:
+  1. Línea base (sin uploads)
+  2. Mientras N clientes suben videos en paralelo
+
+Si el event loop de uvicorn no se bloquea, el p99 de la fase 2 debe mantenerse
+cercano al de la línea base.
+
+Uso:
+    API_URL=http://localhost:8080 VIDEO_FILE=./media/test_video.mp4 \\
+        python benchmark_event_loop.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+API_URL = os.getenv("API_URL", "http://localhost:8080")
+VIDEO_FILE = os.getenv("VIDEO_FILE", "./media/test_video.mp4")
+EMAIL = os.getenv("BENCH_EMAIL", "test1@anb.com")
+PASSWORD = os.getenv("BENCH_PASSWORD", "Test123!")
+CONCURRENT_UPLOADS = int(os.getenv("CONCURRENT_UPLOADS", "20"))
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "10"))
+PHASE_SECONDS = float(os.getenv("PHASE_SECONDS", "15"))
+
+PROBE_PATHS = ["/health", "/api/public/videos"]
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def probe(client, path, latencies, stop):
+    """Lanza GETs secuenciales contra path hasta que stop se active"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get(path)
+        except httpx.HTTPError:
+            continue
+        latencies[path].append((time.perf_counter() - start) * 1000)
+
+
+async def upload_loop(client, headers, video_bytes, stop, counters):
+    """Sube videos en bucle hasta que stop se active"""
+    while not stop.is_set():
+        files = {"file": ("bench.mp4", video_bytes, "video/mp4")}
+        try:
+            response = await client.post(
+                "/api/videos/upload",
+                headers=headers,
+                files=files,
+                data={"title": "Benchmark event loop"},
+            )
+            counters["ok" if response.status_code == 201 else "error"] += 1
+        except httpx.HTTPError:
+            counters["error"] += 1
+
+
+async def run_phase(client, name, uploads=0, headers=None, video_bytes=None):
+    """Ejecuta una fase y devuelve las latencias por endpoint"""
+    latencies = {path: [] for path in PROBE_PATHS}
+    counters = {"ok": 0, "error": 0}
+    stop = asyncio.Event()
+
+    tasks = [
+        asyncio.create_task(probe(client, path, latencies, stop))
+        for path in PROBE_PATHS
+        for _ in range(PROBE_CONCURRENCY)
+    ]
+    tasks += [
+        asyncio.create_task(upload_loop(client, headers, video_bytes, stop, counters))
+        for _ in range(uploads)
+    ]
+
+    await asyncio.sleep(PHASE_SECONDS)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"\n📊 {name}")
+    if uploads:
+        print(f"   Uploads: {counters['ok']} exitosos, {counters['error']} fallidos")
+    for path, values in latencies.items():
+        print(
+            f"   {path:<22} n={len(values):<6} "
+            f"p50={percentile(values, 50):7.1f}ms "
+            f"p95={percentile(values, 95):7.1f}ms "
+            f"p99={percentile(values, 99):7.1f}ms "
+            f"max={max(values, default=float('nan')):7.1f}ms "
+            f"media={statistics.fmean(values) if values else float('nan'):7.1f}ms"
+        )
+    return latencies
+
+
+async def main():
+    with open(VIDEO_FILE, "rb") as f:
+        video_bytes = f.read()
+
+    limits = httpx.Limits(max_connections=CONCURRENT_UPLOADS + 2 * PROBE_CONCURRENCY + 5)
+    async with httpx.AsyncClient(base_url=API_URL, timeout=60, limits=limits) as client:
+        print("🔐 Autenticando...")
+        login = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        if login.status_code != 200:
+            print(f"❌ Error al autenticar: {login.text}")
+            return 1
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        baseline = await run_phase(client, "Línea base (sin uploads)")
+        burst = await run_phase(
+            client,
+            f"Durante {CONCURRENT_UPLOADS} uploads concurrentes",
+            uploads=CONCURRENT_UPLOADS,
+            headers=headers,
+            video_bytes=video_bytes,
+        )
+
+    print("\n📈 Variación de p99 (ráfaga / línea base)")
+    for path in PROBE_PATHS:
+        ratio = percentile(burst[path], 99) / percentile(baseline[path], 99)
+        print(f"   {path:<22} x{ratio:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: matriz de perfiles de codificación (velocidad vs tamaño)
+
+Para cada perfil de ENCODING_PROFILE (fast, balanced, archival) transcodifica
+el video de prueba con el motor ffmpeg del worker (recorte a 30 s, 720p y
+marca de agua) y reporta:
+  - Tiempo de codificación y velocidad (segundos de video por segundo de pared)
+  - Tamaño del archivo de salida y bitrate promedio
+  - Tiempo y tamaño relativos al perfil balanced
+
+Uso (desde la raíz del repo):
+    VIDEO_FILE=./media/test_video.mp4 RUNS=3 \\
+        python capacity-planning/scripts-entrega5/benchmark_profiles.py
+
+Si VIDEO_FILE no existe se genera el mismo video sintético que usa
+benchmark_transcoding.py.
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark_transcoding import VIDEO_FILE, ensure_sample_video
+
+sys.path.insert(0, os.getcwd())
+
+from app.worker.transcoding import (  # noqa: E402
+    PROFILES,
+    FFmpegEngine,
+    TranscodeSpec,
+    find_ffmpeg,
+)
+from app.worker.watermark import watermark_cache  # noqa: E402
+
+PROFILE_NAMES = os.getenv("PROFILES", ",".join(PROFILES)).split(",")
+RUNS = int(os.getenv("RUNS", "3"))
+
+
+def output_duration(path):
+    """Duración del video de salida, leída del resumen de ffmpeg"""
+    result = subprocess.run([find_ffmpeg(), "-hide_banner", "-i", path], capture_output=True)
+    match = re.search(rb"Duration: (\d+):(\d+):([\d.]+)", result.stderr)
+    h, m, s = match.groups()
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def run_once(engine, source, profile):
+    """Transcodifica una vez y devuelve (segundos, bytes, duración del video)"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "out.mp4")
+        start = time.perf_counter()
+        engine.transcode(source, output, TranscodeSpec(profile=profile))
+        elapsed = time.perf_counter() - start
+        return elapsed, os.path.getsize(output), output_duration(output)
+
+
+def main():
+    source = ensure_sample_video(VIDEO_FILE)
+    print(f"📹 Video de prueba: {source} ({os.path.getsize(source) / 1024 / 1024:.1f} MB)")
+    engine = FFmpegEngine()
+    # Calienta la caché de marca de agua para no medir su render
+    spec = TranscodeSpec()
+    watermark_cache.get(spec.watermark_text, spec.font_size, spec.height)
+
+    matrix = {}
+    for profile in PROFILE_NAMES:
+        preset = PROFILES[profile]
+        print(f"\n⚙️  Perfil: {profile} (preset={preset.preset}, crf={preset.crf})")
+        runs = [run_once(engine, source, profile) for _ in range(RUNS)]
+        for i, (seconds, size, _) in enumerate(runs):
+            print(f"   Corrida {i + 1}: {seconds:.1f}s, {size / 1024 / 1024:.2f} MB")
+        seconds = statistics.median(r[0] for r in runs)
+        size = runs[0][1]
+        duration = runs[0][2]
+        matrix[profile] = {
+            "seconds": seconds,
+            "speed": duration / seconds,
+            "size_mb": size / 1024 / 1024,
+            "kbps": size * 8 / 1000 / duration,
+        }
+
+    print("\n📊 Matriz velocidad vs tamaño (mediana de tiempo)")
+    print(f"   {'perfil':<10}{'tiempo':>9}{'velocidad':>11}{'tamaño':>10}{'bitrate':>12}")
+    base = matrix.get("balanced")
+    for profile, row in matrix.items():
+        line = (
+            f"   {profile:<10}{row['seconds']:8.1f}s{row['speed']:10.2f}x"
+            f"{row['size_mb']:8.2f}MB{row['kbps']:8.0f} kbps"
+        )
+        if base and profile != "balanced":
+            line += (
+                f"   (tiempo x{row['seconds'] / base['seconds']:.2f}, "
+                f"tamaño x{row['size_mb'] / base['size_mb']:.2f} vs balanced)"
+            )
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
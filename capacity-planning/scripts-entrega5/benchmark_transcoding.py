@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: motores de transcodificación del worker (ffmpeg vs moviepy)
+
+Para cada motor ejecuta el mismo procesamiento del worker (recorte a 30 s,
+escalado a 720p y marca de agua) sobre el video de prueba y reporta:
+  - Tiempo de pared por video
+  - RSS pico (proceso Python + procesos hijos como ffmpeg)
+
+Cada corrida se ejecuta en un proceso nuevo para que el RSS pico de un motor
+no contamine al siguiente.
+
+Uso (desde la raíz del repo):
+    VIDEO_FILE=./media/test_video.mp4 RUNS=3 \\
+        python capacity-planning/scripts-entrega5/benchmark_transcoding.py
+
+Si VIDEO_FILE no existe se genera un video sintético de 60 s (1080p) con ffmpeg.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+VIDEO_FILE = os.getenv("VIDEO_FILE", "./media/test_video.mp4")
+ENGINES = os.getenv("ENGINES", "ffmpeg,moviepy").split(",")
+RUNS = int(os.getenv("RUNS", "3"))
+
+# Se ejecuta en un proceso hijo: transcodifica y reporta tiempo y memoria
+RUNNER = """
+import json, resource, sys, time
+from app.worker.transcoding import get_transcoder
+
+engine = get_transcoder(sys.argv[1])
+start = time.perf_counter()
+engine.transcode(sys.argv[2], sys.argv[3])
+elapsed = time.perf_counter() - start
+self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+print(json.dumps({"engine": engine.name, "seconds": elapsed,
+                  "peak_rss_mb": max(self_kb, children_kb) / 1024}))
+"""
+
+
+def ensure_sample_video(path):
+    """Genera un video sintético si no hay video de prueba"""
+    if os.path.exists(path):
+        return path
+
+    from app.worker.transcoding import find_ffmpeg
+
+    path = os.path.join(tempfile.gettempdir(), "benchmark_source_1080p.mp4")
+    if not os.path.exists(path):
+        print(f"🎬 Generando video sintético en {path}...")
+        subprocess.run(
+            [
+                find_ffmpeg(),
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-y",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc2=size=1920x1080:rate=30:duration=60",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=frequency=440:duration=60",
+                "-c:v",
+                "libx264",
+                "-c:a",
+                "aac",
+                "-shortest",
+                path,
+            ],
+            check=True,
+        )
+    return path
+
+
+def run_once(engine, source):
+    """Ejecuta una corrida en un proceso nuevo y devuelve sus métricas"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "out.mp4")
+        result = subprocess.run(
+            [sys.executable, "-c", RUNNER, engine, source, output],
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    source = ensure_sample_video(VIDEO_FILE)
+    print(f"📹 Video de prueba: {source} ({os.path.getsize(source) / 1024 / 1024:.1f} MB)")
+
+    summary = {}
+    for engine in ENGINES:
+        print(f"\n⚙️  Motor: {engine}")
+        runs = []
+        for i in range(RUNS):
+            try:
+                metrics = run_once(engine, source)
+            except RuntimeError as e:
+                print(f"   ❌ Corrida {i + 1} falló: {e}")
+                break
+            runs.append(metrics)
+            print(
+                f"   Corrida {i + 1}: {metrics['seconds']:.1f}s, "
+                f"RSS pico {metrics['peak_rss_mb']:.0f} MB"
+            )
+        if runs:
+            summary[engine] = {
+                "seconds": statistics.median(r["seconds"] for r in runs),
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+            }
+
+    print("\n📊 Resumen (mediana de tiempo, máximo de RSS)")
+    for engine, metrics in summary.items():
+        print(
+            f"   {engine:<8} {metrics['seconds']:7.1f}s/video   "
+            f"{metrics['peak_rss_mb']:7.0f} MB RSS pico"
+        )
+    if "ffmpeg" in summary and "moviepy" in summary:
+        speedup = summary["moviepy"]["seconds"] / summary["ffmpeg"]["seconds"]
+        memory = summary["moviepy"]["peak_rss_mb"] / summary["ffmpeg"]["peak_rss_mb"]
+        print(f"\n📈 Tiempo moviepy/ffmpeg: x{speedup:.2f}   RSS pico moviepy/ffmpeg: x{memory:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
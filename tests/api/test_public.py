@@ -1,4 +1,6 @@
 """Tests for public endpoints (videos, voting, ranking)"""
+from unittest.mock import patch
+
 from fastapi import status
 from fastapi.testclient import TestClient
 
@@ -74,6 +76,177 @@ class TestListPublicVideos:
         assert "Public Video 2" in titles
         assert "Private Video" not in titles
 
+    def test_list_public_videos_renditions(self, client: TestClient, db):
+        """Test public videos expose their rendition ladder"""
+        user = models.User(
+            first_name="Player",
+            last_name="Abr",
+            email="abr@example.com",
+            password="SecurePass123!",
+            city="Cali",
+            country="Colombia",
+        )
+        db.add(user)
+        db.commit()
+        db.add(
+            models.Video(
+                title="ABR Video",
+                user_id=user.id,
+                status="processed",
+                original_file_path="uploads/abr.mp4",
+                processed_file_path="processed/abr.mp4",
+                is_published=True,
+                renditions=[
+                    {
+                        "height": 720,
+                        "width": 1280,
+                        "bandwidth": 2400000,
+                        "path": "processed/abr.mp4",
+                    },
+                    {
+                        "height": 360,
+                        "width": 640,
+                        "bandwidth": 700000,
+                        "path": "processed/abr_360p.mp4",
+                    },
+                ],
+            )
+        )
+        db.commit()
+
+        response = client.get("/api/public/videos")
+
+        video = next(v for v in response.json() if v["title"] == "ABR Video")
+        assert [(r["height"], r["bandwidth"]) for r in video["renditions"]] == [
+            (720, 2400000),
+            (360, 700000),
+        ]
+        assert video["renditions"][1]["url"] == "https://anb.com/videos/processed/abr_360p.mp4"
+        assert video["hls_url"] is None
+
+    def test_list_public_videos_hls_url(self, client: TestClient, db):
+        """Test packaged public videos expose their HLS playlist"""
+        user = models.User(
+            first_name="Player",
+            last_name="Hls",
+            email="hls_public@example.com",
+            password="SecurePass123!",
+            city="Cali",
+            country="Colombia",
+        )
+        db.add(user)
+        db.commit()
+        db.add(
+            models.Video(
+                title="HLS Video",
+                user_id=user.id,
+                status="processed",
+                original_file_path="/app/uploads/hls.mp4",
+                processed_file_path="/app/processed/hls.mp4",
+                hls_playlist_path="/app/processed/hls_hls/master.m3u8",
+                is_published=True,
+            )
+        )
+        db.commit()
+
+        response = client.get("/api/public/videos")
+
+        video = next(v for v in response.json() if v["title"] == "HLS Video")
+        assert video["hls_url"] == "https://anb.com/videos/processed/hls_hls/master.m3u8"
+
+    def test_list_public_videos_previews(self, client: TestClient, db):
+        """Test public videos expose poster and sprite so feeds need no video bytes"""
+        user = models.User(
+            first_name="Player",
+            last_name="Preview",
+            email="preview_public@example.com",
+            password="SecurePass123!",
+            city="Cali",
+            country="Colombia",
+        )
+        db.add(user)
+        db.commit()
+        db.add(
+            models.Video(
+                title="Preview Video",
+                user_id=user.id,
+                status="processed",
+                original_file_path="/app/uploads/pv.mp4",
+                processed_file_path="/app/processed/pv.mp4",
+                poster_path="/app/processed/pv_poster.webp",
+                sprite={
+                    "path": "/app/processed/pv_sprite.webp",
+                    "interval": 2,
+                    "columns": 5,
+                    "rows": 3,
+                    "width": 160,
+                    "height": 90,
+                },
+                is_published=True,
+            )
+        )
+        db.commit()
+
+        response = client.get("/api/public/videos")
+
+        videos = {v["title"]: v for v in response.json()}
+        video = videos["Preview Video"]
+        assert video["poster_url"] == "https://anb.com/videos/processed/pv_poster.webp"
+        assert video["sprite"]["url"] == "https://anb.com/videos/processed/pv_sprite.webp"
+        assert (video["sprite"]["columns"], video["sprite"]["rows"]) == (5, 3)
+
+    @patch("app.api.routes.videos.settings")
+    @patch("app.api.routes.videos.storage")
+    def test_list_public_videos_s3_urls(self, mock_storage, mock_settings, client: TestClient, db):
+        """Test public videos on S3 get presigned URLs for every rendition and preview"""
+        mock_settings.STORAGE_BACKEND = "s3"
+        mock_storage.get_presigned_url.side_effect = lambda path, expiration: f"https://s3/{path}"
+        user = models.User(
+            first_name="Player",
+            last_name="S3",
+            email="s3_public@example.com",
+            password="SecurePass123!",
+            city="Cali",
+            country="Colombia",
+        )
+        db.add(user)
+        db.commit()
+        db.add(
+            models.Video(
+                title="S3 Video",
+                user_id=user.id,
+                status="processed",
+                original_file_path="uploads/s3.mp4",
+                processed_file_path="processed/s3.mp4",
+                renditions=[
+                    {"height": 720, "width": 1280, "bandwidth": 1, "path": "processed/s3.mp4"},
+                    {"height": 360, "width": 640, "bandwidth": 1, "path": "processed/s3_360p.mp4"},
+                ],
+                poster_path="processed/s3_poster.webp",
+                sprite={
+                    "path": "processed/s3_sprite.webp",
+                    "interval": 2,
+                    "columns": 5,
+                    "rows": 3,
+                    "width": 160,
+                    "height": 90,
+                },
+                is_published=True,
+            )
+        )
+        db.commit()
+
+        response = client.get("/api/public/videos")
+
+        video = next(v for v in response.json() if v["title"] == "S3 Video")
+        assert video["processed_url"] == "https://s3/processed/s3.mp4"
+        assert [r["url"] for r in video["renditions"]] == [
+            "https://s3/processed/s3.mp4",
+            "https://s3/processed/s3_360p.mp4",
+        ]
+        assert video["poster_url"] == "https://s3/processed/s3_poster.webp"
+        assert video["sprite"]["url"] == "https://s3/processed/s3_sprite.webp"
+
     def test_list_public_videos_empty(self, client: TestClient, db):
         """Test listing public videos when none exist"""
         response = client.get("/api/public/videos")
@@ -1,32 +1,42 @@
 """Tests for video management endpoints"""
+import hashlib
 import io
-from unittest.mock import patch
+import os
+import threading
+from unittest.mock import MagicMock, patch
 
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
 
+from app.api.routes.videos import _lock_content
 from app.core.security import create_access_token
+from app.core.storage import StorageWriteReceipt
 from app.db import models
 
 
+def fake_upload(fileobj, file_path):
+    """Drain the upload stream like a real backend and return its receipt"""
+    size = 0
+    while chunk := fileobj.read(16):
+        size += len(chunk)
+    return StorageWriteReceipt(path=file_path, size=size)
+
+
 class TestVideoUpload:
     """Tests for video upload endpoint"""
 
-    @patch("app.api.routes.videos.sqs_service")
     @patch("app.api.routes.videos.storage")
     def test_upload_video_success(
         self,
         mock_storage,
-        mock_sqs_service,
         client: TestClient,
         db,
     ):
         """Test successful video upload"""
         # Mock storage operations
-        mock_storage.upload_file.return_value = "uploads/test_video.mp4"
-        mock_storage.file_exists.return_value = True
-        # Mock SQS service
-        mock_sqs_service.send_message.return_value = None
+        mock_storage.upload_fileobj.side_effect = fake_upload
 
         # Create and login user
         user = models.User(
@@ -58,6 +68,7 @@ class TestVideoUpload:
         data = response.json()
         assert "video_id" in data or "id" in data
         assert "user_id" in data or "title" in data
+        assert db.query(models.OutboxMessage).filter_by(video_id=data["video_id"]).count() == 1
 
     def test_upload_video_without_auth(self, client: TestClient, db):
         """Test video upload without authentication"""
@@ -150,21 +161,22 @@ class TestVideoUpload:
             status.HTTP_422_UNPROCESSABLE_ENTITY,
         ]
 
-    @patch("app.api.routes.videos.sqs_service")
     @patch("app.api.routes.videos.storage")
     def test_upload_video_file_save_error(
         self,
         mock_storage,
-        mock_sqs_service,
         client: TestClient,
         db,
     ):
         """Test video upload when file save fails"""
-        # Mock storage operations to simulate file not being saved
-        mock_storage.upload_file.return_value = "uploads/test_video.mp4"
-        mock_storage.file_exists.return_value = False  # File doesn't exist after save
-        # Mock SQS service
-        mock_sqs_service.send_message.return_value = None
+
+        # Mock storage to report a short write (receipt smaller than the upload)
+        def short_write(fileobj, file_path):
+            return StorageWriteReceipt(
+                path=file_path, size=fake_upload(fileobj, file_path).size // 2
+            )
+
+        mock_storage.upload_fileobj.side_effect = short_write
 
         user = models.User(
             first_name="Juan",
@@ -220,14 +232,12 @@ class TestVideoUpload:
         # FastAPI returns 422 for empty filenames
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
-    @patch("app.api.routes.videos.sqs_service")
     @patch("app.api.routes.videos.storage")
     @patch("app.api.routes.videos.settings")
     def test_upload_video_file_size_exceeds_limit(
         self,
         mock_settings,
         mock_storage,
-        mock_sqs_service,
         client: TestClient,
         db,
     ):
@@ -237,8 +247,6 @@ class TestVideoUpload:
         mock_settings.STORAGE_BACKEND = "local"
         mock_settings.UPLOAD_BASE_DIR = "/uploads"
         mock_settings.PROCESSED_BASE_DIR = "/processed"
-        # Mock SQS service
-        mock_sqs_service.send_message.return_value = None
 
         user = models.User(
             first_name="Juan",
@@ -269,14 +277,65 @@ class TestVideoUpload:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "exceeds limit" in response.json()["detail"]
 
-    @patch("app.api.routes.videos.sqs_service")
+    @patch("app.api.routes.videos.storage")
+    @patch("app.api.routes.videos.settings")
+    def test_store_upload_size_limit_enforced_while_streaming(self, mock_settings, mock_storage):
+        """Test the size limit is enforced as chunks are streamed to storage"""
+        from app.api.routes.videos import _store_upload
+        from app.core.storage import StorageSizeLimitError
+
+        mock_settings.MAX_VIDEO_SIZE = 100
+        mock_storage.upload_fileobj.side_effect = fake_upload
+
+        # Size unknown up front (e.g. chunked transfer encoding)
+        upload = MagicMock(size=None, file=io.BytesIO(b"x" * 200))
+
+        with pytest.raises(StorageSizeLimitError):
+            _store_upload(upload, "/uploads/large.mp4")
+
+        mock_storage.delete_file.assert_called_once_with("/uploads/large.mp4")
+
+    @patch("app.api.routes.videos.storage")
+    def test_store_upload_returns_receipt(self, mock_storage):
+        """Test _store_upload streams the file and returns the verified receipt"""
+        from app.api.routes.videos import _store_upload
+
+        mock_storage.upload_fileobj.side_effect = fake_upload
+        upload = MagicMock(size=None, file=io.BytesIO(b"x" * 50))
+
+        receipt = _store_upload(upload, "/uploads/ok.mp4")
+
+        assert receipt.size == 50
+        assert receipt.sha256 == hashlib.sha256(b"x" * 50).hexdigest()
+        mock_storage.delete_file.assert_not_called()
+        # Verification comes from the receipt, not an extra storage round trip
+        mock_storage.file_exists.assert_not_called()
+
+    @patch("app.api.routes.videos.storage")
+    def test_store_upload_short_write(self, mock_storage):
+        """Test a receipt that doesn't match the bytes read fails and cleans up"""
+        from app.api.routes.videos import _store_upload
+        from app.core.storage import StorageUploadError
+
+        def short_write(fileobj, file_path):
+            return StorageWriteReceipt(
+                path=file_path, size=fake_upload(fileobj, file_path).size - 1
+            )
+
+        mock_storage.upload_fileobj.side_effect = short_write
+        upload = MagicMock(size=None, file=io.BytesIO(b"x" * 50))
+
+        with pytest.raises(StorageUploadError, match="stored 49 of 50 bytes"):
+            _store_upload(upload, "/uploads/short.mp4")
+
+        mock_storage.delete_file.assert_called_once_with("/uploads/short.mp4")
+
     @patch("app.api.routes.videos.storage")
     @patch("app.api.routes.videos.settings")
     def test_upload_video_s3_storage_backend(
         self,
         mock_settings,
         mock_storage,
-        mock_sqs_service,
         client: TestClient,
         db,
     ):
@@ -288,10 +347,7 @@ class TestVideoUpload:
         mock_settings.MAX_VIDEO_SIZE = 100 * 1024 * 1024
 
         # Mock storage operations
-        mock_storage.upload_file.return_value = "uploads/test.mp4"
-        mock_storage.file_exists.return_value = True
-        # Mock SQS service
-        mock_sqs_service.send_message.return_value = None
+        mock_storage.upload_fileobj.side_effect = fake_upload
 
         user = models.User(
             first_name="Juan",
@@ -319,6 +375,197 @@ class TestVideoUpload:
 
         assert response.status_code == status.HTTP_201_CREATED
         assert "video_id" in response.json()
+        # Hashed while streaming to its own key, then moved to the content address
+        video_id = response.json()["video_id"]
+        sha256 = hashlib.sha256(b"fake video content").hexdigest()
+        assert mock_storage.upload_fileobj.call_args.args[1] == f"uploads/{video_id}.mp4"
+        mock_storage.move_file_if_absent.assert_called_once_with(
+            f"uploads/{video_id}.mp4", f"uploads/{sha256}.mp4"
+        )
+        mock_storage.file_exists.assert_not_called()
+
+
+class TestDirectUpload:
+    """Tests for the presigned direct-to-storage upload flow"""
+
+    def _create_user(self, db, email="direct@example.com"):
+        user = models.User(
+            first_name="Juan",
+            last_name="Pérez",
+            email=email,
+            password="SecurePass123!",
+            city="Medellín",
+            country="Colombia",
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+
+    def _create_video(self, db, user, status="awaiting_upload"):
+        video = models.Video(
+            user_id=user.id,
+            title="Direct Video",
+            original_file_path="uploads/direct.mp4",
+            processed_file_path="processed/direct.mp4",
+            status=status,
+        )
+        db.add(video)
+        db.commit()
+        db.refresh(video)
+        return video
+
+    @patch("app.api.routes.videos.storage")
+    @patch("app.api.routes.videos.settings")
+    def test_create_upload_url_success(self, mock_settings, mock_storage, client: TestClient, db):
+        """Test requesting a presigned upload creates an awaiting_upload video"""
+        mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.S3_UPLOAD_PREFIX = "uploads/"
+        mock_settings.S3_PROCESSED_PREFIX = "processed/"
+        mock_settings.MAX_VIDEO_SIZE = 100
+        mock_settings.S3_PRESIGNED_UPLOAD_EXPIRATION = 900
+        mock_storage.get_presigned_upload.return_value = {
+            "url": "https://bucket.s3.amazonaws.com/",
+            "fields": {"key": "uploads/x.mp4", "policy": "abc"},
+        }
+
+        user = self._create_user(db)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            "/api/videos/upload-url",
+            json={"title": "Mi mejor tiro"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        data = response.json()
+        assert data["upload_url"] == "https://bucket.s3.amazonaws.com/"
+        assert data["fields"]["policy"] == "abc"
+        assert data["expires_in"] == 900
+
+        video = db.query(models.Video).filter(models.Video.id == data["video_id"]).first()
+        assert video.status == "awaiting_upload"
+        assert video.original_file_path == f"uploads/{data['video_id']}.mp4"
+        mock_storage.get_presigned_upload.assert_called_once_with(
+            video.original_file_path, max_size=100, expiration=900
+        )
+
+    def test_create_upload_url_local_backend(self, client: TestClient, db):
+        """Test direct uploads are rejected without S3 storage"""
+        user = self._create_user(db)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            "/api/videos/upload-url",
+            json={"title": "Test"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @patch("app.api.routes.videos.storage")
+    @patch("app.api.routes.videos.settings")
+    def test_create_upload_url_presign_error(
+        self, mock_settings, mock_storage, client: TestClient, db
+    ):
+        """Test presign failures return 500 and create no video"""
+        mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.S3_UPLOAD_PREFIX = "uploads/"
+        mock_settings.S3_PROCESSED_PREFIX = "processed/"
+        mock_storage.get_presigned_upload.side_effect = Exception("boom")
+
+        user = self._create_user(db)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            "/api/videos/upload-url",
+            json={"title": "Test"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert db.query(models.Video).count() == 0
+
+    @patch("app.api.routes.videos.storage")
+    def test_complete_upload_success(self, mock_storage, client: TestClient, db):
+        """Test confirming an upload queues the video for processing"""
+        mock_storage.file_exists.return_value = True
+        user = self._create_user(db)
+        video = self._create_video(db, user)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            f"/api/videos/{video.id}/complete-upload",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["video_id"] == str(video.id)
+        db.refresh(video)
+        assert video.status == "pending"
+        # The processing message is staged in the same transaction as the status change
+        messages = db.query(models.OutboxMessage).filter_by(video_id=video.id).all()
+        assert len(messages) == 1
+        assert messages[0].published_at is None
+
+    @patch("app.api.routes.videos.storage")
+    def test_complete_upload_file_missing(self, mock_storage, client: TestClient, db):
+        """Test confirming before the object exists returns 409"""
+        mock_storage.file_exists.return_value = False
+        user = self._create_user(db)
+        video = self._create_video(db, user)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            f"/api/videos/{video.id}/complete-upload",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        db.refresh(video)
+        assert video.status == "awaiting_upload"
+        assert db.query(models.OutboxMessage).count() == 0
+
+    def test_complete_upload_already_completed(self, client: TestClient, db):
+        """Test confirming twice does not enqueue the video again"""
+        user = self._create_user(db)
+        video = self._create_video(db, user, status="pending")
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            f"/api/videos/{video.id}/complete-upload",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert db.query(models.OutboxMessage).count() == 0
+
+    def test_complete_upload_not_owner(self, client: TestClient, db):
+        """Test only the owner can confirm an upload"""
+        owner = self._create_user(db)
+        other = self._create_user(db, email="other_direct@example.com")
+        video = self._create_video(db, owner)
+        token = create_access_token(data={"sub": str(other.id)})
+
+        response = client.post(
+            f"/api/videos/{video.id}/complete-upload",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_complete_upload_not_found(self, client: TestClient, db):
+        """Test confirming an unknown video returns 404"""
+        user = self._create_user(db)
+        token = create_access_token(data={"sub": str(user.id)})
+
+        response = client.post(
+            "/api/videos/550e8400-e29b-41d4-a716-446655440000/complete-upload",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 class TestListMyVideos:
@@ -642,6 +889,13 @@ class TestDeleteVideo:
             status="completed",
             original_file_path="/uploads/test.mp4",
             processed_file_path="/processed/test.mp4",
+            renditions=[
+                {"height": 720, "width": 1280, "bandwidth": 1, "path": "/processed/test.mp4"},
+                {"height": 360, "width": 640, "bandwidth": 1, "path": "/processed/test_360p.mp4"},
+            ],
+            hls_playlist_path="/processed/test_hls/master.m3u8",
+            poster_path="/processed/test_poster.jpg",
+            sprite={"path": "/processed/test_sprite.jpg"},
         )
         db.add(video)
         db.commit()
@@ -658,8 +912,17 @@ class TestDeleteVideo:
         )
 
         assert response.status_code == status.HTTP_200_OK
-        # Verify both files were attempted to be removed
-        assert mock_storage.delete_file.call_count == 2
+        # Verify both files, the extra rendition and the previews were attempted to be removed
+        deleted = [c.args[0] for c in mock_storage.delete_file.call_args_list]
+        assert deleted == [
+            "/uploads/test.mp4",
+            "/processed/test.mp4",
+            "/processed/test_360p.mp4",
+            "/processed/test_poster.jpg",
+            "/processed/test_sprite.jpg",
+        ]
+        # Playlists and segments go with the video
+        mock_storage.delete_directory.assert_called_once_with("/processed/test_hls")
 
     def test_delete_video_with_votes(self, client: TestClient, db):
         """Test deleting video that has votes"""
@@ -782,6 +1045,19 @@ class TestDeleteVideoFile:
 class TestPresignedURLs:
     """Tests for S3 presigned URL generation"""
 
+    RENDITIONS = [
+        {"height": 720, "width": 1280, "bandwidth": 2400000, "path": "processed/test.mp4"},
+        {"height": 360, "width": 640, "bandwidth": 700000, "path": "processed/test_360p.mp4"},
+    ]
+    SPRITE = {
+        "path": "processed/test_sprite.jpg",
+        "interval": 2,
+        "columns": 5,
+        "rows": 3,
+        "width": 160,
+        "height": 90,
+    }
+
     @patch("app.api.routes.videos.settings")
     @patch("app.api.routes.videos.storage")
     def test_list_videos_with_s3_presigned_urls(
@@ -789,6 +1065,7 @@ class TestPresignedURLs:
     ):
         """Test list_user_videos generates presigned URLs for S3"""
         mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.HLS_BASE_URL = "https://cdn.example.com/"
         mock_storage.get_presigned_url.return_value = "https://s3.amazonaws.com/presigned-url"
 
         # Create user
@@ -810,6 +1087,7 @@ class TestPresignedURLs:
             original_file_path="uploads/test.mp4",
             processed_file_path="processed/test.mp4",
             status="processed",
+            hls_playlist_path="processed/test_hls/master.m3u8",
         )
         db.add(video)
         db.commit()
@@ -826,6 +1104,8 @@ class TestPresignedURLs:
         assert len(videos) == 1
         assert videos[0]["processed_url"] == "https://s3.amazonaws.com/presigned-url"
         mock_storage.get_presigned_url.assert_called_once()
+        # Playlists reference their segments, so they come from HLS_BASE_URL, not presigned
+        assert videos[0]["hls_url"] == "https://cdn.example.com/processed/test_hls/master.m3u8"
 
     @patch("app.api.routes.videos.settings")
     @patch("app.api.routes.videos.storage")
@@ -895,6 +1175,10 @@ class TestPresignedURLs:
             original_file_path="uploads/test.mp4",
             processed_file_path="processed/test.mp4",
             status="processed",
+            renditions=self.RENDITIONS,
+            hls_playlist_path="processed/test_hls/master.m3u8",
+            poster_path="processed/test_poster.jpg",
+            sprite=self.SPRITE,
         )
         db.add(video)
         db.commit()
@@ -909,7 +1193,15 @@ class TestPresignedURLs:
         assert response.status_code == status.HTTP_200_OK
         videos = response.json()
         assert len(videos) == 1
-        assert f"https://anb.com/videos/processed/{video.id}.mp4" in videos[0]["processed_url"]
+        # Served by file name, which identical uploads share
+        assert videos[0]["processed_url"] == "https://anb.com/videos/processed/test.mp4"
+        assert [r["url"] for r in videos[0]["renditions"]] == [
+            "https://anb.com/videos/processed/test.mp4",
+            "https://anb.com/videos/processed/test_360p.mp4",
+        ]
+        assert videos[0]["hls_url"] == "https://anb.com/videos/processed/test_hls/master.m3u8"
+        assert videos[0]["poster_url"] == "https://anb.com/videos/processed/test_poster.jpg"
+        assert videos[0]["sprite"]["url"] == "https://anb.com/videos/processed/test_sprite.jpg"
 
     @patch("app.api.routes.videos.settings")
     @patch("app.api.routes.videos.storage")
@@ -918,10 +1210,9 @@ class TestPresignedURLs:
     ):
         """Test get_video_detail generates presigned URLs for S3"""
         mock_settings.STORAGE_BACKEND = "s3"
-        mock_storage.get_presigned_url.side_effect = [
-            "https://s3.amazonaws.com/original-presigned-url",
-            "https://s3.amazonaws.com/processed-presigned-url",
-        ]
+        mock_storage.get_presigned_url.side_effect = (
+            lambda path, expiration: f"https://s3.amazonaws.com/{path}"
+        )
 
         # Create user
         user = models.User(
@@ -942,6 +1233,9 @@ class TestPresignedURLs:
             original_file_path="uploads/test.mp4",
             processed_file_path="processed/test.mp4",
             status="processed",
+            renditions=self.RENDITIONS,
+            poster_path="processed/test_poster.jpg",
+            sprite=self.SPRITE,
         )
         db.add(video)
         db.commit()
@@ -955,9 +1249,34 @@ class TestPresignedURLs:
 
         assert response.status_code == status.HTTP_200_OK
         video_data = response.json()
-        assert video_data["original_url"] == "https://s3.amazonaws.com/original-presigned-url"
-        assert video_data["processed_url"] == "https://s3.amazonaws.com/processed-presigned-url"
-        assert mock_storage.get_presigned_url.call_count == 2
+        assert video_data["original_url"] == "https://s3.amazonaws.com/uploads/test.mp4"
+        assert video_data["processed_url"] == "https://s3.amazonaws.com/processed/test.mp4"
+        # Each rendition gets its own presigned URL and keeps its bitrate
+        assert video_data["renditions"] == [
+            {
+                "height": 720,
+                "width": 1280,
+                "bandwidth": 2400000,
+                "url": "https://s3.amazonaws.com/processed/test.mp4",
+            },
+            {
+                "height": 360,
+                "width": 640,
+                "bandwidth": 700000,
+                "url": "https://s3.amazonaws.com/processed/test_360p.mp4",
+            },
+        ]
+        assert video_data["poster_url"] == "https://s3.amazonaws.com/processed/test_poster.jpg"
+        # The sprite keeps its grid, with a URL in place of its storage path
+        assert video_data["sprite"] == {
+            "url": "https://s3.amazonaws.com/processed/test_sprite.jpg",
+            "interval": 2,
+            "columns": 5,
+            "rows": 3,
+            "width": 160,
+            "height": 90,
+        }
+        assert mock_storage.get_presigned_url.call_count == 6
 
     @patch("app.api.routes.videos.settings")
     @patch("app.api.routes.videos.storage")
@@ -1040,5 +1359,189 @@ class TestPresignedURLs:
 
         assert response.status_code == status.HTTP_200_OK
         video_data = response.json()
-        assert f"https://anb.com/uploads/{video.id}.mp4" in video_data["original_url"]
-        assert f"https://anb.com/processed/{video.id}.mp4" in video_data["processed_url"]
+        assert video_data["original_url"] == "https://anb.com/uploads/test.mp4"
+        assert video_data["processed_url"] == "https://anb.com/processed/test.mp4"
+        # Single-output videos have no ladder
+        assert video_data["renditions"] == []
+        # HLS_PACKAGING is off, so the worker wrote no playlist
+        assert video_data["hls_url"] is None
+        # Nor did it write previews
+        assert (video_data["poster_url"], video_data["sprite"]) == (None, None)
+
+
+class TestUploadDeduplication:
+    """Tests for content-addressed uploads"""
+
+    @pytest.fixture
+    def uploads(self, tmp_path, monkeypatch):
+        """Local storage in a temporary upload directory"""
+        from app.core.config import settings
+        from app.core.storage import LocalStorage
+
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "local")
+        monkeypatch.setattr(settings, "UPLOAD_BASE_DIR", str(tmp_path / "uploads"))
+        monkeypatch.setattr(settings, "PROCESSED_BASE_DIR", str(tmp_path / "processed"))
+        with patch("app.api.routes.videos.storage", LocalStorage()):
+            yield tmp_path / "uploads"
+
+    @pytest.fixture
+    def headers(self, db):
+        user = models.User(
+            first_name="Dedup",
+            last_name="User",
+            email="dedup@example.com",
+            password="password",
+            city="City",
+            country="Country",
+        )
+        db.add(user)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+
+    @staticmethod
+    def _upload(client, headers, content):
+        response = client.post(
+            "/api/videos/upload",
+            files={"file": ("test_video.mp4", io.BytesIO(content), "video/mp4")},
+            data={"title": "Same clip"},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.json()["video_id"]
+
+    def test_identical_uploads_stored_once(self, client: TestClient, db, uploads, headers):
+        """Test identical files share one content-addressed original"""
+        first = self._upload(client, headers, b"same bytes")
+        second = self._upload(client, headers, b"same bytes")
+        other = self._upload(client, headers, b"other bytes")
+
+        sha256 = hashlib.sha256(b"same bytes").hexdigest()
+        videos = {str(v.id): v for v in db.query(models.Video).all()}
+        a, b = videos[first], videos[second]
+        assert a.source_sha256 == b.source_sha256 == sha256
+        assert a.original_file_path == b.original_file_path == str(uploads / f"{sha256}.mp4")
+        # No staging files left behind
+        assert sorted(os.listdir(uploads)) == sorted(
+            [f"{sha256}.mp4", os.path.basename(videos[other].original_file_path)]
+        )
+        assert a.processed_file_path != b.processed_file_path
+
+    def test_delete_keeps_shared_original(self, client: TestClient, db, uploads, headers):
+        """Test the original is only deleted with the last video using it"""
+        first = self._upload(client, headers, b"same bytes")
+        second = self._upload(client, headers, b"same bytes")
+
+        client.delete(f"/api/videos/{first}", headers=headers)
+        assert len(os.listdir(uploads)) == 1
+
+        client.delete(f"/api/videos/{second}", headers=headers)
+        assert os.listdir(uploads) == []
+
+    def test_delete_waits_for_upload_of_same_content(self, db):
+        """Test the content lock of an uncommitted upload holds off a delete of its original"""
+        sha256 = hashlib.sha256(b"same bytes").hexdigest()
+        _lock_content(db, sha256)  # An upload that hasn't committed its video yet
+        other = Session(bind=db.get_bind())
+        locked = threading.Event()
+
+        def delete():
+            _lock_content(other, sha256)
+            locked.set()
+            other.rollback()
+
+        thread = threading.Thread(target=delete)
+        thread.start()
+        assert not locked.wait(0.3)
+
+        db.commit()
+        assert locked.wait(5)
+        thread.join()
+        other.close()
+
+    def test_deduplication_disabled(self, client: TestClient, db, uploads, headers, monkeypatch):
+        """Test DEDUPLICATE_UPLOADS=False keeps one file per upload, still hashed"""
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "DEDUPLICATE_UPLOADS", False)
+
+        first = self._upload(client, headers, b"same bytes")
+        self._upload(client, headers, b"same bytes")
+
+        video = db.query(models.Video).filter(models.Video.id == first).first()
+        assert os.path.basename(video.original_file_path) == f"{first}.mp4"
+        assert video.source_sha256 is not None
+        assert len(os.listdir(uploads)) == 2
+
+    def test_delete_drops_cached_output(self, client: TestClient, db, uploads, headers):
+        """Test deleting the last video using an output also removes its cache entry"""
+        video_id = self._upload(client, headers, b"same bytes")
+        video = db.query(models.Video).filter(models.Video.id == video_id).first()
+        db.add(
+            models.ProcessedOutput(
+                source_sha256=video.source_sha256,
+                pipeline_version="v1",
+                processed_file_path=video.processed_file_path,
+            )
+        )
+        db.commit()
+
+        client.delete(f"/api/videos/{video_id}", headers=headers)
+
+        assert db.query(models.ProcessedOutput).count() == 0
+
+
+class TestProcessingLanes:
+    """Tests for the queue lane picked for an upload's processing message"""
+
+    @pytest.fixture
+    def user(self, db, tmp_path, monkeypatch):
+        from app.core.config import settings
+        from app.core.storage import LocalStorage
+
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "local")
+        monkeypatch.setattr(settings, "UPLOAD_BASE_DIR", str(tmp_path / "uploads"))
+        monkeypatch.setattr(settings, "BULK_LANE_BACKLOG", 2)
+        user = models.User(
+            first_name="Lane",
+            last_name="User",
+            email="lane@example.com",
+            password="password",
+            city="City",
+            country="Country",
+        )
+        db.add(user)
+        db.commit()
+        with patch("app.api.routes.videos.storage", LocalStorage()):
+            yield user
+
+    @staticmethod
+    def _lane(client, db, user, content=b"clip", **data):
+        response = client.post(
+            "/api/videos/upload",
+            files={"file": ("clip.mp4", io.BytesIO(content), "video/mp4")},
+            data={"title": "Clip", **data},
+            headers={"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        video_id = response.json()["video_id"]
+        return db.query(models.OutboxMessage).filter_by(video_id=video_id).one().lane
+
+    def test_first_video_priority_then_normal(self, client: TestClient, db, user):
+        """Test a user's first video jumps the queue, later ones don't"""
+        assert self._lane(client, db, user, b"first") == "priority"
+        assert self._lane(client, db, user, b"second") == "normal"
+
+    def test_backlog_goes_to_bulk(self, client: TestClient, db, user):
+        """Test users with BULK_LANE_BACKLOG videos waiting are moved to the bulk lane"""
+        self._lane(client, db, user, b"1")
+        self._lane(client, db, user, b"2")
+
+        assert self._lane(client, db, user, b"3") == "bulk"
+
+        db.query(models.Video).update({models.Video.status: "processed"})
+        db.commit()
+        assert self._lane(client, db, user, b"4") == "normal"
+
+    def test_bulk_requested(self, client: TestClient, db, user):
+        """Test batch imports can ask for the bulk lane, even for a first video"""
+        assert self._lane(client, db, user, bulk="true") == "bulk"
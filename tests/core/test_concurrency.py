@@ -0,0 +1,52 @@
+"""Tests for blocking I/O helpers"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.concurrency import run_blocking
+
+
+class TestRunBlocking:
+    """Tests for run_blocking"""
+
+    def test_returns_result_from_worker_thread(self):
+        """Test the callable runs off the event loop thread and its result is returned"""
+        loop_thread = threading.get_ident()
+
+        async def main():
+            return await run_blocking(lambda a, b=0: (threading.get_ident(), a + b), 1, b=2)
+
+        worker_thread, value = asyncio.run(main())
+
+        assert value == 3
+        assert worker_thread != loop_thread
+
+    def test_propagates_exceptions(self):
+        """Test exceptions raised by the callable reach the awaiting coroutine"""
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            asyncio.run(run_blocking(fail))
+
+    def test_does_not_block_event_loop(self):
+        """Test other coroutines keep running while blocking work is in progress"""
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(run_blocking(time.sleep, 0.2), ticker())
+
+        start = time.monotonic()
+        asyncio.run(main())
+
+        # All ticks happened while the blocking call was still sleeping
+        assert len(ticks) == 5
+        assert ticks[-1] - start < 0.2
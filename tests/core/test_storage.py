@@ -1,17 +1,29 @@
 """Tests for storage abstraction layer"""
+import base64
+import hashlib
+import io
 import os
 import tempfile
 from unittest.mock import MagicMock, patch
 
+import boto3
 import pytest
+import requests
 from botocore.exceptions import ClientError
+from moto import mock_aws
 
+from app.core.config import settings
 from app.core.storage import (
+    HashingReader,
     LocalStorage,
     S3Storage,
+    SizeLimitedReader,
     StorageDownloadError,
+    StorageError,
+    StorageSizeLimitError,
     StorageUploadError,
     StorageURLError,
+    StorageWriteReceipt,
     get_storage,
 )
 
@@ -34,6 +46,50 @@ class TestLocalStorage:
             with open(file_path, "rb") as f:
                 assert f.read() == file_data
 
+    def test_upload_fileobj_success(self):
+        """Test streaming a file-like object to the local filesystem"""
+        storage = LocalStorage()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "subdir", "test.mp4")
+            file_data = b"x" * (3 * 1024 * 1024 + 17)
+
+            receipt = storage.upload_fileobj(io.BytesIO(file_data), file_path)
+
+            assert receipt.path == file_path
+            assert receipt.size == len(file_data)
+            assert receipt.checksum is None
+            with open(file_path, "rb") as f:
+                assert f.read() == file_data
+
+    def test_upload_fileobj_verified_write(self, monkeypatch):
+        """Test verified local writes are checksummed and fsync'ed"""
+        monkeypatch.setattr(settings, "STORAGE_VERIFY_WRITES", True)
+        storage = LocalStorage()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "test.mp4")
+
+            with patch("app.core.storage.os.fsync") as mock_fsync:
+                receipt = storage.upload_fileobj(io.BytesIO(b"test content"), file_path)
+
+            assert receipt.size == 12
+            assert receipt.checksum == hashlib.md5(b"test content").hexdigest()
+            mock_fsync.assert_called_once()
+
+    def test_upload_fileobj_size_limit_removes_partial_file(self):
+        """Test a streamed upload over the limit leaves no partial file"""
+        storage = LocalStorage()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "test.mp4")
+            reader = SizeLimitedReader(io.BytesIO(b"x" * 200), max_bytes=100)
+
+            with pytest.raises(StorageSizeLimitError):
+                storage.upload_fileobj(reader, file_path)
+
+            assert not os.path.exists(file_path)
+
     def test_download_file_success(self):
         """Test successful file download from local filesystem"""
         storage = LocalStorage()
@@ -48,6 +104,67 @@ class TestLocalStorage:
         finally:
             os.unlink(tmp_path)
 
+    def test_download_fileobj_success(self):
+        """Test streaming a local file into a file-like object"""
+        storage = LocalStorage()
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+            tmp.write(b"test content")
+            tmp_path = tmp.name
+
+        try:
+            buffer = io.BytesIO()
+            storage.download_fileobj(tmp_path, buffer)
+            assert buffer.getvalue() == b"test content"
+        finally:
+            os.unlink(tmp_path)
+
+    def test_iter_file_yields_chunks(self):
+        """Test iter_file yields the file in bounded chunks"""
+        storage = LocalStorage()
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+            tmp.write(b"abcdefghij")
+            tmp_path = tmp.name
+
+        try:
+            chunks = list(storage.iter_file(tmp_path, chunk_size=4))
+            assert chunks == [b"abcd", b"efgh", b"ij"]
+        finally:
+            os.unlink(tmp_path)
+
+    def test_read_range_and_size(self):
+        """Test read_range returns the requested slice and get_file_size the total"""
+        storage = LocalStorage()
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+            tmp.write(b"abcdefghij")
+            tmp_path = tmp.name
+
+        try:
+            assert storage.get_file_size(tmp_path) == 10
+            assert storage.read_range(tmp_path, 3, 4) == b"defg"
+            assert storage.read_range(tmp_path, 8, 10) == b"ij"
+        finally:
+            os.unlink(tmp_path)
+
+    def test_download_range_fileobj(self, monkeypatch):
+        """Test a byte range is copied to the file object in bounded chunks"""
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 3)
+        storage = LocalStorage()
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+            tmp.write(b"abcdefghij")
+            tmp_path = tmp.name
+
+        try:
+            out = io.BytesIO()
+            assert storage.download_range_fileobj(tmp_path, 2, 7, out) == 7
+            assert out.getvalue() == b"cdefghi"
+            assert storage.download_range_fileobj(tmp_path, 8, 10, io.BytesIO()) == 2
+        finally:
+            os.unlink(tmp_path)
+
     def test_delete_file_success(self):
         """Test successful file deletion"""
         storage = LocalStorage()
@@ -69,6 +186,31 @@ class TestLocalStorage:
 
         assert result is False
 
+    def test_delete_directory(self, tmp_path):
+        """Test a directory tree is removed and its files counted"""
+        package = tmp_path / "video_hls"
+        package.mkdir()
+        for name in ("master.m3u8", "720p.m3u8", "720p_000.ts"):
+            (package / name).write_bytes(b"x")
+
+        assert LocalStorage().delete_directory(str(package)) == 3
+        assert not package.exists()
+        assert LocalStorage().delete_directory(str(package)) == 0
+
+    def test_move_file_if_absent(self, tmp_path):
+        """Test a file is moved into a new directory unless the destination exists"""
+        source = tmp_path / "staging.mp4"
+        source.write_bytes(b"new")
+        destination = tmp_path / "sha" / "abc.mp4"
+
+        assert LocalStorage().move_file_if_absent(str(source), str(destination)) is True
+        assert destination.read_bytes() == b"new"
+
+        source.write_bytes(b"other")
+        assert LocalStorage().move_file_if_absent(str(source), str(destination)) is False
+        assert destination.read_bytes() == b"new"
+        assert not source.exists()
+
     def test_delete_file_with_exception(self):
         """Test delete_file handles exceptions gracefully"""
         storage = LocalStorage()
@@ -131,6 +273,8 @@ class TestS3Storage:
         """Test successful file upload to S3"""
         mock_settings.AWS_REGION = "us-east-1"
         mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_settings.S3_MULTIPART_THRESHOLD = 1024
+        mock_settings.STORAGE_VERIFY_WRITES = False
         mock_s3_client = MagicMock()
         mock_boto_client.return_value = mock_s3_client
 
@@ -154,6 +298,8 @@ class TestS3Storage:
         """Test upload_file raises StorageUploadError on ClientError"""
         mock_settings.AWS_REGION = "us-east-1"
         mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_settings.S3_MULTIPART_THRESHOLD = 1024
+        mock_settings.STORAGE_VERIFY_WRITES = False
         mock_s3_client = MagicMock()
         mock_boto_client.return_value = mock_s3_client
         mock_s3_client.put_object.side_effect = ClientError(
@@ -167,6 +313,78 @@ class TestS3Storage:
 
         assert "Failed to upload to S3" in str(exc_info.value)
 
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_upload_fileobj_below_threshold_uses_put_object(self, mock_settings, mock_boto_client):
+        """Test a small stream is sent as a single PUT"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_settings.S3_MULTIPART_THRESHOLD = 1024
+        mock_settings.STORAGE_VERIFY_WRITES = False
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.put_object.return_value = {"ETag": '"abc"'}
+
+        storage = S3Storage()
+
+        receipt = storage.upload_fileobj(io.BytesIO(b"test content"), "uploads/test.mp4")
+
+        assert receipt == StorageWriteReceipt(path="uploads/test.mp4", size=12, etag='"abc"')
+        mock_s3_client.put_object.assert_called_once_with(
+            Bucket="test-bucket",
+            Key="uploads/test.mp4",
+            Body=b"test content",
+            ContentType="video/mp4",
+        )
+        mock_s3_client.create_multipart_upload.assert_not_called()
+        mock_s3_client.head_object.assert_not_called()
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_upload_fileobj_verified_write_sends_content_md5(self, mock_settings, mock_boto_client):
+        """Test verified S3 writes send Content-MD5 so S3 rejects corrupted bodies"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_settings.S3_MULTIPART_THRESHOLD = 1024
+        mock_settings.STORAGE_VERIFY_WRITES = True
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.put_object.return_value = {"ETag": '"abc"'}
+
+        storage = S3Storage()
+        receipt = storage.upload_fileobj(io.BytesIO(b"test content"), "uploads/test.mp4")
+
+        digest = hashlib.md5(b"test content")
+        assert receipt == StorageWriteReceipt(
+            path="uploads/test.mp4", size=12, etag='"abc"', checksum=digest.hexdigest()
+        )
+        # Built from the PUT itself: no HeadObject round trip
+        mock_s3_client.head_object.assert_not_called()
+        assert mock_s3_client.put_object.call_args.kwargs["ContentMD5"] == (
+            base64.b64encode(digest.digest()).decode()
+        )
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_upload_fileobj_client_error(self, mock_settings, mock_boto_client):
+        """Test upload_fileobj raises StorageUploadError on ClientError"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_settings.S3_MULTIPART_THRESHOLD = 1024
+        mock_settings.STORAGE_VERIFY_WRITES = False
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.put_object.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "PutObject"
+        )
+
+        storage = S3Storage()
+
+        with pytest.raises(StorageUploadError) as exc_info:
+            storage.upload_fileobj(io.BytesIO(b"data"), "test.mp4")
+
+        assert "Failed to upload to S3" in str(exc_info.value)
+
     @patch("app.core.storage.boto3.client")
     @patch("app.core.storage.settings")
     def test_download_file_success(self, mock_settings, mock_boto_client):
@@ -207,6 +425,77 @@ class TestS3Storage:
 
         assert "Failed to download from S3" in str(exc_info.value)
 
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_download_fileobj_success(self, mock_settings, mock_boto_client):
+        """Test streaming an S3 object into a file-like object"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+
+        storage = S3Storage()
+        buffer = io.BytesIO()
+        storage.download_fileobj("uploads/test.mp4", buffer)
+
+        mock_s3_client.download_fileobj.assert_called_once_with(
+            "test-bucket", "uploads/test.mp4", buffer
+        )
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_download_fileobj_client_error(self, mock_settings, mock_boto_client):
+        """Test download_fileobj raises StorageDownloadError on ClientError"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.download_fileobj.side_effect = ClientError(
+            {"Error": {"Code": "404"}}, "HeadObject"
+        )
+
+        storage = S3Storage()
+
+        with pytest.raises(StorageDownloadError):
+            storage.download_fileobj("nonexistent.mp4", io.BytesIO())
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_iter_file_streams_body(self, mock_settings, mock_boto_client):
+        """Test iter_file yields chunks from the S3 response body and closes it"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+
+        mock_body = MagicMock()
+        mock_body.iter_chunks.return_value = iter([b"abc", b"def"])
+        mock_s3_client.get_object.return_value = {"Body": mock_body}
+
+        storage = S3Storage()
+        chunks = list(storage.iter_file("uploads/test.mp4", chunk_size=3))
+
+        assert chunks == [b"abc", b"def"]
+        mock_body.iter_chunks.assert_called_once_with(3)
+        mock_body.close.assert_called_once()
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_iter_file_client_error(self, mock_settings, mock_boto_client):
+        """Test iter_file raises StorageDownloadError on ClientError"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "NoSuchKey"}}, "GetObject"
+        )
+
+        storage = S3Storage()
+
+        with pytest.raises(StorageDownloadError):
+            list(storage.iter_file("nonexistent.mp4"))
+
     @patch("app.core.storage.boto3.client")
     @patch("app.core.storage.settings")
     def test_delete_file_success(self, mock_settings, mock_boto_client):
@@ -327,6 +616,48 @@ class TestS3Storage:
 
         assert "Failed to generate presigned URL" in str(exc_info.value)
 
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_get_presigned_upload_success(self, mock_settings, mock_boto_client):
+        """Test presigned POST generation enforces size and content type"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.generate_presigned_post.return_value = {"url": "u", "fields": {}}
+
+        storage = S3Storage()
+        result = storage.get_presigned_upload("uploads/test.mp4", max_size=100, expiration=60)
+
+        assert result == {"url": "u", "fields": {}}
+        mock_s3_client.generate_presigned_post.assert_called_once_with(
+            Bucket="test-bucket",
+            Key="uploads/test.mp4",
+            Fields={"Content-Type": "video/mp4"},
+            Conditions=[
+                ["content-length-range", 1, 100],
+                ["starts-with", "$Content-Type", "video/"],
+            ],
+            ExpiresIn=60,
+        )
+
+    @patch("app.core.storage.boto3.client")
+    @patch("app.core.storage.settings")
+    def test_get_presigned_upload_client_error(self, mock_settings, mock_boto_client):
+        """Test get_presigned_upload raises StorageURLError on ClientError"""
+        mock_settings.AWS_REGION = "us-east-1"
+        mock_settings.AWS_S3_BUCKET = "test-bucket"
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        mock_s3_client.generate_presigned_post.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "GeneratePresignedPost"
+        )
+
+        storage = S3Storage()
+
+        with pytest.raises(StorageURLError):
+            storage.get_presigned_upload("uploads/test.mp4", max_size=100)
+
     @patch("app.core.storage.boto3.client")
     @patch("app.core.storage.settings")
     def test_get_content_type_mp4(self, mock_settings, mock_boto_client):
@@ -354,6 +685,220 @@ class TestS3Storage:
         assert result == "application/octet-stream"
 
 
+class TestS3MultipartUpload:
+    """Tests for S3 multipart uploads against a moto S3 stand-in"""
+
+    PART_SIZE = 5 * 1024 * 1024  # S3 minimum part size
+
+    @pytest.fixture
+    def s3_storage(self, monkeypatch):
+        """S3Storage bound to a moto bucket with a 5 MB part size"""
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+        monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+        monkeypatch.setattr(settings, "AWS_S3_BUCKET", "test-bucket")
+        monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", self.PART_SIZE)
+        monkeypatch.setattr(settings, "S3_MULTIPART_PART_SIZE", self.PART_SIZE)
+        monkeypatch.setattr(settings, "S3_MULTIPART_CONCURRENCY", 3)
+
+        with mock_aws():
+            boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+            yield S3Storage()
+
+    def test_upload_fileobj_above_threshold_uses_multipart(self, s3_storage):
+        """Test a large stream is uploaded in parallel parts and reassembled"""
+        data = os.urandom(2 * self.PART_SIZE + 1234)
+
+        with patch.object(s3_storage, "_upload_part", wraps=s3_storage._upload_part) as upload:
+            s3_storage.upload_fileobj(io.BytesIO(data), "processed/big.mp4")
+
+        assert upload.call_count == 3
+        obj = s3_storage.s3_client.get_object(Bucket="test-bucket", Key="processed/big.mp4")
+        assert obj["Body"].read() == data
+        assert obj["ContentType"] == "video/mp4"
+
+    def test_multipart_receipt_with_verification(self, s3_storage, monkeypatch):
+        """Test multipart uploads return a receipt matching the stored object"""
+        monkeypatch.setattr(settings, "STORAGE_VERIFY_WRITES", True)
+        data = os.urandom(self.PART_SIZE + 99)
+
+        receipt = s3_storage.upload_fileobj(io.BytesIO(data), "processed/verified.mp4")
+
+        head = s3_storage.s3_client.head_object(Bucket="test-bucket", Key="processed/verified.mp4")
+        assert receipt.size == len(data) == head["ContentLength"]
+        assert receipt.etag == head["ETag"]
+        assert receipt.checksum == hashlib.md5(data).hexdigest()
+
+    def test_upload_file_large_bytes_uses_multipart(self, s3_storage):
+        """Test upload_file switches to multipart above the threshold"""
+        data = os.urandom(self.PART_SIZE + 10)
+
+        s3_storage.upload_file(data, "processed/bytes.mp4")
+
+        obj = s3_storage.s3_client.get_object(Bucket="test-bucket", Key="processed/bytes.mp4")
+        assert obj["Body"].read() == data
+        assert "-2" in obj["ETag"]  # multipart ETags carry the part count
+
+    def test_multipart_part_failure_aborts_upload(self, s3_storage):
+        """Test a failed part aborts the upload and leaves no object or parts behind"""
+        data = os.urandom(2 * self.PART_SIZE)
+        error = ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+
+        with patch.object(s3_storage, "_upload_part", side_effect=error):
+            with pytest.raises(StorageUploadError):
+                s3_storage.upload_fileobj(io.BytesIO(data), "processed/fail.mp4")
+
+        client = s3_storage.s3_client
+        assert "Uploads" not in client.list_multipart_uploads(Bucket="test-bucket")
+        assert not s3_storage.file_exists("processed/fail.mp4")
+
+    def test_multipart_stream_error_aborts_upload(self, s3_storage):
+        """Test a size-limit error mid-stream aborts the upload and propagates"""
+        reader = SizeLimitedReader(io.BytesIO(os.urandom(3 * self.PART_SIZE)), 2 * self.PART_SIZE)
+
+        with pytest.raises(StorageSizeLimitError):
+            s3_storage.upload_fileobj(reader, "uploads/too-big.mp4")
+
+        client = s3_storage.s3_client
+        assert "Uploads" not in client.list_multipart_uploads(Bucket="test-bucket")
+
+
+class TestS3RangedReads:
+    """Tests for S3 ranged reads against a moto S3 stand-in"""
+
+    @pytest.fixture
+    def s3_storage(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+        monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+        monkeypatch.setattr(settings, "AWS_S3_BUCKET", "test-bucket")
+
+        with mock_aws():
+            boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+            storage = S3Storage()
+            storage.upload_file(b"0123456789", "uploads/range.mp4")
+            yield storage
+
+    def test_read_range(self, s3_storage):
+        """Test read_range fetches only the requested bytes"""
+        assert s3_storage.read_range("uploads/range.mp4", 2, 5) == b"23456"
+        assert s3_storage.read_range("uploads/range.mp4", 2, 0) == b""
+
+    def test_download_range_fileobj(self, s3_storage):
+        """Test a ranged GET is streamed into the file object"""
+        out = io.BytesIO()
+
+        written = s3_storage.download_range_fileobj("uploads/range.mp4", 3, 4, out)
+
+        assert written == 4
+        assert out.getvalue() == b"3456"
+
+    def test_get_file_size(self, s3_storage):
+        """Test get_file_size reads ContentLength without downloading"""
+        assert s3_storage.get_file_size("uploads/range.mp4") == 10
+
+    def test_delete_directory(self, s3_storage):
+        """Test every object under the prefix is deleted, and nothing else"""
+        for name in ("master.m3u8", "720p.m3u8", "720p_000.ts"):
+            s3_storage.upload_file(b"x", f"processed/a_hls/{name}")
+        s3_storage.upload_file(b"x", "processed/a_hls_other.mp4")
+
+        assert s3_storage.delete_directory("processed/a_hls") == 3
+        assert not s3_storage.file_exists("processed/a_hls/master.m3u8")
+        assert s3_storage.file_exists("processed/a_hls_other.mp4")
+        assert s3_storage.file_exists("uploads/range.mp4")
+
+    def test_move_file_if_absent(self, s3_storage):
+        """Test an object is copied server-side to a new key and the old key removed"""
+        assert s3_storage.move_file_if_absent("uploads/range.mp4", "uploads/abc.mp4") is True
+
+        assert s3_storage.read_range("uploads/abc.mp4", 0, 10) == b"0123456789"
+        assert not s3_storage.file_exists("uploads/range.mp4")
+        with pytest.raises(StorageError):
+            s3_storage.move_file_if_absent("uploads/missing.mp4", "uploads/other.mp4")
+
+    def test_move_file_if_absent_existing_key(self, s3_storage, monkeypatch):
+        """Test a failed If-None-Match keeps the stored object and drops the source"""
+        s3_storage.upload_file(b"dup", "uploads/staging.mp4")
+
+        def copy_object(**kwargs):
+            assert kwargs["IfNoneMatch"] == "*"
+            raise ClientError({"Error": {"Code": "PreconditionFailed"}}, "CopyObject")
+
+        monkeypatch.setattr(s3_storage.s3_client, "copy_object", copy_object)
+
+        assert s3_storage.move_file_if_absent("uploads/staging.mp4", "uploads/abc.mp4") is False
+        assert not s3_storage.file_exists("uploads/staging.mp4")
+
+    def test_presigned_upload_form(self, s3_storage):
+        """Test the presigned form, posted as returned, stores the file as a video"""
+        form = s3_storage.get_presigned_upload("uploads/direct.mp4", max_size=100)
+
+        response = requests.post(
+            form["url"], data=form["fields"], files={"file": ("direct.mp4", b"video")}
+        )
+
+        assert response.status_code == 204
+        head = s3_storage.s3_client.head_object(Bucket="test-bucket", Key="uploads/direct.mp4")
+        assert (head["ContentLength"], head["ContentType"]) == (5, "video/mp4")
+
+    def test_missing_object_raises(self, s3_storage):
+        """Test ranged reads of a missing key raise StorageDownloadError"""
+        with pytest.raises(StorageDownloadError):
+            s3_storage.read_range("uploads/missing.mp4", 0, 10)
+        with pytest.raises(StorageDownloadError):
+            s3_storage.get_file_size("uploads/missing.mp4")
+        with pytest.raises(StorageDownloadError):
+            s3_storage.download_range_fileobj("uploads/missing.mp4", 0, 10, io.BytesIO())
+
+
+class TestSizeLimitedReader:
+    """Tests for SizeLimitedReader wrapper"""
+
+    def test_read_within_limit(self):
+        """Test chunks are passed through and counted"""
+        reader = SizeLimitedReader(io.BytesIO(b"abcdef"), max_bytes=6)
+
+        assert reader.read(4) == b"abcd"
+        assert reader.read(4) == b"ef"
+        assert reader.read(4) == b""
+        assert reader.bytes_read == 6
+
+    def test_read_exceeds_limit(self):
+        """Test reading past the limit raises StorageSizeLimitError"""
+        reader = SizeLimitedReader(io.BytesIO(b"abcdef"), max_bytes=5)
+
+        assert reader.read(4) == b"abcd"
+        with pytest.raises(StorageSizeLimitError):
+            reader.read(4)
+
+    def test_read_all_is_bounded(self):
+        """Test read() without size never reads far past the limit"""
+        source = io.BytesIO(b"x" * 1000)
+        reader = SizeLimitedReader(source, max_bytes=10)
+
+        with pytest.raises(StorageSizeLimitError):
+            reader.read()
+
+        assert source.tell() == 11
+
+
+class TestHashingReader:
+    """Tests for HashingReader wrapper"""
+
+    def test_hashes_what_is_read(self):
+        """Test the digest covers every chunk, however the stream is read"""
+        reader = HashingReader(SizeLimitedReader(io.BytesIO(b"abcdef"), max_bytes=6))
+
+        assert reader.read(4) + reader.read() == b"abcdef"
+        assert reader.read(4) == b""
+        assert reader.hexdigest() == hashlib.sha256(b"abcdef").hexdigest()
+
+
 class TestGetStorage:
     """Tests for get_storage factory function"""
 
@@ -402,6 +947,15 @@ class TestStorageBackend:
         with pytest.raises(NotImplementedError):
             backend.upload_file(b"data", "path")
 
+    def test_upload_fileobj_not_implemented(self):
+        """Test upload_fileobj raises NotImplementedError"""
+        from app.core.storage import StorageBackend
+
+        backend = StorageBackend()
+
+        with pytest.raises(NotImplementedError):
+            backend.upload_fileobj(io.BytesIO(b"data"), "path")
+
     def test_download_file_not_implemented(self):
         """Test download_file raises NotImplementedError"""
         from app.core.storage import StorageBackend
@@ -411,6 +965,24 @@ class TestStorageBackend:
         with pytest.raises(NotImplementedError):
             backend.download_file("path")
 
+    def test_download_fileobj_not_implemented(self):
+        """Test download_fileobj raises NotImplementedError"""
+        from app.core.storage import StorageBackend
+
+        backend = StorageBackend()
+
+        with pytest.raises(NotImplementedError):
+            backend.download_fileobj("path", io.BytesIO())
+
+    def test_iter_file_not_implemented(self):
+        """Test iter_file raises NotImplementedError"""
+        from app.core.storage import StorageBackend
+
+        backend = StorageBackend()
+
+        with pytest.raises(NotImplementedError):
+            list(backend.iter_file("path"))
+
     def test_delete_file_not_implemented(self):
         """Test delete_file raises NotImplementedError"""
         from app.core.storage import StorageBackend
@@ -0,0 +1,249 @@
+"""Tests for the transactional outbox"""
+
+import json
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.services.outbox import (
+    OutboxDispatcher,
+    OutboxRelay,
+    add_processing_message,
+    outbox_dispatcher,
+)
+
+
+@pytest.fixture
+def video(db):
+    """A user with one pending video"""
+    user = models.User(
+        first_name="Juan",
+        last_name="Pérez",
+        email="outbox@example.com",
+        password="SecurePass123!",
+        city="Medellín",
+        country="Colombia",
+    )
+    db.add(user)
+    db.commit()
+
+    video = models.Video(
+        user_id=user.id,
+        title="Outbox Video",
+        original_file_path="uploads/outbox.mp4",
+        processed_file_path="processed/outbox.mp4",
+        status="pending",
+    )
+    db.add(video)
+    db.commit()
+    db.refresh(video)
+    return video
+
+
+@pytest.fixture
+def session_factory(db):
+    """Independent sessions on the test database, like the relay uses in production"""
+    return sessionmaker(bind=db.get_bind())
+
+
+def _stage(db, video, count=1):
+    messages = [add_processing_message(db, video) for _ in range(count)]
+    db.commit()
+    return messages
+
+
+class TestAddProcessingMessage:
+    """Tests for add_processing_message"""
+
+    def test_message_is_part_of_caller_transaction(self, db, video):
+        """Test the row only exists once the caller commits"""
+        add_processing_message(db, video)
+        db.rollback()
+        assert db.query(models.OutboxMessage).count() == 0
+
+        message = _stage(db, video)[0]
+
+        assert message.video_id == video.id
+        assert message.attempts == 0
+        assert message.published_at is None
+        assert json.loads(message.payload) == {
+            "video_id": str(video.id),
+            "metadata": {"title": "Outbox Video", "user_id": str(video.user_id)},
+        }
+
+
+class TestOutboxRelay:
+    """Tests for OutboxRelay"""
+
+    def test_relay_once_publishes_due_rows(self, db, video, session_factory):
+        """Test due rows are sent in one batch and marked as published"""
+        messages = _stage(db, video, count=3)
+        queue = MagicMock()
+        queue.send_message_batch.side_effect = lambda entries: {
+            "successful": {entry["id"]: f"msg-{entry['id']}" for entry in entries},
+            "failed": {},
+        }
+
+        published = OutboxRelay(session_factory=session_factory, queue=queue).relay_once()
+
+        assert published == 3
+        queue.send_message_batch.assert_called_once()
+        entries = queue.send_message_batch.call_args.args[0]
+        assert {entry["video_id"] for entry in entries} == {str(video.id)}
+        assert [entry["body"] for entry in entries] == [m.payload for m in messages]
+        db.expire_all()
+        assert all(m.published_at is not None for m in db.query(models.OutboxMessage))
+
+    def test_relay_once_nothing_due(self, db, video, session_factory):
+        """Test published and backed-off rows are not sent again"""
+        published, backing_off = _stage(db, video, count=2)
+        published.published_at = datetime.utcnow()
+        backing_off.next_attempt_at = datetime.utcnow() + timedelta(minutes=5)
+        db.commit()
+        queue = MagicMock()
+
+        assert OutboxRelay(session_factory=session_factory, queue=queue).relay_once() == 0
+        queue.send_message_batch.assert_not_called()
+
+    def test_relay_once_respects_batch_size(self, db, video, session_factory):
+        """Test at most batch_size rows are sent per call"""
+        _stage(db, video, count=5)
+        queue = MagicMock()
+        queue.send_message_batch.side_effect = lambda entries: {
+            "successful": {entry["id"]: "m" for entry in entries},
+            "failed": {},
+        }
+        relay = OutboxRelay(session_factory=session_factory, queue=queue, batch_size=2)
+
+        assert relay.relay_once() == 2
+        assert relay.relay_once() == 2
+        assert relay.relay_once() == 1
+        assert relay.relay_once() == 0
+
+    def test_relay_once_failed_entries_back_off(self, db, video, session_factory):
+        """Test failed entries stay unpublished and are retried later"""
+        ok, failing = _stage(db, video, count=2)
+        queue = MagicMock()
+        queue.send_message_batch.return_value = {
+            "successful": {ok.id.hex: "m-1"},
+            "failed": {failing.id.hex: "InternalError: try again"},
+        }
+        before = datetime.utcnow()
+
+        published = OutboxRelay(session_factory=session_factory, queue=queue).relay_once()
+
+        assert published == 1
+        db.expire_all()
+        assert ok.published_at is not None
+        assert failing.published_at is None
+        assert failing.attempts == 1
+        assert failing.last_error == "InternalError: try again"
+        assert failing.next_attempt_at >= before + timedelta(seconds=2)
+
+    def test_relay_once_rolls_back_on_error(self, db, video, session_factory):
+        """Test unexpected errors leave the rows untouched"""
+        _stage(db, video)
+        queue = MagicMock()
+        queue.send_message_batch.side_effect = RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            OutboxRelay(session_factory=session_factory, queue=queue).relay_once()
+
+        db.expire_all()
+        message = db.query(models.OutboxMessage).one()
+        assert message.published_at is None
+        assert message.attempts == 0
+
+    def test_backoff_is_capped(self, monkeypatch):
+        """Test retry delay doubles per attempt up to OUTBOX_MAX_BACKOFF"""
+        monkeypatch.setattr("app.services.outbox.settings.OUTBOX_MAX_BACKOFF", 60)
+
+        assert [OutboxRelay._backoff(n) for n in (1, 2, 5, 6, 10)] == [2, 4, 32, 60, 60]
+
+    def test_start_and_stop(self, session_factory):
+        """Test the background thread starts polling and stops cleanly"""
+        relay = OutboxRelay(session_factory=session_factory, queue=MagicMock(), poll_interval=0.01)
+        relay.relay_once = MagicMock(return_value=0)
+
+        relay.start()
+        relay.stop(timeout=1)
+
+        assert relay._thread is None
+        relay.relay_once.assert_called()
+
+
+class TestOutboxDispatcher:
+    """Tests for OutboxDispatcher"""
+
+    def _producer(self, outcome):
+        """Producer stand-in whose futures resolve immediately"""
+        producer = MagicMock()
+
+        def submit(video_id, body=None, lane=None):
+            future = Future()
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+            return future
+
+        producer.submit.side_effect = submit
+        return producer
+
+    def test_dispatch_is_noop_until_started(self, db, video, session_factory):
+        """Test nothing is sent when the dispatcher is not running"""
+        dispatcher = OutboxDispatcher(session_factory=session_factory)
+        message = _stage(db, video)[0]
+
+        dispatcher.dispatch(message)
+
+        db.expire_all()
+        assert message.published_at is None
+
+    def test_dispatch_marks_row_published(self, db, video, session_factory):
+        """Test a row accepted by SQS is marked published"""
+        dispatcher = OutboxDispatcher(session_factory=session_factory)
+        producer = self._producer("msg-1")
+        dispatcher.start(producer)
+        message = _stage(db, video)[0]
+
+        dispatcher.dispatch(message)
+
+        producer.submit.assert_called_once_with(str(video.id), body=message.payload, lane=None)
+        db.expire_all()
+        assert message.published_at is not None
+
+    def test_dispatch_failure_left_for_relay(self, db, video, session_factory):
+        """Test a failed send keeps the row pending"""
+        dispatcher = OutboxDispatcher(session_factory=session_factory)
+        dispatcher.start(self._producer(RuntimeError("SQS down")))
+        message = _stage(db, video)[0]
+
+        dispatcher.dispatch(message)
+
+        db.expire_all()
+        assert message.published_at is None
+
+    def test_running_dispatcher_delays_relay(self, db, video, monkeypatch):
+        """Test rows dispatched eagerly are not due for the relay right away"""
+        monkeypatch.setattr(outbox_dispatcher, "_producer", MagicMock())
+        monkeypatch.setattr("app.services.outbox.settings.OUTBOX_DISPATCH_GRACE", 30)
+
+        message = _stage(db, video)[0]
+
+        assert message.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+
+    def test_close_flushes_producer(self):
+        """Test close() flushes the producer and stops dispatching"""
+        dispatcher = OutboxDispatcher()
+        producer = MagicMock()
+        dispatcher.start(producer)
+
+        dispatcher.close()
+
+        producer.close.assert_called_once()
+        assert not dispatcher.running
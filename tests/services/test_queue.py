@@ -8,7 +8,13 @@ from botocore.exceptions import ClientError
 from moto import mock_aws
 
 from app.core.config import settings
-from app.services.queue import SQSService
+from app.services.queue import (
+    LaneScheduler,
+    SQSBatchEntryError,
+    SQSBatchProducer,
+    SQSService,
+    parse_lane_weights,
+)
 
 
 @pytest.fixture
@@ -129,6 +135,363 @@ class TestSQSServiceSendMessage:
         assert body["metadata"] == {}
 
 
+class TestSQSServiceSendMessageBatch:
+    """Tests for send_message_batch method"""
+
+    def _entries(self, count):
+        return [
+            {
+                "id": f"entry-{i}",
+                "video_id": f"video-{i}",
+                "body": SQSService.build_message_body(f"video-{i}", {"n": i}),
+            }
+            for i in range(count)
+        ]
+
+    def test_send_message_batch_chunks_by_ten(self, sqs_service, sqs_queues, monkeypatch):
+        """Test entries are sent in SendMessageBatch calls of at most 10"""
+        calls = []
+        original = sqs_service.sqs.send_message_batch
+
+        def spy(**kwargs):
+            calls.append(len(kwargs["Entries"]))
+            return original(**kwargs)
+
+        monkeypatch.setattr(sqs_service.sqs, "send_message_batch", spy)
+
+        result = sqs_service.send_message_batch(self._entries(23))
+
+        assert calls == [10, 10, 3]
+        assert len(result["successful"]) == 23
+        assert result["failed"] == {}
+        attrs = sqs_service.get_queue_attributes()
+        assert int(attrs["ApproximateNumberOfMessages"]) == 23
+
+    def test_send_message_batch_body_and_attributes(self, sqs_service):
+        """Test batched messages look the same as single sends to the worker"""
+        sqs_service.send_message_batch(self._entries(1))
+
+        messages = sqs_service.receive_messages(max_messages=1, wait_time=1)
+
+        assert json.loads(messages[0]["Body"]) == {"video_id": "video-0", "metadata": {"n": 0}}
+        assert messages[0]["MessageAttributes"]["VideoId"]["StringValue"] == "video-0"
+
+    def test_send_message_batch_partial_failure(self, sqs_service, monkeypatch):
+        """Test per-entry failures reported by SQS are returned, not raised"""
+
+        def mock_send_batch(**kwargs):
+            return {
+                "Successful": [{"Id": "entry-0", "MessageId": "m-0"}],
+                "Failed": [{"Id": "entry-1", "Code": "InternalError", "Message": "try again"}],
+            }
+
+        monkeypatch.setattr(sqs_service.sqs, "send_message_batch", mock_send_batch)
+
+        result = sqs_service.send_message_batch(self._entries(2))
+
+        assert result["successful"] == {"entry-0": "m-0"}
+        assert result["failed"] == {"entry-1": "InternalError: try again"}
+
+    def test_send_message_batch_client_error(self, sqs_service, monkeypatch):
+        """Test a failed request marks all of its entries as failed"""
+
+        def mock_send_batch(**kwargs):
+            raise ClientError({"Error": {"Code": "ServiceUnavailable"}}, "SendMessageBatch")
+
+        monkeypatch.setattr(sqs_service.sqs, "send_message_batch", mock_send_batch)
+
+        result = sqs_service.send_message_batch(self._entries(3))
+
+        assert result["successful"] == {}
+        assert set(result["failed"]) == {"entry-0", "entry-1", "entry-2"}
+
+
+class TestSQSBatchProducer:
+    """Tests for SQSBatchProducer"""
+
+    def _spy_batches(self, sqs_service, monkeypatch):
+        calls = []
+        original = sqs_service.send_message_batch
+
+        def spy(entries):
+            calls.append(len(entries))
+            return original(entries)
+
+        monkeypatch.setattr(sqs_service, "send_message_batch", spy)
+        return calls
+
+    def test_full_batch_sent_without_waiting_for_linger(self, sqs_service, monkeypatch):
+        """Test 10 buffered messages are sent in a single call right away"""
+        calls = self._spy_batches(sqs_service, monkeypatch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=60_000)
+
+        futures = [producer.submit(f"video-{i}") for i in range(10)]
+        message_ids = [future.result(timeout=5) for future in futures]
+
+        assert calls == [10]
+        assert len(set(message_ids)) == 10
+        producer.close()
+
+    def test_partial_batch_sent_after_linger(self, sqs_service, monkeypatch):
+        """Test a lone message is sent once the linger period expires"""
+        calls = self._spy_batches(sqs_service, monkeypatch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=20)
+
+        future = producer.submit("video-1", {"title": "Test"})
+
+        assert future.result(timeout=5)
+        assert calls == [1]
+        messages = sqs_service.receive_messages(max_messages=1, wait_time=1)
+        assert json.loads(messages[0]["Body"]) == {
+            "video_id": "video-1",
+            "metadata": {"title": "Test"},
+        }
+        producer.close()
+
+    def test_concurrent_submitters_share_batches(self, sqs_service, monkeypatch):
+        """Test a burst from many threads costs about N / 10 API calls"""
+        import threading
+
+        calls = self._spy_batches(sqs_service, monkeypatch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=200)
+        futures = []
+        lock = threading.Lock()
+
+        def submit(i):
+            future = producer.submit(f"video-{i}")
+            with lock:
+                futures.append(future)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            future.result(timeout=5)
+
+        assert sum(calls) == 30
+        assert len(calls) <= 4
+        producer.close()
+
+    def test_partial_failure_reported_per_entry(self, sqs_service, monkeypatch):
+        """Test rejected entries fail their own future only"""
+
+        def mock_send_batch(entries):
+            return {
+                "successful": {entries[0]["id"]: "m-0"},
+                "failed": {entries[1]["id"]: "InternalError: try again"},
+            }
+
+        monkeypatch.setattr(sqs_service, "send_message_batch", mock_send_batch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=60_000)
+
+        ok = producer.submit("video-ok")
+        rejected = producer.submit("video-rejected")
+        producer.flush()
+
+        assert ok.result(timeout=1) == "m-0"
+        with pytest.raises(SQSBatchEntryError, match="video-rejected.*InternalError"):
+            rejected.result(timeout=1)
+        producer.close()
+
+    def test_request_error_fails_whole_batch(self, sqs_service, monkeypatch):
+        """Test an unexpected error fails every future of the batch"""
+
+        def mock_send_batch(entries):
+            raise RuntimeError("network down")
+
+        monkeypatch.setattr(sqs_service, "send_message_batch", mock_send_batch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=60_000)
+
+        futures = [producer.submit(f"video-{i}") for i in range(3)]
+        producer.flush()
+
+        for future in futures:
+            with pytest.raises(RuntimeError, match="network down"):
+                future.result(timeout=1)
+        producer.close()
+
+    def test_close_flushes_buffer(self, sqs_service, monkeypatch):
+        """Test close() sends buffered messages and rejects new ones"""
+        calls = self._spy_batches(sqs_service, monkeypatch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=60_000)
+        futures = [producer.submit(f"video-{i}") for i in range(12)]
+
+        producer.close()
+
+        assert all(future.done() and not future.exception() for future in futures)
+        assert sorted(calls) == [2, 10]
+        with pytest.raises(RuntimeError):
+            producer.submit("too-late")
+
+    def test_cancelled_entries_are_not_sent(self, sqs_service, monkeypatch):
+        """Test futures cancelled while buffered are dropped from the batch"""
+        calls = self._spy_batches(sqs_service, monkeypatch)
+        producer = SQSBatchProducer(sqs_service, linger_ms=60_000)
+        cancelled = producer.submit("video-cancelled")
+        kept = producer.submit("video-kept")
+
+        assert cancelled.cancel()
+        producer.close()
+
+        assert kept.result(timeout=1)
+        assert calls == [1]
+
+
+class TestLaneScheduler:
+    """Tests for lane weights and the weighted round robin"""
+
+    def test_parse_lane_weights(self):
+        """Test weights are read per lane, missing lanes default to 1"""
+        assert parse_lane_weights("priority=6, normal=3,bulk=1") == {
+            "priority": 6,
+            "normal": 3,
+            "bulk": 1,
+        }
+        assert parse_lane_weights("priority=4") == {"priority": 4, "normal": 1, "bulk": 1}
+
+    @pytest.mark.parametrize("value", ["urgent=2", "bulk=0", "normal=x"])
+    def test_parse_invalid_lane_weights(self, value):
+        """Test unknown lanes and non-positive weights are rejected"""
+        with pytest.raises(ValueError):
+            parse_lane_weights(value)
+
+    def test_busy_lanes_served_by_weight(self):
+        """Test every lane is served in proportion to its weight, interleaved"""
+        scheduler = LaneScheduler({"priority": 6, "normal": 3, "bulk": 1})
+        served = []
+        for _ in range(10):
+            lane = scheduler.order()[0]
+            scheduler.record(lane)
+            served.append(lane)
+
+        assert [served.count(lane) for lane in ("priority", "normal", "bulk")] == [6, 3, 1]
+        # Bulk isn't starved to the end of the round
+        assert served[:3] != ["priority"] * 3
+
+    def test_idle_lane_does_not_bank_credit(self):
+        """Test a lane that was empty for a while gets its normal share afterwards"""
+        scheduler = LaneScheduler({"priority": 1, "normal": 1})
+        for _ in range(20):
+            assert scheduler.order()[0] == "priority"
+            scheduler.record("normal", idle=["priority"])
+
+        served = []
+        for _ in range(4):
+            lane = scheduler.order()[0]
+            scheduler.record(lane)
+            served.append(lane)
+        assert served.count("normal") == 2
+
+
+class TestSQSServiceLanes:
+    """Tests for SQSService with priority and bulk queues"""
+
+    @pytest.fixture
+    def lanes(self, sqs_queues, monkeypatch):
+        sqs = sqs_queues["sqs_client"]
+        urls = {
+            "priority": sqs.create_queue(QueueName="test-priority")["QueueUrl"],
+            "normal": sqs_queues["main_queue_url"],
+            "bulk": sqs.create_queue(QueueName="test-bulk")["QueueUrl"],
+        }
+        monkeypatch.setattr(settings, "SQS_QUEUE_URL", urls["normal"])
+        monkeypatch.setattr(settings, "SQS_PRIORITY_QUEUE_URL", urls["priority"])
+        monkeypatch.setattr(settings, "SQS_BULK_QUEUE_URL", urls["bulk"])
+        monkeypatch.setattr(settings, "SQS_LANE_WEIGHTS", "priority=2,normal=1,bulk=1")
+        return urls
+
+    def _count(self, sqs_queues, url):
+        attrs = sqs_queues["sqs_client"].get_queue_attributes(
+            QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages"]
+        )
+        return int(attrs["Attributes"]["ApproximateNumberOfMessages"])
+
+    def test_messages_go_to_their_lane(self, sqs_queues, lanes):
+        """Test single and batched sends use the lane's queue"""
+        service = SQSService()
+
+        service.send_message("v1", lane="priority")
+        service.send_message_batch(
+            [
+                {"id": "a", "video_id": "v2", "body": "{}", "lane": "bulk"},
+                {"id": "b", "video_id": "v3", "body": "{}", "lane": None},
+                {"id": "c", "video_id": "v4", "body": "{}", "lane": "bulk"},
+            ]
+        )
+
+        counts = {lane: self._count(sqs_queues, url) for lane, url in lanes.items()}
+        assert counts == {"priority": 1, "normal": 1, "bulk": 2}
+
+    def test_missing_lane_queue_uses_normal(self, sqs_queues, lanes, monkeypatch):
+        """Test a lane without its own queue falls back to SQS_QUEUE_URL"""
+        monkeypatch.setattr(settings, "SQS_BULK_QUEUE_URL", "")
+        service = SQSService()
+
+        service.send_message("v1", lane="bulk")
+
+        assert set(service.scheduler.weights) == {"priority", "normal"}
+        assert self._count(sqs_queues, lanes["normal"]) == 1
+
+    def test_weighted_receive(self, sqs_queues, lanes):
+        """Test busy lanes are received from by weight and empty lanes are skipped"""
+        service = SQSService()
+        for i in range(4):
+            for lane in ("priority", "normal", "bulk"):
+                service.send_message(f"{lane}-{i}", lane=lane)
+
+        received = [
+            message["Lane"]
+            for _ in range(8)
+            for message in service.receive_messages(max_messages=1, wait_time=0)
+        ]
+
+        assert received.count("priority") == 4
+        assert received.count("normal") == 2 and received.count("bulk") == 2
+        # Priority drained: the other lanes take the remaining receives
+        rest = [m["Lane"] for m in service.receive_messages(max_messages=10, wait_time=0)]
+        assert rest and "priority" not in rest
+
+    def test_empty_lanes_probed_without_waiting(self, sqs_queues, lanes, monkeypatch):
+        """Test lanes are probed with WaitTimeSeconds=0; only an all-empty receive long-polls"""
+        service = SQSService()
+        receive = service.sqs.receive_message
+        waits = []
+
+        def recording_receive(**kwargs):
+            waits.append((kwargs["QueueUrl"], kwargs["WaitTimeSeconds"]))
+            return receive(**{**kwargs, "WaitTimeSeconds": 0})
+
+        monkeypatch.setattr(service.sqs, "receive_message", recording_receive)
+        service.send_message("v1", lane="bulk")
+
+        assert service.receive_messages(max_messages=1, wait_time=20)[0]["Lane"] == "bulk"
+        assert all(wait == 0 for _, wait in waits)
+
+        waits.clear()
+        assert service.receive_messages(max_messages=1, wait_time=20) == []
+        # Every lane probed once, then the heaviest one long-polled
+        assert [wait for _, wait in waits] == [0, 0, 0, 20]
+        assert waits[-1][0] == lanes["priority"]
+
+    def test_delete_and_extend_in_source_queue(self, sqs_queues, lanes):
+        """Test receipt handles are routed back to the queue they came from"""
+        service = SQSService()
+        service.send_message("v1", lane="bulk")
+        message = service.receive_messages(max_messages=1, wait_time=0)[0]
+
+        assert service.change_visibility_timeout_batch([message["ReceiptHandle"]], 60) == {}
+        assert service.delete_message(message["ReceiptHandle"]) is True
+        assert self._count(sqs_queues, lanes["bulk"]) == 0
+        assert (
+            sqs_queues["sqs_client"].get_queue_attributes(
+                QueueUrl=lanes["bulk"], AttributeNames=["ApproximateNumberOfMessagesNotVisible"]
+            )["Attributes"]["ApproximateNumberOfMessagesNotVisible"]
+            == "0"
+        )
+
+
 class TestSQSServiceReceiveMessages:
     """Tests for receive_messages method"""
 
@@ -239,6 +602,51 @@ class TestSQSServiceChangeVisibility:
         assert result is False
 
 
+class TestSQSServiceChangeVisibilityBatch:
+    """Tests for change_visibility_timeout_batch method"""
+
+    def test_change_visibility_batch_success(self, sqs_service):
+        """Test all in-flight messages are extended, 10 per call"""
+        sqs_service.send_message_batch(
+            [{"id": str(i), "video_id": str(i), "body": "{}"} for i in range(12)]
+        )
+        handles = []
+        while len(handles) < 12:
+            messages = sqs_service.receive_messages(max_messages=10, wait_time=1)
+            handles += [m["ReceiptHandle"] for m in messages]
+
+        failed = sqs_service.change_visibility_timeout_batch(handles, 600)
+
+        assert failed == {}
+
+    def test_change_visibility_batch_invalid_handle(self, sqs_service, monkeypatch):
+        """Test per-entry failures are returned with their error code"""
+
+        def mock_change_batch(**kwargs):
+            return {
+                "Successful": [{"Id": "0"}],
+                "Failed": [{"Id": "1", "Code": "ReceiptHandleIsInvalid", "SenderFault": True}],
+            }
+
+        monkeypatch.setattr(sqs_service.sqs, "change_message_visibility_batch", mock_change_batch)
+
+        failed = sqs_service.change_visibility_timeout_batch(["good", "bad"], 600)
+
+        assert failed == {"bad": "ReceiptHandleIsInvalid"}
+
+    def test_change_visibility_batch_client_error(self, sqs_service, monkeypatch):
+        """Test a failed request reports every handle of that request"""
+
+        def mock_change_batch(**kwargs):
+            raise ClientError({"Error": {"Code": "ServiceUnavailable"}}, "ChangeVisibilityBatch")
+
+        monkeypatch.setattr(sqs_service.sqs, "change_message_visibility_batch", mock_change_batch)
+
+        failed = sqs_service.change_visibility_timeout_batch(["a", "b"], 600)
+
+        assert failed == {"a": "ServiceUnavailable", "b": "ServiceUnavailable"}
+
+
 class TestSQSServiceQueueAttributes:
     """Tests for get_queue_attributes method"""
 
@@ -0,0 +1,101 @@
+"""Tests for the processed-output cache"""
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+
+from app.db import models
+from app.worker import cache
+from app.worker.transcoding import DEFAULT_SPEC, PreviewSpec, TranscodeSpec
+
+
+class TestPipelineVersion:
+    """Tests for pipeline_version"""
+
+    def test_stable(self):
+        """Test the same parameters always give the same version"""
+        assert cache.pipeline_version(TranscodeSpec(), "ffmpeg") == cache.pipeline_version(
+            TranscodeSpec(), "ffmpeg"
+        )
+
+    @pytest.mark.parametrize(
+        "changes",
+        [
+            {"max_duration": 20},
+            {"height": 1080},
+            {"watermark_text": "other"},
+            {"profile": "archival"},
+            {"renditions": (144,)},
+            {"previews": PreviewSpec(format="webp", sprite_interval=7)},
+        ],
+    )
+    def test_parameter_changes_version(self, changes):
+        """Test every processing parameter is part of the version"""
+        spec = replace(DEFAULT_SPEC, profile="balanced")
+
+        assert cache.pipeline_version(spec, "ffmpeg") != cache.pipeline_version(
+            replace(spec, **changes), "ffmpeg"
+        )
+
+    def test_profile_is_resolved(self):
+        """Test the default profile and its explicit name share entries"""
+        default = replace(DEFAULT_SPEC, profile=None)
+        with patch("app.worker.transcoding.settings") as mock_settings:
+            mock_settings.ENCODING_PROFILE = "fast"
+
+            assert cache.pipeline_version(default, "ffmpeg") == cache.pipeline_version(
+                replace(default, profile="fast"), "ffmpeg"
+            )
+
+    def test_engine_and_format_version(self):
+        """Test another engine or a bumped OUTPUT_FORMAT_VERSION misses"""
+        version = cache.pipeline_version(DEFAULT_SPEC, "ffmpeg")
+
+        assert cache.pipeline_version(DEFAULT_SPEC, "moviepy") != version
+        with patch.object(cache, "OUTPUT_FORMAT_VERSION", cache.OUTPUT_FORMAT_VERSION + 1):
+            assert cache.pipeline_version(DEFAULT_SPEC, "ffmpeg") != version
+
+
+class TestLookupAndStore:
+    """Tests for lookup and store against the database"""
+
+    def _outputs(self, path="processed/v.mp4"):
+        return {
+            "processed_file_path": path,
+            "renditions": None,
+            "hls_playlist_path": None,
+            "poster_path": "processed/v_poster.jpg",
+            "sprite": None,
+        }
+
+    @patch("app.worker.cache.storage")
+    def test_store_then_lookup(self, mock_storage, db):
+        """Test an entry is found only under its own source and version"""
+        mock_storage.file_exists.return_value = True
+        cache.store(db, "a" * 64, "v1", self._outputs())
+
+        entry = cache.lookup(db, "a" * 64, "v1")
+        assert entry.processed_file_path == "processed/v.mp4"
+        assert entry.poster_path == "processed/v_poster.jpg"
+        assert cache.lookup(db, "a" * 64, "v2") is None
+        assert cache.lookup(db, "b" * 64, "v1") is None
+
+    @patch("app.worker.cache.storage")
+    def test_first_entry_wins(self, mock_storage, db):
+        """Test a second store of the same key keeps the first entry and the session usable"""
+        mock_storage.file_exists.return_value = True
+        cache.store(db, "a" * 64, "v1", self._outputs())
+
+        cache.store(db, "a" * 64, "v1", self._outputs("processed/other.mp4"))
+
+        assert cache.lookup(db, "a" * 64, "v1").processed_file_path == "processed/v.mp4"
+        assert db.query(models.ProcessedOutput).count() == 1
+
+    @patch("app.worker.cache.storage")
+    def test_missing_output_is_dropped(self, mock_storage, db):
+        """Test an entry whose file is gone is removed and reported as a miss"""
+        mock_storage.file_exists.return_value = False
+        cache.store(db, "a" * 64, "v1", self._outputs())
+
+        assert cache.lookup(db, "a" * 64, "v1") is None
+        assert db.query(models.ProcessedOutput).count() == 0
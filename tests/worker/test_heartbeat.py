@@ -0,0 +1,141 @@
+"""Tests for the visibility-timeout heartbeat"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.core.config import settings
+from app.services.queue import SQSService
+from app.worker.heartbeat import VisibilityHeartbeat
+
+
+@pytest.fixture
+def sqs_service(monkeypatch):
+    """SQSService on a moto queue with a short visibility timeout"""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+
+    with mock_aws():
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        queue_url = sqs.create_queue(
+            QueueName="heartbeat-queue", Attributes={"VisibilityTimeout": "1"}
+        )["QueueUrl"]
+        monkeypatch.setattr(settings, "SQS_QUEUE_URL", queue_url)
+        monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+        yield SQSService()
+
+
+def _receive_one(sqs_service):
+    sqs_service.send_message("video-1")
+    return sqs_service.receive_messages(max_messages=1, wait_time=0)[0]
+
+
+class TestVisibilityHeartbeat:
+    """Tests for VisibilityHeartbeat"""
+
+    def test_beat_keeps_message_invisible(self, sqs_service):
+        """Test a tracked message outlives the queue's visibility timeout"""
+        message = _receive_one(sqs_service)
+        heartbeat = VisibilityHeartbeat(sqs_service, interval=0.2, extension=30)
+        heartbeat.track(message["ReceiptHandle"])
+
+        assert heartbeat.beat() == 1
+        time.sleep(1.5)
+
+        assert sqs_service.receive_messages(max_messages=1, wait_time=0) == []
+
+    def test_untracked_message_is_redelivered(self, sqs_service):
+        """Test a message stops being extended once untracked"""
+        message = _receive_one(sqs_service)
+        heartbeat = VisibilityHeartbeat(sqs_service, interval=0.2, extension=30)
+
+        with heartbeat.keep_alive(message["ReceiptHandle"]):
+            assert heartbeat.tracked == 1
+        time.sleep(1.5)
+
+        assert heartbeat.beat() == 0
+        assert len(sqs_service.receive_messages(max_messages=1, wait_time=0)) == 1
+
+    def test_background_thread_extends_visibility(self, sqs_service):
+        """Test the running heartbeat extends messages without explicit beats"""
+        message = _receive_one(sqs_service)
+        heartbeat = VisibilityHeartbeat(sqs_service, interval=0.3, extension=1)
+        heartbeat.track(message["ReceiptHandle"])
+
+        heartbeat.start()
+        try:
+            time.sleep(2.5)
+            assert sqs_service.receive_messages(max_messages=1, wait_time=0) == []
+        finally:
+            heartbeat.stop()
+
+    def test_permanent_errors_drop_message(self):
+        """Test handles SQS no longer accepts are dropped, transient errors are kept"""
+        queue = MagicMock()
+        queue.change_visibility_timeout_batch.return_value = {
+            "gone": "ReceiptHandleIsInvalid",
+            "flaky": "ServiceUnavailable",
+        }
+        heartbeat = VisibilityHeartbeat(queue, interval=1, extension=30)
+        for handle in ("ok", "gone", "flaky"):
+            heartbeat.track(handle)
+
+        assert heartbeat.beat() == 1
+        assert heartbeat.tracked == 2
+        queue.change_visibility_timeout_batch.assert_called_once_with(["ok", "gone", "flaky"], 30)
+
+    @patch("app.worker.heartbeat.renew_leases")
+    def test_beat_renews_video_leases(self, mock_renew):
+        """Test leases are renewed with their messages, except those SQS refused"""
+        queue = MagicMock()
+        queue.change_visibility_timeout_batch.return_value = {"gone": "ReceiptHandleIsInvalid"}
+        heartbeat = VisibilityHeartbeat(queue, interval=1, extension=30, owner="worker-1")
+        heartbeat.track("ok", "video-1")
+        heartbeat.track("gone", "video-2")
+        heartbeat.track("no-lease")
+
+        heartbeat.beat()
+
+        mock_renew.assert_called_once_with(["video-1"], "worker-1")
+        heartbeat.untrack("ok")
+        heartbeat.beat()
+        assert mock_renew.call_count == 1
+
+    def test_max_age_stops_extending(self):
+        """Test hung transcodes are eventually released back to the queue"""
+        queue = MagicMock()
+        queue.change_visibility_timeout_batch.return_value = {}
+        heartbeat = VisibilityHeartbeat(queue, interval=1, extension=30, max_age=0.1)
+        heartbeat.track("hung")
+
+        time.sleep(0.2)
+
+        assert heartbeat.beat() == 0
+        assert heartbeat.tracked == 0
+        queue.change_visibility_timeout_batch.assert_not_called()
+
+    def test_beat_errors_do_not_stop_thread(self):
+        """Test the background loop survives a failing beat"""
+        queue = MagicMock()
+        calls = []
+
+        def change_batch(handles, timeout):
+            calls.append(handles)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return {}
+
+        queue.change_visibility_timeout_batch.side_effect = change_batch
+        heartbeat = VisibilityHeartbeat(queue, interval=0.05, extension=30)
+        heartbeat.track("a")
+
+        heartbeat.start()
+        time.sleep(0.3)
+        heartbeat.stop()
+
+        assert len(calls) >= 2
@@ -0,0 +1,95 @@
+"""Tests for video processing leases"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import models
+from app.worker.lease import claim_video, finish_video, renew_leases
+
+
+@pytest.fixture
+def video(db):
+    user = models.User(
+        first_name="Lease",
+        last_name="User",
+        email="lease@example.com",
+        password="password",
+        city="City",
+        country="Country",
+    )
+    db.add(user)
+    db.commit()
+    video = models.Video(
+        user_id=user.id,
+        title="Clip",
+        original_file_path="uploads/a.mp4",
+        processed_file_path="processed/a.mp4",
+        status="pending",
+    )
+    db.add(video)
+    db.commit()
+    return video
+
+
+class TestClaimVideo:
+    """Tests for claim_video"""
+
+    def test_only_one_claim_wins(self, db, video):
+        """Test a duplicate delivery can't claim a video another worker holds"""
+        assert claim_video(db, video.id, owner="worker-1") is True
+        assert claim_video(db, video.id, owner="worker-2") is False
+
+        db.refresh(video)
+        assert (video.status, video.lease_owner) == ("processing", "worker-1")
+        assert video.lease_expires_at > datetime.utcnow()
+
+    def test_expired_lease_is_reclaimed(self, db, video):
+        """Test the video of a crashed worker is taken over once its lease expires"""
+        claim_video(db, video.id, owner="worker-1")
+        video.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+        assert claim_video(db, video.id, owner="worker-2") is True
+        db.refresh(video)
+        assert video.lease_owner == "worker-2"
+
+    def test_released_video_is_reclaimed(self, db, video):
+        """Test a failed video can be retried right away"""
+        claim_video(db, video.id, owner="worker-1")
+        finish_video(db, video.id, "worker-1", "failed")
+
+        assert claim_video(db, video.id, owner="worker-2") is True
+
+    def test_processed_video_is_not_claimed(self, db, video):
+        """Test a redelivery after success doesn't process the video again"""
+        video.status = "processed"
+        db.commit()
+
+        assert claim_video(db, video.id, owner="worker-1") is False
+
+
+def test_finish_video_only_own(db, video):
+    """Test a worker whose lease was taken over can't overwrite the new owner's video"""
+    claim_video(db, video.id, owner="worker-1")
+
+    assert finish_video(db, video.id, "worker-2", "failed") is False
+    db.refresh(video)
+    assert (video.status, video.lease_owner) == ("processing", "worker-1")
+
+    assert finish_video(db, video.id, "worker-1", "processed", is_published=True) is True
+    db.refresh(video)
+    assert (video.status, video.is_published) == ("processed", True)
+    assert (video.lease_owner, video.lease_expires_at) == (None, None)
+
+
+def test_renew_leases_only_own(db, video):
+    """Test a worker only extends the leases it holds"""
+    claim_video(db, video.id, owner="worker-1")
+    expires_at = datetime.utcnow() + timedelta(seconds=5)
+    video.lease_expires_at = expires_at
+    db.commit()
+
+    assert renew_leases([video.id], owner="worker-2") == 0
+    assert renew_leases([video.id], owner="worker-1") == 1
+    db.refresh(video)
+    assert video.lease_expires_at > expires_at
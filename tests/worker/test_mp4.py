@@ -0,0 +1,174 @@
+"""Tests for the MP4 box reader and ranged source fetches"""
+
+import os
+import struct
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from app.core.storage import LocalStorage
+from app.worker.mp4 import MP4Error, find_top_level_boxes, parse_box_header, prefix_length
+from app.worker.source import fetch_source
+from app.worker.transcoding import FFmpegEngine, TranscodeSpec, find_ffmpeg
+
+FFMPEG = find_ffmpeg()
+requires_ffmpeg = pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not available")
+
+
+def _make_video(path, faststart):
+    """A 12 second clip with audio, moov first or last"""
+    command = [
+        FFMPEG,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        "testsrc=size=320x240:rate=10:duration=12",
+        "-f",
+        "lavfi",
+        "-i",
+        "sine=duration=12",
+        "-c:v",
+        "libx264",
+        "-c:a",
+        "aac",
+        "-shortest",
+    ]
+    if faststart:
+        command += ["-movflags", "+faststart"]
+    subprocess.run(command + [str(path)], check=True)
+    return str(path)
+
+
+def _read(path):
+    def read(offset, length):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    return read
+
+
+def _moov(path):
+    size = os.path.getsize(path)
+    moov = find_top_level_boxes(_read(path), size)[-1]
+    return moov, _read(path)(moov.offset, moov.size)
+
+
+class TestBoxHeaders:
+    """Tests for box header parsing"""
+
+    def test_parse_64bit_size(self):
+        """Test a size of 1 reads the 64-bit largesize field"""
+        data = struct.pack(">I4sQ", 1, b"mdat", 1 << 33)
+
+        box = parse_box_header(data, 0)
+
+        assert (box.type, box.size, box.header_size) == (b"mdat", 1 << 33, 16)
+
+    def test_parse_size_zero_extends_to_limit(self):
+        """Test a size of 0 means 'to the end of the file'"""
+        box = parse_box_header(struct.pack(">I4s", 0, b"mdat"), 100, base=100, limit=500)
+
+        assert box.end == 500
+
+    def test_truncated_header(self):
+        """Test short buffers are reported as MP4Error"""
+        with pytest.raises(MP4Error):
+            parse_box_header(b"\x00\x00", 0)
+
+    def test_not_an_mp4(self):
+        """Test a file without moov is rejected"""
+        data = struct.pack(">I4s", 16, b"free") + b"\x00" * 8
+
+        with pytest.raises(MP4Error, match="No moov"):
+            find_top_level_boxes(lambda o, n: data[o : o + n], len(data))
+
+    def test_fragmented_mp4_rejected(self):
+        """Test fragmented files are rejected before moov"""
+        data = struct.pack(">I4s", 8, b"moof")
+
+        with pytest.raises(MP4Error, match="Fragmented"):
+            find_top_level_boxes(lambda o, n: data[o : o + n], len(data))
+
+
+@requires_ffmpeg
+class TestPrefixLength:
+    """Tests for prefix_length on real files"""
+
+    @pytest.mark.parametrize("faststart", [True, False])
+    def test_prefix_grows_with_duration(self, tmp_path, faststart):
+        """Test fewer seconds need fewer bytes, and the whole clip needs the whole mdat"""
+        path = _make_video(tmp_path / "clip.mp4", faststart)
+        moov, moov_data = _moov(path)
+
+        short = prefix_length(moov_data, moov, 3)
+        full = prefix_length(moov_data, moov, 60)
+
+        assert 0 < short < full <= os.path.getsize(path)
+        assert short < os.path.getsize(path) / 2
+
+    def test_malformed_tables(self, tmp_path):
+        """Test a truncated moov is an MP4Error, not a struct error"""
+        path = _make_video(tmp_path / "clip.mp4", faststart=True)
+        moov, moov_data = _moov(path)
+
+        with pytest.raises(MP4Error):
+            prefix_length(moov_data[: moov.size // 2], moov, 3)
+
+
+class TestFetchSource:
+    """Tests for fetch_source"""
+
+    @pytest.fixture
+    def local_storage(self):
+        storage = LocalStorage()
+        # The worker must never buffer a whole object in memory
+        storage.download_file = None
+        with patch("app.worker.source.storage", storage):
+            yield storage
+
+    @requires_ffmpeg
+    @pytest.mark.parametrize("faststart", [True, False])
+    def test_partial_fetch_transcodes(self, tmp_path, local_storage, faststart):
+        """Test only part of the file is read and the trimmed transcode still works"""
+        source = _make_video(tmp_path / "clip.mp4", faststart)
+        dest = str(tmp_path / "fetched.mp4")
+
+        fetch = fetch_source(source, dest, 3)
+
+        assert fetch.partial
+        assert fetch.bytes_read < fetch.file_size / 2
+        assert os.path.getsize(dest) == fetch.file_size
+
+        output = str(tmp_path / "out.mp4")
+        FFmpegEngine().transcode(dest, output, TranscodeSpec(max_duration=3))
+        result = subprocess.run([FFMPEG, "-hide_banner", "-i", output], capture_output=True)
+        assert b"Duration: 00:00:03" in result.stderr
+
+    def test_falls_back_to_full_download(self, tmp_path, local_storage):
+        """Test non-MP4 sources are downloaded whole"""
+        source = tmp_path / "clip.webm"
+        source.write_bytes(b"\x1a\x45\xdf\xa3" + b"\x00" * 100)
+        dest = str(tmp_path / "fetched.webm")
+
+        fetch = fetch_source(str(source), dest, 3)
+
+        assert not fetch.partial
+        assert fetch.bytes_read == fetch.file_size == 104
+        assert open(dest, "rb").read() == source.read_bytes()
+
+    @patch("app.worker.source.settings")
+    def test_range_reads_disabled(self, mock_settings, tmp_path, local_storage):
+        """Test SOURCE_RANGE_READS=False always downloads the whole file"""
+        mock_settings.SOURCE_RANGE_READS = False
+        source = tmp_path / "clip.mp4"
+        source.write_bytes(b"x" * 50)
+
+        fetch = fetch_source(str(source), str(tmp_path / "fetched.mp4"), 3)
+
+        assert not fetch.partial and fetch.bytes_read == 50
@@ -0,0 +1,147 @@
+"""Tests for HLS packaging"""
+
+import os
+import subprocess
+from dataclasses import replace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.worker import transcoding
+from app.worker.packaging import MASTER_PLAYLIST, Variant, hls_directory, package_hls
+from app.worker.transcoding import (
+    DEFAULT_SPEC,
+    FFmpegEngine,
+    TranscodeError,
+    TranscodeSpec,
+    find_ffmpeg,
+    rendition_path,
+)
+from app.worker.videos import _package_hls, _upload_outputs
+from app.worker.watermark import WatermarkCache
+
+FFMPEG = find_ffmpeg()
+requires_ffmpeg = pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not available")
+
+
+@pytest.fixture
+def ladder(tmp_path):
+    """A 6 second 640x480 output plus a 240p rendition, keyframes every second"""
+    source = tmp_path / "source.mp4"
+    command = [FFMPEG, "-hide_banner", "-loglevel", "error", "-y"]
+    command += ["-f", "lavfi", "-i", "testsrc=size=640x480:rate=10:duration=6"]
+    command += ["-f", "lavfi", "-i", "sine=duration=6", "-c:v", "libx264", "-shortest"]
+    subprocess.run(command + [str(source)], check=True)
+
+    output = str(tmp_path / "out.mp4")
+    spec = TranscodeSpec(height=480, renditions=(240,), keyframe_interval=1)
+    with patch.object(
+        transcoding, "watermark_cache", WatermarkCache(str(tmp_path / "wm"), storage_prefix="")
+    ):
+        FFmpegEngine().transcode(str(source), output, spec)
+    return output
+
+
+def test_hls_directory():
+    """Test the package sits next to the MP4, for files and storage keys"""
+    assert hls_directory("processed/abc.mp4") == "processed/abc_hls"
+
+
+def test_keyframe_interval_forces_keyframes():
+    """Test the encoder is told to place keyframes on segment boundaries"""
+    command = FFmpegEngine(binary="ffmpeg").build_command(
+        "in.mp4", "out.mp4", None, TranscodeSpec(keyframe_interval=4)
+    )
+
+    assert command[command.index("-force_key_frames") + 1] == "expr:gte(t,n_forced*4)"
+
+
+@requires_ffmpeg
+class TestPackageHLS:
+    """Tests for package_hls on real files"""
+
+    def test_master_playlist_lists_every_variant(self, ladder, tmp_path):
+        """Test one media playlist per variant and a master playlist with measured bitrates"""
+        package = str(tmp_path / "out_hls")
+        variants = [
+            Variant(ladder, 480, 640),
+            Variant(rendition_path(ladder, 240), 240, 320),
+        ]
+
+        master = package_hls(variants, package, segment_seconds=2)
+
+        assert master == os.path.join(package, MASTER_PLAYLIST)
+        lines = open(master).read().splitlines()
+        assert lines[0] == "#EXTM3U"
+        assert lines[3] == "480p.m3u8" and lines[5] == "240p.m3u8"
+        assert "RESOLUTION=640x480" in lines[2] and "RESOLUTION=320x240" in lines[4]
+        peak = int(lines[2].split("BANDWIDTH=")[1].split(",")[0])
+        average = int(lines[2].split("AVERAGE-BANDWIDTH=")[1].split(",")[0])
+        assert peak >= average > 0
+
+        media = open(os.path.join(package, "480p.m3u8")).read()
+        assert "#EXT-X-PLAYLIST-TYPE:VOD" in media
+        # Forced keyframes let the 6 s clip be cut into 2 s segments
+        segments = [line for line in media.splitlines() if line.endswith(".ts")]
+        assert segments == ["480p_000.ts", "480p_001.ts", "480p_002.ts"]
+
+    def test_unreadable_variant(self, tmp_path):
+        """Test ffmpeg failures are reported as TranscodeError"""
+        broken = tmp_path / "broken.mp4"
+        broken.write_bytes(b"not a video")
+
+        with pytest.raises(TranscodeError, match="240p"):
+            package_hls([Variant(str(broken), 240)], str(tmp_path / "hls"))
+
+
+class TestPackagingStage:
+    """Tests for the worker's optional packaging step"""
+
+    @patch("app.worker.videos.package_hls")
+    @patch("app.worker.videos.settings")
+    def test_disabled(self, mock_settings, mock_package):
+        """Test HLS_PACKAGING=False leaves the video without a playlist"""
+        mock_settings.HLS_PACKAGING = False
+
+        assert _package_hls("out.mp4", "processed/a.mp4") is None
+        mock_package.assert_not_called()
+
+    @patch("app.worker.videos.package_hls")
+    @patch("app.worker.videos.settings")
+    def test_returns_storage_path(self, mock_settings, mock_package, tmp_path):
+        """Test the master playlist is recorded under the processed file's storage path"""
+        mock_settings.HLS_PACKAGING = True
+        output = tmp_path / "out.mp4"
+        output.write_bytes(b"x")
+
+        assert _package_hls(str(output), "processed/a.mp4") == "processed/a_hls/master.m3u8"
+        variants, directory = mock_package.call_args.args
+        assert [v.path for v in variants] == [str(output)]
+        assert directory == str(tmp_path / "out_hls")
+
+    @patch("app.worker.videos.package_hls", side_effect=TranscodeError("boom"))
+    @patch("app.worker.videos.settings")
+    def test_failure_is_not_fatal(self, mock_settings, mock_package, tmp_path):
+        """Test a packaging failure only drops the playlist"""
+        mock_settings.HLS_PACKAGING = True
+        (tmp_path / "out.mp4").write_bytes(b"x")
+
+        assert _package_hls(str(tmp_path / "out.mp4"), "processed/a.mp4") is None
+
+    @patch("app.worker.videos.DEFAULT_SPEC", replace(DEFAULT_SPEC, renditions=()))
+    @patch("app.worker.videos.storage")
+    def test_upload_package_segments_first(self, mock_storage, tmp_path):
+        """Test playlists are uploaded after the segments they reference"""
+        mock_storage.upload_fileobj = Mock()
+        (tmp_path / "out.mp4").write_bytes(b"x")
+        package = tmp_path / "out_hls"
+        package.mkdir()
+        for name in ("master.m3u8", "720p.m3u8", "720p_000.ts", "720p_001.ts"):
+            (package / name).write_bytes(b"x")
+
+        _upload_outputs(str(tmp_path / "out.mp4"), "processed/a.mp4")
+
+        keys = [c.args[1] for c in mock_storage.upload_fileobj.call_args_list]
+        assert keys[0] == "processed/a.mp4"
+        assert keys[1:3] == ["processed/a_hls/720p_000.ts", "processed/a_hls/720p_001.ts"]
+        assert set(keys[3:]) == {"processed/a_hls/720p.m3u8", "processed/a_hls/master.m3u8"}
@@ -0,0 +1,367 @@
+"""Tests for the pipelined worker and the video pipeline stages"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from app.worker import pipeline
+from app.worker.lease import VideoLeased
+from app.worker.scratch import ScratchSpace
+from app.worker.videos import VideoJob, fetch_video, publish_video
+
+
+def _message(video_id):
+    return {"Body": json.dumps({"video_id": video_id}), "ReceiptHandle": f"receipt-{video_id}"}
+
+
+def _video_job(video_id, scratch_dir, owner, profile=None):
+    return VideoJob(video_id, "in.mp4", "out.mp4", f"processed/{video_id}.mp4", profile)
+
+
+@pytest.fixture
+def mock_sqs_service():
+    # _parse_message/_finish_message use sqs_worker's reference, poll uses pipeline's
+    with patch("app.worker.pipeline.sqs_service") as mock, patch(
+        "app.worker.sqs_worker.sqs_service", mock
+    ):
+        mock.receive_messages.return_value = []
+        yield mock
+
+
+@pytest.fixture
+def stages():
+    """Pipeline stage functions replaced by mocks that succeed immediately"""
+    with patch("app.worker.pipeline.fetch_video", side_effect=_video_job) as fetch, patch(
+        "app.worker.pipeline.transcode_video", side_effect=lambda job: job
+    ) as transcode, patch("app.worker.pipeline.publish_video") as publish, patch(
+        "app.worker.pipeline.mark_video_failed"
+    ) as mark_failed:
+        yield Mock(fetch=fetch, transcode=transcode, publish=publish, mark_failed=mark_failed)
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    return ScratchSpace(str(tmp_path / "scratch"), job_bytes=1, reserve=0, quota=0)
+
+
+@pytest.fixture
+def worker(scratch):
+    """PipelinedWorker backed by threads instead of processes"""
+    worker = pipeline.PipelinedWorker(
+        concurrency=1,
+        fetch_threads=1,
+        publish_threads=1,
+        queue_size=1,
+        executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+        heartbeat=MagicMock(),
+        scratch=scratch,
+    )
+    worker.start()
+    yield worker
+    worker.shutdown()
+
+
+def _drain(worker):
+    with worker._changed:
+        assert worker._changed.wait_for(lambda: not worker.running_jobs, timeout=5)
+
+
+class TestPipelinedWorker:
+    """Tests for PipelinedWorker"""
+
+    def test_video_goes_through_all_stages(self, mock_sqs_service, stages, worker, scratch):
+        """Test a message is fetched, transcoded, published and then deleted"""
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+
+        assert worker.poll() == 1
+        _drain(worker)
+
+        stages.fetch.assert_called_once()
+        assert stages.fetch.call_args.args[0] == "a"
+        # Claimed with the owner ID whose leases the heartbeat renews
+        assert stages.fetch.call_args.args[2] is worker.heartbeat.owner
+        stages.publish.assert_called_once()
+        assert stages.publish.call_args.args[0].processed_file_path == "processed/a.mp4"
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-a")
+        worker.heartbeat.track.assert_called_once_with("receipt-a", "a")
+        worker.heartbeat.untrack.assert_called_once_with("receipt-a")
+        assert worker.messages_processed == 1
+        # The job's scratch directory is gone once it is published
+        assert os.listdir(scratch.root) == []
+
+    def test_next_video_fetched_while_current_encodes(self, mock_sqs_service, stages, worker):
+        """Test downloads overlap with the running transcode"""
+        encoding = threading.Event()
+        release = threading.Event()
+        fetched = []
+
+        def fetch(video_id, scratch_dir, owner, profile=None):
+            fetched.append(video_id)
+            return _video_job(video_id, scratch_dir, owner)
+
+        def transcode(job):
+            encoding.set()
+            release.wait(5)
+            return job
+
+        stages.fetch.side_effect = fetch
+        stages.transcode.side_effect = transcode
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+        worker.poll()
+        assert encoding.wait(5)
+
+        mock_sqs_service.receive_messages.return_value = [_message("b")]
+        worker.poll()
+        with worker._changed:
+            worker._changed.wait_for(lambda: worker._fetching == 0, timeout=5)
+
+        # b is downloaded and waiting while a is still encoding
+        assert fetched == ["a", "b"]
+        stages.publish.assert_not_called()
+
+        release.set()
+        _drain(worker)
+        assert stages.publish.call_count == 2
+
+    def test_receives_only_what_fetch_stage_can_take(self, mock_sqs_service, stages, worker):
+        """Test a stalled pipeline stops receiving instead of blocking on a full queue"""
+        release = threading.Event()
+        stages.transcode.side_effect = lambda job: release.wait(5) and job
+        mock_sqs_service.receive_messages.side_effect = lambda max_messages, wait_time: [
+            _message(f"v{i}-{max_messages}") for i in range(max_messages)
+        ]
+
+        # One fetch thread + a queue of one
+        assert worker.poll() == 2
+        # One video encoding, the other downloaded and queued for the transcode stage
+        with worker._changed:
+            assert worker._changed.wait_for(lambda: worker._fetching == 0, timeout=5)
+        # Two more: one fetched and blocked on the full transcode queue, one queued
+        assert worker.poll() == 2
+        assert worker.free_slots == 0
+        assert worker.poll() == 0
+
+        release.set()
+        _drain(worker)
+        assert worker.messages_processed == 4
+
+    def test_failed_stage_leaves_message_for_retry(self, mock_sqs_service, stages, worker, scratch):
+        """Test a failing job is marked failed, cleaned up and not deleted"""
+        stages.transcode.side_effect = RuntimeError("ffmpeg crashed")
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+
+        worker.poll()
+        _drain(worker)
+
+        stages.mark_failed.assert_called_once_with("a", worker.heartbeat.owner)
+        stages.publish.assert_not_called()
+        mock_sqs_service.delete_message.assert_not_called()
+        worker.heartbeat.untrack.assert_called_once_with("receipt-a")
+        assert os.listdir(scratch.root) == []
+        assert worker.stats()["transcode"]["failures"] == 1
+
+    def test_fetch_failure_frees_fetch_slot(self, mock_sqs_service, stages, worker):
+        """Test a missing video doesn't leak a fetch slot"""
+        stages.fetch.side_effect = LookupError("Video not found")
+        mock_sqs_service.receive_messages.return_value = [_message("gone")]
+
+        worker.poll()
+        _drain(worker)
+
+        assert worker.free_slots == 2
+        stages.transcode.assert_not_called()
+
+    def test_reused_output_skips_later_stages(self, mock_sqs_service, stages, worker):
+        """Test a video finished by the fetch stage is deleted without a transcode"""
+        stages.fetch.side_effect = None
+        stages.fetch.return_value = None
+        mock_sqs_service.receive_messages.return_value = [_message("dup")]
+
+        worker.poll()
+        _drain(worker)
+
+        stages.transcode.assert_not_called()
+        stages.publish.assert_not_called()
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-dup")
+        assert worker.free_slots == 2
+
+    def test_leased_video_skipped(self, mock_sqs_service, stages, worker):
+        """Test a duplicate of a video another worker holds is deleted without failing it"""
+        stages.fetch.side_effect = VideoLeased("Video dup is leased by another worker")
+        mock_sqs_service.receive_messages.return_value = [_message("dup")]
+
+        worker.poll()
+        _drain(worker)
+
+        stages.transcode.assert_not_called()
+        stages.mark_failed.assert_not_called()
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-dup")
+        worker.heartbeat.untrack.assert_called_once_with("receipt-dup")
+        assert worker.free_slots == 2
+
+    def test_lease_lost_before_publish(self, mock_sqs_service, stages, worker):
+        """Test a video taken over by another worker isn't marked failed by this one"""
+        stages.publish.side_effect = VideoLeased("Video a is leased by another worker")
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+
+        worker.poll()
+        _drain(worker)
+
+        stages.publish.assert_called_once()
+        assert stages.publish.call_args.args[1] == worker.heartbeat.owner
+        stages.mark_failed.assert_not_called()
+        assert worker.stats()["publish"]["failures"] == 0
+
+    def test_stats_per_stage(self, mock_sqs_service, stages, worker):
+        """Test every stage reports its own job count and throughput"""
+        mock_sqs_service.receive_messages.return_value = [_message("a"), _message("b")]
+
+        worker.poll()
+        _drain(worker)
+        stats = worker.stats()
+
+        assert set(stats) == {"fetch", "transcode", "publish"}
+        for report in stats.values():
+            assert report["jobs"] == 2 and report["failures"] == 0
+            assert report["jobs_per_minute"] > 0
+            assert 0 <= report["utilization"] <= 1
+
+    def test_shutdown_finishes_pipeline(self, mock_sqs_service, stages, scratch):
+        """Test shutdown waits for queued videos to be published"""
+        release = threading.Event()
+        stages.transcode.side_effect = lambda job: release.wait(5) and job
+        mock_sqs_service.receive_messages.return_value = [_message("a"), _message("b")]
+        worker = pipeline.PipelinedWorker(
+            concurrency=1,
+            fetch_threads=1,
+            publish_threads=1,
+            queue_size=1,
+            executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+            heartbeat=MagicMock(),
+            scratch=scratch,
+        )
+        worker.start()
+        worker.poll()
+        threads = list(worker._threads)
+        threading.Timer(0.2, release.set).start()
+
+        worker.shutdown()
+
+        assert worker.messages_processed == 2
+        assert not any(thread.is_alive() for thread in threads)
+        worker.heartbeat.stop.assert_called_once()
+
+    @patch("app.worker.pipeline.time.sleep")
+    def test_run_once_waits_when_scratch_full(self, mock_sleep, mock_sqs_service, worker, scratch):
+        """Test a full scratch space pauses receiving"""
+        scratch.capacity = MagicMock(return_value=0)
+
+        worker.run_once()
+
+        mock_sqs_service.receive_messages.assert_not_called()
+        mock_sleep.assert_called_once_with(worker.DISK_WAIT_TIME)
+
+
+class TestPipelineStages:
+    """Tests for the fetch/publish stage functions"""
+
+    @patch("app.worker.videos.claim_video", return_value=True)
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_fetch_video(self, mock_session_local, mock_setup, mock_claim):
+        """Test fetch claims the video and returns its paths"""
+        video = Mock(processed_file_path="processed/a.mp4", source_sha256=None)
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = video
+        mock_setup.return_value = ("/s/original.mp4", "/s/processed.mp4", None, None)
+
+        job = fetch_video("a", "/s", "worker-1", "fast")
+
+        mock_claim.assert_called_once_with(db, "a", "worker-1")
+        assert job == VideoJob(
+            "a", "/s/original.mp4", "/s/processed.mp4", "processed/a.mp4", "fast"
+        )
+        db.close.assert_called_once()
+
+    @patch("app.worker.videos._reuse_cached_output", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_fetch_reused_video(self, mock_session_local, mock_setup, _):
+        """Test a video served from the output cache has nothing to fetch"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock()
+
+        assert fetch_video("a", "/s", "worker-1") is None
+        mock_setup.assert_not_called()
+
+    @patch("app.worker.videos.claim_video", return_value=False)
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_fetch_video_claimed_elsewhere(self, mock_session_local, mock_setup, _):
+        """Test a duplicate delivery of a video another worker holds is refused"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock(status="processing")
+
+        with pytest.raises(VideoLeased):
+            fetch_video("a", "/s", "worker-1")
+        mock_setup.assert_not_called()
+
+    @patch("app.worker.videos.claim_video", return_value=False)
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_fetch_video_already_processed(self, mock_session_local, mock_setup, _):
+        """Test a duplicate delivery of a processed video has nothing to fetch"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock(status="processed")
+
+        assert fetch_video("a", "/s", "worker-1") is None
+        mock_setup.assert_not_called()
+
+    @patch("app.worker.videos.SessionLocal")
+    def test_fetch_missing_video(self, mock_session_local):
+        """Test a deleted video fails the fetch stage"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = None
+
+        with pytest.raises(LookupError):
+            fetch_video("a", "/s", "worker-1")
+
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.storage")
+    @patch("app.worker.videos.settings")
+    @patch("app.worker.videos.SessionLocal")
+    def test_publish_video_s3(
+        self, mock_session_local, mock_settings, mock_storage, mock_finish, tmp_path
+    ):
+        """Test publish uploads the output and records the transcode"""
+        mock_settings.STORAGE_BACKEND = "s3"
+        output = tmp_path / "processed.mp4"
+        output.write_bytes(b"video")
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock()
+
+        job = VideoJob("a", "in.mp4", str(output), "processed/a.mp4", None, "copy", 1.5)
+        publish_video(job, "worker-1")
+
+        mock_storage.upload_fileobj.assert_called_once()
+        assert mock_storage.upload_fileobj.call_args.args[1] == "processed/a.mp4"
+        assert mock_finish.call_args.args == (db, "a", "worker-1", "processed")
+        values = mock_finish.call_args.kwargs
+        assert (values["is_published"], values["processed_file_path"]) == (True, "processed/a.mp4")
+        assert (values["transcode_strategy"], values["transcode_cpu_seconds"]) == ("copy", 1.5)
+
+    @patch("app.worker.videos.finish_video", return_value=False)
+    @patch("app.worker.videos.SessionLocal")
+    def test_publish_video_lease_lost(self, mock_session_local, _, tmp_path):
+        """Test publish refuses to mark a video another worker took over"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock()
+
+        with pytest.raises(VideoLeased):
+            publish_video(
+                VideoJob("a", "in.mp4", str(tmp_path / "out.mp4"), "processed/a.mp4"), "w"
+            )
@@ -0,0 +1,150 @@
+"""Tests for the probe stage and transcoding strategy selection"""
+
+import re
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from app.worker import transcoding
+from app.worker.mp4 import MediaInfo
+from app.worker.probe import choose_strategy, probe
+from app.worker.transcoding import COPY, FULL, OVERLAY, FFmpegEngine, TranscodeSpec, find_ffmpeg
+from app.worker.watermark import WatermarkCache
+
+FFMPEG = find_ffmpeg()
+requires_ffmpeg = pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not available")
+
+READY = MediaInfo(
+    duration=12, video_codec="h264", width=1280, height=720, yuv420=True, audio_codec="aac"
+)
+ALL_STRATEGIES = (FULL, OVERLAY, COPY)
+
+
+def _make_video(path, size="1280x720", video=("libx264", "-pix_fmt", "yuv420p"), audio="aac"):
+    command = [FFMPEG, "-hide_banner", "-loglevel", "error", "-y"]
+    command += ["-f", "lavfi", "-i", f"testsrc=size={size}:rate=10:duration=4"]
+    command += ["-f", "lavfi", "-i", "sine=duration=4"]
+    command += ["-c:v", *video, "-c:a", audio, "-shortest", str(path)]
+    subprocess.run(command, check=True)
+    return str(path)
+
+
+def _streams(path):
+    output = subprocess.run([FFMPEG, "-hide_banner", "-i", path], capture_output=True, text=True)
+    h, m, s = re.search(r"Duration: (\d+):(\d+):([\d.]+)", output.stderr).groups()
+    return output.stderr, int(h) * 3600 + int(m) * 60 + float(s)
+
+
+class TestChooseStrategy:
+    """Tests for choose_strategy"""
+
+    def test_ready_source_only_needs_overlay(self):
+        """Test an H.264/AAC 720p source skips scaling"""
+        assert choose_strategy(READY, TranscodeSpec(), ALL_STRATEGIES) == OVERLAY
+
+    def test_no_watermark_is_stream_copy(self):
+        """Test a spec without watermark only trims"""
+        spec = TranscodeSpec(watermark_text="")
+
+        assert choose_strategy(READY, spec, ALL_STRATEGIES) == COPY
+
+    @pytest.mark.parametrize(
+        "changes",
+        [
+            {"height": 1080, "width": 1920},
+            {"height": 480, "width": 854},  # still scaled up to 720p
+            {"video_codec": "hvc1"},
+            {"yuv420": False},
+            {"rotated": True},
+            {"audio_codec": "mp4a"},
+        ],
+    )
+    def test_mismatches_need_full_transcode(self, changes):
+        """Test any stream that doesn't match the output spec forces FULL"""
+        info = MediaInfo(**{**READY.__dict__, **changes})
+
+        assert choose_strategy(info, TranscodeSpec(), ALL_STRATEGIES) == FULL
+
+    def test_renditions_need_full_transcode(self):
+        """Test extra renditions are always scaled from decoded frames"""
+        spec = TranscodeSpec(renditions=(360,))
+
+        assert choose_strategy(READY, spec, ALL_STRATEGIES) == FULL
+
+    def test_unknown_source(self):
+        """Test unprobeable sources are transcoded in full"""
+        assert choose_strategy(None, TranscodeSpec(), ALL_STRATEGIES) == FULL
+
+    def test_engine_without_fast_paths(self):
+        """Test engines that only implement FULL always get FULL"""
+        assert choose_strategy(READY, TranscodeSpec()) == FULL
+
+
+@requires_ffmpeg
+class TestProbe:
+    """Tests for probe on real files"""
+
+    def test_h264_aac_720p(self, tmp_path):
+        """Test codecs, dimensions and duration are read from the moov box"""
+        info = probe(_make_video(tmp_path / "a.mp4"))
+
+        assert info.video_codec == "h264" and info.audio_codec == "aac"
+        assert (info.width, info.height) == (1280, 720)
+        assert info.yuv420 and not info.rotated
+        assert info.duration == pytest.approx(4, abs=0.1)
+
+    def test_yuv444_is_not_420(self, tmp_path):
+        """Test high 4:4:4 H.264 is flagged as needing a re-encode"""
+        info = probe(_make_video(tmp_path / "a.mp4", video=("libx264", "-pix_fmt", "yuv444p")))
+
+        assert info.video_codec == "h264" and not info.yuv420
+
+    def test_other_codecs(self, tmp_path):
+        """Test non-H.264 video and MP3 audio are reported as such"""
+        info = probe(_make_video(tmp_path / "a.mp4", video=("mpeg4",), audio="libmp3lame"))
+
+        assert info.video_codec == "mp4v"
+        assert info.audio_codec == "mp4a"
+
+    def test_not_an_mp4(self, tmp_path):
+        """Test unreadable files probe as None"""
+        path = tmp_path / "a.webm"
+        path.write_bytes(b"\x1a\x45\xdf\xa3" + b"\x00" * 64)
+
+        assert probe(str(path)) is None
+
+
+@requires_ffmpeg
+class TestFastPaths:
+    """Tests for the OVERLAY and COPY strategies on real files"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_watermarks(self, tmp_path):
+        with patch.object(
+            transcoding, "watermark_cache", WatermarkCache(str(tmp_path / "wm"), storage_prefix="")
+        ):
+            yield
+
+    def test_overlay(self, tmp_path):
+        """Test OVERLAY keeps the resolution and trims"""
+        source = _make_video(tmp_path / "a.mp4")
+        output = str(tmp_path / "out.mp4")
+
+        FFmpegEngine().transcode(source, output, TranscodeSpec(max_duration=2), OVERLAY)
+
+        stderr, duration = _streams(output)
+        assert "1280x720" in stderr and "aac" in stderr
+        assert duration == pytest.approx(2, abs=0.15)
+
+    def test_copy(self, tmp_path):
+        """Test COPY remuxes the streams untouched"""
+        source = _make_video(tmp_path / "a.mp4")
+        output = str(tmp_path / "out.mp4")
+
+        FFmpegEngine().transcode(source, output, TranscodeSpec(max_duration=2), COPY)
+
+        stderr, duration = _streams(output)
+        assert "h264" in stderr and "1280x720" in stderr
+        # Stream copy cuts on packet boundaries, not exact frames
+        assert duration == pytest.approx(2, abs=0.3)
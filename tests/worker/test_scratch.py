@@ -0,0 +1,92 @@
+"""Tests for the worker scratch space"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.worker.scratch import ScratchSpace
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    return ScratchSpace(str(tmp_path / "scratch"), job_bytes=10 * MB, reserve=0, quota=0)
+
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+
+
+class TestJob:
+    """Tests for per-job directories"""
+
+    def test_job_directory_removed_on_exit(self, scratch):
+        """Test everything a job writes goes away with it"""
+        with scratch.job("video-1") as path:
+            assert os.path.dirname(path) == scratch.root
+            assert os.path.basename(path).startswith("job-video-1-")
+            _write(os.path.join(path, "original.mp4"), 1024)
+
+        assert not os.path.exists(path)
+
+    def test_job_directory_removed_on_error(self, scratch):
+        """Test failed jobs don't leak files either"""
+        with pytest.raises(RuntimeError):
+            with scratch.job("video-1") as path:
+                _write(os.path.join(path, "partial.mp4"), 1024)
+                raise RuntimeError("ffmpeg crashed")
+
+        assert not os.path.exists(path)
+
+    def test_jobs_are_isolated(self, scratch):
+        """Test concurrent jobs for the same video get separate directories"""
+        with scratch.job("video-1") as first, scratch.job("video-1") as second:
+            assert first != second
+
+
+class TestCapacity:
+    """Tests for the scratch space budget"""
+
+    def test_free_space_and_reserve(self, scratch):
+        """Test capacity is free space minus the reserve, in job-sized units"""
+        free = 100 * MB
+        with patch("app.worker.scratch.shutil.disk_usage") as disk_usage:
+            disk_usage.return_value.free = free
+            assert scratch.capacity() == 10
+
+            scratch.reserve = 35 * MB
+            assert scratch.capacity() == 6
+            # Running jobs may still grow to a full job each
+            assert scratch.capacity(reserved_jobs=2) == 4
+            assert scratch.capacity(reserved_jobs=9) == 0
+
+    def test_quota(self, scratch):
+        """Test WORKER_SCRATCH_QUOTA caps what the root may use"""
+        scratch.quota = 25 * MB
+
+        with scratch.job("video-1") as path:
+            _write(os.path.join(path, "original.mp4"), 6 * MB)
+            assert scratch.usage() >= 6 * MB
+            assert scratch.capacity() == 1
+
+        assert scratch.capacity() == 2  # 25 MB // 10 MB
+
+
+class TestCleanupOrphans:
+    """Tests for startup cleanup"""
+
+    def test_removes_only_job_directories(self, scratch):
+        """Test leftover job directories are deleted and other files kept"""
+        os.makedirs(os.path.join(scratch.root, "job-video-1-abc"))
+        _write(os.path.join(scratch.root, "job-video-1-abc", "original.mp4"), 1024)
+        _write(os.path.join(scratch.root, "unrelated.txt"), 10)
+
+        assert scratch.cleanup_orphans() == 1
+        assert os.listdir(scratch.root) == ["unrelated.txt"]
+
+    def test_missing_root(self, tmp_path):
+        """Test cleanup of a root that doesn't exist yet is a no-op"""
+        assert ScratchSpace(str(tmp_path / "missing")).cleanup_orphans() == 0
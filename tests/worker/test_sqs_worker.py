@@ -1,9 +1,15 @@
 """Tests for SQS worker main loop and message processing"""
 import json
+import os
 import signal
-from unittest.mock import patch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, mock_open, patch
+
+import pytest
 
 from app.worker import sqs_worker
+from app.worker.scratch import ScratchSpace
 
 
 class TestSignalHandler:
@@ -21,95 +27,298 @@ class TestSignalHandler:
         assert sqs_worker.shutdown_requested is True
 
 
-class TestProcessMessage:
-    """Tests for process_message function"""
+def _message(video_id, receipt_handle=None):
+    return {
+        "Body": json.dumps({"video_id": video_id}),
+        "ReceiptHandle": receipt_handle or f"receipt-{video_id}",
+    }
+
+
+@pytest.fixture
+def mock_sqs_service():
+    with patch("app.worker.sqs_worker.sqs_service") as mock:
+        mock.receive_messages.return_value = []
+        yield mock
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    """Scratch space in the test's directory with room for any number of jobs"""
+    return ScratchSpace(str(tmp_path / "scratch"), job_bytes=1, reserve=0, quota=0)
+
+
+@pytest.fixture
+def worker(scratch):
+    """ConcurrentWorker backed by threads instead of processes"""
+    worker = sqs_worker.ConcurrentWorker(
+        concurrency=3,
+        executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+        heartbeat=MagicMock(),
+        scratch=scratch,
+    )
+    worker.start()
+    yield worker
+    worker.shutdown()
+
+
+class TestConcurrentWorker:
+    """Tests for ConcurrentWorker"""
 
-    @patch("app.worker.sqs_worker.sqs_service")
     @patch("app.worker.sqs_worker.process_video_sync")
-    def test_process_message_success(self, mock_process_video, mock_sqs_service):
-        """Test successful message processing"""
-        message = {
-            "Body": json.dumps({"video_id": "video123"}),
-            "ReceiptHandle": "receipt123",
+    def test_poll_receives_only_free_slots(self, mock_process_video, mock_sqs_service, worker):
+        """Test the worker never asks for more messages than it can start"""
+        release = threading.Event()
+        mock_process_video.side_effect = lambda video_id, owner, profile=None: release.wait(5) and {
+            "status": "success"
         }
+        mock_sqs_service.receive_messages.return_value = [_message("a"), _message("b")]
 
-        mock_process_video.return_value = {"status": "success"}
+        assert worker.poll() == 2
+        mock_sqs_service.receive_messages.assert_called_with(max_messages=3, wait_time=20)
 
-        result = sqs_worker.process_message(message)
+        mock_sqs_service.receive_messages.return_value = [_message("c")]
+        assert worker.poll() == 1
+        # Busy workers use a short poll so finished jobs are reaped promptly
+        mock_sqs_service.receive_messages.assert_called_with(max_messages=1, wait_time=1)
 
-        assert result is True
-        mock_process_video.assert_called_once_with("video123")
-        mock_sqs_service.delete_message.assert_called_once_with("receipt123")
+        mock_sqs_service.receive_messages.reset_mock()
+        assert worker.poll() == 0
+        mock_sqs_service.receive_messages.assert_not_called()
+        release.set()
 
-    @patch("app.worker.sqs_worker.sqs_service")
     @patch("app.worker.sqs_worker.process_video_sync")
-    def test_process_message_processing_failed(self, mock_process_video, mock_sqs_service):
-        """Test message processing when video processing fails"""
-        message = {
-            "Body": json.dumps({"video_id": "video123"}),
-            "ReceiptHandle": "receipt123",
+    def test_jobs_run_concurrently(self, mock_process_video, mock_sqs_service, worker):
+        """Test received messages are processed in parallel"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def process(video_id, owner, profile=None):
+            barrier.wait()  # Only passes if all three jobs run at the same time
+            return {"status": "success"}
+
+        mock_process_video.side_effect = process
+        mock_sqs_service.receive_messages.return_value = [_message(v) for v in "abc"]
+
+        worker.poll()
+        while worker.in_flight:
+            worker.reap(timeout=5)
+
+        assert worker.messages_processed == 3
+        assert {c.args[0] for c in mock_sqs_service.delete_message.call_args_list} == {
+            "receipt-a",
+            "receipt-b",
+            "receipt-c",
         }
 
-        mock_process_video.return_value = {
-            "status": "failed",
-            "error": "Processing error",
+    @patch("app.worker.sqs_worker.process_video_sync")
+    def test_reap_leaves_failed_jobs_for_retry(self, mock_process_video, mock_sqs_service, worker):
+        """Test failed or crashed jobs are not deleted from the queue"""
+        results = {
+            "ok": {"status": "success"},
+            "failed": {"status": "failed", "error": "bad codec"},
         }
 
-        result = sqs_worker.process_message(message)
+        def process(video_id, owner, profile=None):
+            if video_id == "boom":
+                raise RuntimeError("crash")
+            return results[video_id]
+
+        mock_process_video.side_effect = process
+        mock_sqs_service.receive_messages.return_value = [
+            _message("ok"),
+            _message("failed"),
+            _message("boom"),
+        ]
+
+        worker.poll()
+        while worker.in_flight:
+            worker.reap(timeout=5)
 
-        assert result is False
-        mock_process_video.assert_called_once_with("video123")
-        # Message should NOT be deleted on failure (let SQS retry)
-        mock_sqs_service.delete_message.assert_not_called()
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-ok")
+        assert worker.messages_processed == 1
 
-    @patch("app.worker.sqs_worker.sqs_service")
     @patch("app.worker.sqs_worker.process_video_sync")
-    def test_process_message_invalid_json(self, mock_process_video, mock_sqs_service):
-        """Test processing message with invalid JSON"""
-        message = {
-            "Body": "invalid json{",
-            "ReceiptHandle": "receipt123",
-        }
+    def test_reap_deletes_skipped_duplicates(self, mock_process_video, mock_sqs_service, worker):
+        """Test a duplicate of a video leased by another worker isn't redelivered"""
+        mock_process_video.return_value = {"status": "skipped", "message": "leased"}
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+
+        worker.poll()
+        while worker.in_flight:
+            worker.reap(timeout=5)
 
-        result = sqs_worker.process_message(message)
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-a")
+        worker.heartbeat.untrack.assert_called_once_with("receipt-a")
+        assert worker.messages_processed == 0
 
-        assert result is False
+    @patch("app.worker.sqs_worker.process_video_sync")
+    def test_malformed_messages_deleted_not_dispatched(
+        self, mock_process_video, mock_sqs_service, worker
+    ):
+        """Test malformed messages are dropped before reaching the pool"""
+        mock_sqs_service.receive_messages.return_value = [
+            {"Body": "not json", "ReceiptHandle": "bad"}
+        ]
+
+        assert worker.poll() == 0
+        mock_sqs_service.delete_message.assert_called_once_with("bad")
         mock_process_video.assert_not_called()
-        # Malformed messages should be deleted to avoid blocking queue
-        mock_sqs_service.delete_message.assert_called_once_with("receipt123")
 
-    @patch("app.worker.sqs_worker.sqs_service")
+    def test_malformed_message_delete_failure_ignored(self, mock_sqs_service, worker):
+        """Test a failed delete of a malformed message doesn't break polling"""
+        mock_sqs_service.delete_message.side_effect = Exception("Delete failed")
+        mock_sqs_service.receive_messages.return_value = [
+            {"Body": "not json", "ReceiptHandle": "bad"},
+            _message("a"),
+        ]
+
+        with patch("app.worker.sqs_worker.process_video_sync", return_value={"status": "failed"}):
+            assert worker.poll() == 1
+            while worker.in_flight:
+                worker.reap(timeout=5)
+
+        mock_sqs_service.delete_message.assert_called_once_with("bad")
+
     @patch("app.worker.sqs_worker.process_video_sync")
-    def test_process_message_exception(self, mock_process_video, mock_sqs_service):
-        """Test processing message when exception occurs"""
-        message = {
-            "Body": json.dumps({"video_id": "video123"}),
-            "ReceiptHandle": "receipt123",
-        }
+    def test_poll_passes_encoding_profile(self, mock_process_video, mock_sqs_service, worker):
+        """Test metadata.encoding_profile reaches the pool, unknown ones are ignored"""
+        mock_process_video.return_value = {"status": "success"}
+        mock_sqs_service.receive_messages.return_value = [
+            {
+                "Body": json.dumps(
+                    {"video_id": video_id, "metadata": {"encoding_profile": profile}}
+                ),
+                "ReceiptHandle": f"receipt-{video_id}",
+            }
+            for video_id, profile in [("a", "archival"), ("b", "ultra")]
+        ]
+
+        worker.poll()
+        while worker.in_flight:
+            worker.reap(timeout=5)
 
-        mock_process_video.side_effect = Exception("Unexpected error")
+        owner = worker.heartbeat.owner
+        assert sorted(c.args for c in mock_process_video.call_args_list) == [
+            ("a", owner, "archival"),
+            ("b", owner, None),
+        ]
+
+    @patch("app.worker.sqs_worker.process_video_sync")
+    def test_shutdown_waits_for_in_flight(self, mock_process_video, mock_sqs_service, scratch):
+        """Test shutdown lets running transcodes finish and deletes their messages"""
+        started = threading.Event()
 
-        result = sqs_worker.process_message(message)
+        def process(video_id, owner, profile=None):
+            started.set()
+            threading.Event().wait(0.2)
+            return {"status": "success"}
 
-        assert result is False
-        # Message should NOT be deleted on exception (let SQS retry)
-        mock_sqs_service.delete_message.assert_not_called()
+        mock_process_video.side_effect = process
+        mock_sqs_service.receive_messages.return_value = [_message("slow")]
+        worker = sqs_worker.ConcurrentWorker(
+            concurrency=2,
+            executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+            heartbeat=MagicMock(),
+            scratch=scratch,
+        )
+        worker.start()
+        worker.poll()
+        started.wait(5)
+
+        worker.shutdown()
+
+        assert not worker.in_flight
+        mock_sqs_service.delete_message.assert_called_once_with("receipt-slow")
+        worker.heartbeat.stop.assert_called_once()
 
-    @patch("app.worker.sqs_worker.sqs_service")
     @patch("app.worker.sqs_worker.process_video_sync")
-    def test_process_message_invalid_json_delete_fails(self, mock_process_video, mock_sqs_service):
-        """Test processing message with invalid JSON when delete fails"""
-        message = {
-            "Body": "invalid json{",
-            "ReceiptHandle": "receipt123",
+    def test_heartbeat_tracks_in_flight_messages(
+        self, mock_process_video, mock_sqs_service, worker
+    ):
+        """Test messages are kept alive from dispatch until they finish"""
+        release = threading.Event()
+        mock_process_video.side_effect = lambda video_id, owner, profile=None: release.wait(5) and {
+            "status": "failed"
         }
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
 
-        # Make delete raise exception
-        mock_sqs_service.delete_message.side_effect = Exception("Delete failed")
+        worker.poll()
+        worker.heartbeat.track.assert_called_once_with("receipt-a", "a")
+        worker.heartbeat.untrack.assert_not_called()
 
-        result = sqs_worker.process_message(message)
+        release.set()
+        while worker.in_flight:
+            worker.reap(timeout=5)
 
-        assert result is False
-        mock_process_video.assert_not_called()
-        # Should still try to delete despite exception
-        mock_sqs_service.delete_message.assert_called_once_with("receipt123")
+        # Untracked even though the message is left for SQS to retry
+        worker.heartbeat.untrack.assert_called_once_with("receipt-a")
+
+    @patch("app.worker.sqs_worker.process_video_sync")
+    def test_poll_limited_by_scratch_space(
+        self, mock_process_video, mock_sqs_service, worker, scratch
+    ):
+        """Test only as many messages are received as fit in the scratch budget"""
+        scratch.capacity = MagicMock(return_value=1)
+        mock_sqs_service.receive_messages.return_value = [_message("a")]
+
+        worker.poll()
+
+        mock_sqs_service.receive_messages.assert_called_with(max_messages=1, wait_time=20)
+
+    @patch("app.worker.sqs_worker.time.sleep")
+    def test_run_once_waits_when_scratch_full(self, mock_sleep, mock_sqs_service, worker, scratch):
+        """Test a full scratch space pauses receiving instead of spinning"""
+        scratch.capacity = MagicMock(return_value=0)
+
+        worker.run_once()
+
+        mock_sqs_service.receive_messages.assert_not_called()
+        mock_sleep.assert_called_once_with(worker.DISK_WAIT_TIME)
+
+    def test_start_removes_orphaned_scratch(self, scratch):
+        """Test job directories left by a crashed worker are deleted at startup"""
+        with scratch.job("crashed") as path:
+            leftover = path
+        os.makedirs(leftover)
+        worker = sqs_worker.ConcurrentWorker(
+            concurrency=1,
+            executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+            heartbeat=MagicMock(),
+            scratch=scratch,
+        )
+
+        worker.start()
+        worker.shutdown()
+
+        assert not os.path.exists(leftover)
+
+    @patch("app.worker.sqs_worker.settings")
+    def test_concurrency_defaults_to_available_cpus(self, mock_settings):
+        """Test WORKER_CONCURRENCY=0 sizes the pool to the available CPUs"""
+        mock_settings.WORKER_CONCURRENCY = 0
+        with patch("app.worker.sqs_worker.available_cpus", return_value=6):
+            assert sqs_worker.ConcurrentWorker().concurrency == 6
+
+        mock_settings.WORKER_CONCURRENCY = 2
+        assert sqs_worker.ConcurrentWorker().concurrency == 2
+
+
+class TestAvailableCpus:
+    """Tests for available_cpus"""
+
+    @patch("os.sched_getaffinity", return_value=set(range(8)))
+    def test_cgroup_quota_limits_cpus(self, mock_affinity):
+        """Test a container CPU quota caps the affinity count"""
+        with patch("builtins.open", mock_open(read_data="200000 100000\n")):
+            assert sqs_worker.available_cpus() == 2
+
+    @patch("os.sched_getaffinity", return_value=set(range(8)))
+    def test_unlimited_cgroup(self, mock_affinity):
+        """Test an unlimited quota falls back to the affinity count"""
+        with patch("builtins.open", mock_open(read_data="max 100000\n")):
+            assert sqs_worker.available_cpus() == 8
+
+    @patch("os.sched_getaffinity", return_value=set(range(4)))
+    def test_no_cgroup_file(self, mock_affinity):
+        """Test hosts without cgroup v2 use the affinity count"""
+        with patch("builtins.open", side_effect=FileNotFoundError):
+            assert sqs_worker.available_cpus() == 4
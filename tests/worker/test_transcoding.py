@@ -0,0 +1,375 @@
+"""Tests for transcoding engines"""
+
+import re
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.worker import transcoding
+from app.worker.transcoding import (
+    POSTER,
+    SPRITE,
+    FFmpegEngine,
+    MoviePyEngine,
+    PreviewSpec,
+    TranscodeError,
+    TranscodeSpec,
+    find_ffmpeg,
+    get_profile,
+    get_transcoder,
+    parse_renditions,
+    preview_path,
+    rendition_path,
+)
+from app.worker.watermark import WatermarkCache
+
+FFMPEG = find_ffmpeg()
+requires_ffmpeg = pytest.mark.skipif(FFMPEG is None, reason="ffmpeg not available")
+
+
+@pytest.fixture(autouse=True)
+def clear_engine_cache():
+    transcoding._engines.clear()
+    yield
+    transcoding._engines.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_watermarks(tmp_path):
+    """Render watermarks into the test's own directory"""
+    with patch.object(
+        transcoding, "watermark_cache", WatermarkCache(str(tmp_path / "wm"), storage_prefix="")
+    ):
+        yield
+
+
+@pytest.fixture
+def sample_video(tmp_path):
+    """A 3 second 320x240 clip with audio"""
+    path = tmp_path / "source.mp4"
+    subprocess.run(
+        [
+            FFMPEG,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=size=320x240:rate=10:duration=3",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=3",
+            "-c:v",
+            "libx264",
+            "-c:a",
+            "aac",
+            "-shortest",
+            str(path),
+        ],
+        check=True,
+    )
+    return str(path)
+
+
+def _probe(path):
+    """Return (width, height, duration) parsed from ffmpeg's input summary"""
+    output = subprocess.run([FFMPEG, "-hide_banner", "-i", path], capture_output=True, text=True)
+    width, height = map(int, re.search(r"Video:.*?(\d{2,5})x(\d{2,5})", output.stderr).groups())
+    h, m, s = re.search(r"Duration: (\d+):(\d+):([\d.]+)", output.stderr).groups()
+    return width, height, int(h) * 3600 + int(m) * 60 + float(s)
+
+
+class TestFFmpegEngine:
+    """Tests for FFmpegEngine"""
+
+    def test_build_command(self):
+        """Test trim, scale and overlay happen in a single invocation"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg", threads=0)
+
+        command = engine.build_command("in.mp4", "out.mp4", "wm.png", TranscodeSpec())
+
+        assert command[0] == "/usr/bin/ffmpeg"
+        # -t before -i limits how much of the input is read
+        assert command.index("-t") < command.index("in.mp4")
+        assert command[command.index("-t") + 1] == "30"
+        graph = command[command.index("-filter_complex") + 1]
+        assert "scale=-2:720" in graph
+        assert "overlay=x=(W-w)/2:y=H-h" in graph
+        assert "0:a?" in command
+        assert "-threads" not in command
+        # Default balanced profile
+        assert command[command.index("-preset") + 1] == "medium"
+        assert command[command.index("-crf") + 1] == "23"
+        assert command[command.index("-b:a") + 1] == "128k"
+        assert command[-1] == "out.mp4"
+
+    def test_build_command_threads(self):
+        """Test FFMPEG_THREADS is passed through when set"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg", threads=2)
+
+        command = engine.build_command("in.mp4", "out.mp4", "wm.png", TranscodeSpec())
+
+        assert command[command.index("-threads") + 1] == "2"
+
+    @pytest.mark.parametrize(
+        "profile, preset, crf", [("fast", "veryfast", "26"), ("archival", "slow", "18")]
+    )
+    def test_build_command_profile(self, profile, preset, crf):
+        """Test the spec's encoding profile selects preset and CRF"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command(
+            "in.mp4", "out.mp4", "wm.png", TranscodeSpec(profile=profile)
+        )
+
+        assert command[command.index("-preset") + 1] == preset
+        assert command[command.index("-crf") + 1] == crf
+
+    def test_build_command_overlay(self):
+        """Test OVERLAY drops the scale filter and copies the audio"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command(
+            "in.mp4", "out.mp4", "wm.png", TranscodeSpec(), transcoding.OVERLAY
+        )
+
+        graph = command[command.index("-filter_complex") + 1]
+        assert "scale" not in graph
+        assert graph.startswith("[0:v][1:v]overlay")
+        assert command[command.index("-c:a") + 1] == "copy"
+
+    def test_build_command_copy(self):
+        """Test COPY is a plain remux of the trimmed input"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command("in.mp4", "out.mp4", None, TranscodeSpec(), transcoding.COPY)
+
+        assert command[command.index("-c") + 1] == "copy"
+        assert "-filter_complex" not in command
+        assert command.count("-i") == 1
+
+    def test_build_command_renditions(self):
+        """Test renditions split one decode into separately scaled and encoded outputs"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command(
+            "in.mp4",
+            "out.mp4",
+            "wm720.png",
+            TranscodeSpec(),
+            renditions=[(360, "out_360p.mp4", "wm360.png")],
+        )
+
+        assert command.count("in.mp4") == 1
+        graph = command[command.index("-filter_complex") + 1]
+        assert graph.startswith("[0:v]split=2[in][in360]")
+        assert "[in360]scale=-2:360[base360]" in graph
+        assert "[base360][2:v]overlay" in graph
+        assert command[command.index("wm360.png") - 1] == "-i"
+        # Every output gets its own mapping and encoder options
+        assert command.count("-c:v") == 2
+        assert command.index("[v]") < command.index("out.mp4") < command.index("[v360]")
+        assert command[-1] == "out_360p.mp4"
+
+    def test_build_command_renditions_need_full(self):
+        """Test renditions can't be combined with the fast paths"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        with pytest.raises(ValueError):
+            engine.build_command(
+                "in.mp4",
+                "out.mp4",
+                None,
+                TranscodeSpec(),
+                transcoding.OVERLAY,
+                renditions=[(360, "out_360p.mp4", None)],
+            )
+
+    @patch("app.worker.transcoding.subprocess.run")
+    def test_transcode_failure_raises(self, mock_run, tmp_path):
+        """Test a non-zero exit becomes a TranscodeError with ffmpeg's message"""
+        mock_run.return_value = MagicMock(returncode=1, stderr=b"moov atom not found")
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        with pytest.raises(TranscodeError, match="moov atom not found"):
+            engine.transcode("in.mp4", str(tmp_path / "out.mp4"))
+
+    @patch("app.worker.transcoding.subprocess.run")
+    def test_transcode_timeout_raises(self, mock_run, tmp_path):
+        """Test a stuck ffmpeg is reported as a TranscodeError"""
+        mock_run.side_effect = subprocess.TimeoutExpired("ffmpeg", 5)
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg", timeout=5)
+
+        with pytest.raises(TranscodeError, match="timed out"):
+            engine.transcode("in.mp4", str(tmp_path / "out.mp4"))
+
+    @requires_ffmpeg
+    def test_transcode_real_video(self, sample_video, tmp_path):
+        """Test the output is trimmed and scaled to 720p"""
+        output = str(tmp_path / "out.mp4")
+
+        FFmpegEngine().transcode(sample_video, output, TranscodeSpec(max_duration=2))
+
+        width, height, duration = _probe(output)
+        assert (width, height) == (960, 720)
+        assert duration == pytest.approx(2, abs=0.15)
+
+    @requires_ffmpeg
+    def test_transcode_renditions(self, sample_video, tmp_path):
+        """Test one run writes the main output and every rendition at its own height"""
+        output = str(tmp_path / "out.mp4")
+
+        FFmpegEngine().transcode(
+            sample_video, output, TranscodeSpec(max_duration=2, renditions=(480, 360))
+        )
+
+        assert _probe(output)[:2] == (960, 720)
+        assert _probe(rendition_path(output, 480))[:2] == (640, 480)
+        assert _probe(rendition_path(output, 360))[:2] == (480, 360)
+
+
+class TestRenditions:
+    """Tests for rendition settings and paths"""
+
+    def test_parse_renditions(self):
+        """Test heights are deduplicated, sorted and capped below the output height"""
+        assert parse_renditions("360, 480,720,1080,360") == (480, 360)
+        assert parse_renditions("") == ()
+
+    @pytest.mark.parametrize("value", ["abc", "0", "361"])
+    def test_parse_invalid_renditions(self, value):
+        """Test odd, zero and non-numeric heights are rejected"""
+        with pytest.raises(ValueError):
+            parse_renditions(value)
+
+    def test_rendition_path(self):
+        """Test renditions live next to the main output, for files and storage keys"""
+        assert rendition_path("processed/abc.mp4", 360) == "processed/abc_360p.mp4"
+
+
+class TestPreviews:
+    """Tests for poster and sprite sheet generation"""
+
+    def test_preview_spec(self):
+        """Test sprite rows cover the whole duration and unknown formats are rejected"""
+        assert PreviewSpec(sprite_interval=2, sprite_columns=5).sprite_rows(20) == 2
+        assert PreviewSpec(sprite_interval=2, sprite_columns=5).sprite_rows(21) == 3
+        assert preview_path("processed/abc.mp4", POSTER, "webp") == "processed/abc_poster.webp"
+        with pytest.raises(ValueError):
+            PreviewSpec(format="gif")
+
+    def test_build_command_previews(self):
+        """Test poster and sprite are branches of the top output's filter graph"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command(
+            "in.mp4",
+            "out.mp4",
+            "wm720.png",
+            TranscodeSpec(previews=PreviewSpec()),
+            renditions=[(360, "out_360p.mp4", "wm360.png")],
+        )
+
+        assert command.count("in.mp4") == 1
+        graph = command[command.index("-filter_complex") + 1]
+        # Taken after the watermark, so the poster matches the first frames played
+        assert "overlay=x=(W-w)/2:y=H-h:format=auto[vtop]" in graph
+        assert "[vtop]split=3[v][posterin][spritein]" in graph
+        assert "fps=1/2,scale=-2:90,tile=5x3[sprite]" in graph
+        assert command[-1] == "out_sprite.jpg"
+        assert command.index("out_360p.mp4") < command.index("out_poster.jpg")
+        assert command[command.index("[sprite]") + 1 : command.index("[sprite]") + 3] == [
+            "-frames:v",
+            "1",
+        ]
+
+    def test_build_command_copy_previews(self):
+        """Test COPY still stream copies the video and decodes only for the images"""
+        engine = FFmpegEngine(binary="/usr/bin/ffmpeg")
+
+        command = engine.build_command(
+            "in.mp4", "out.mp4", None, TranscodeSpec(previews=PreviewSpec()), transcoding.COPY
+        )
+
+        graph = command[command.index("-filter_complex") + 1]
+        assert graph.startswith("[0:v]split=2[posterin][spritein]")
+        assert command[command.index("-c") + 1] == "copy"
+        assert "-c:v" not in command
+        assert command.index("out.mp4") < command.index("out_poster.jpg")
+
+    @requires_ffmpeg
+    @pytest.mark.parametrize("image_format", ["jpg", "webp"])
+    def test_transcode_previews(self, sample_video, tmp_path, image_format):
+        """Test the images are written with the configured grid and thumbnail size"""
+        from PIL import Image
+
+        output = str(tmp_path / "out.mp4")
+        previews = PreviewSpec(
+            format=image_format, sprite_interval=1, sprite_columns=2, thumbnail_height=40
+        )
+
+        FFmpegEngine().transcode(
+            sample_video, output, TranscodeSpec(max_duration=3, height=240, previews=previews)
+        )
+
+        with Image.open(preview_path(output, POSTER, image_format)) as poster:
+            assert poster.size == (320, 240)
+        # 3 thumbnails of 54x40 in a 2x2 grid
+        with Image.open(preview_path(output, SPRITE, image_format)) as sprite:
+            assert sprite.size == (108, 80)
+
+    @requires_ffmpeg
+    def test_poster_of_short_video(self, sample_video, tmp_path):
+        """Test a poster time past the end falls back to the first frame"""
+        output = str(tmp_path / "out.mp4")
+        spec = TranscodeSpec(height=240, previews=PreviewSpec(poster_seconds=60))
+
+        FFmpegEngine().transcode(sample_video, output, spec, transcoding.COPY)
+
+        assert _probe(output)[:2] == (320, 240)
+        assert _probe(preview_path(output, POSTER, "jpg"))[:2] == (320, 240)
+
+
+class TestGetProfile:
+    """Tests for get_profile"""
+
+    @patch("app.worker.transcoding.settings")
+    def test_default_from_settings(self, mock_settings):
+        """Test ENCODING_PROFILE is used when no name is given"""
+        mock_settings.ENCODING_PROFILE = "fast"
+
+        assert get_profile().name == "fast"
+        assert get_profile("archival").name == "archival"
+
+    def test_unknown_profile(self):
+        """Test unknown profile names are rejected"""
+        with pytest.raises(ValueError):
+            get_profile("ultra")
+
+
+class TestGetTranscoder:
+    """Tests for get_transcoder"""
+
+    @patch("app.worker.transcoding.settings")
+    def test_default_engine_from_settings(self, mock_settings):
+        """Test TRANSCODER_ENGINE selects the engine, created once per process"""
+        mock_settings.TRANSCODER_ENGINE = "moviepy"
+
+        engine = get_transcoder()
+
+        assert isinstance(engine, MoviePyEngine)
+        assert get_transcoder() is engine
+
+    @patch("app.worker.transcoding.find_ffmpeg", return_value=None)
+    def test_falls_back_to_moviepy_without_ffmpeg(self, mock_find):
+        """Test a missing ffmpeg binary falls back to the moviepy engine"""
+        assert isinstance(get_transcoder("ffmpeg"), MoviePyEngine)
+
+    def test_unknown_engine(self):
+        """Test unknown engine names are rejected"""
+        with pytest.raises(ValueError):
+            get_transcoder("gstreamer")
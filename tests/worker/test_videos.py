@@ -3,8 +3,16 @@ from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
+from app.core.config import settings
+from app.db import models
+from app.worker.cache import OUTPUT_COLUMNS
+from app.worker.transcoding import PROFILES
 from app.worker.videos import (
+    REUSED,
+    _cache_output,
     _cleanup_temp_files,
+    _output_version,
+    _reuse_cached_output,
     ensure_directory_exists,
     process_video_sync,
     resolve_container_path,
@@ -140,6 +148,8 @@ class TestCleanupTempFiles:
 class TestProcessVideoSync:
     """Tests for process_video_sync function"""
 
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
     @patch("app.worker.videos._cleanup_temp_files")
     @patch("app.worker.videos._process_video_file")
     @patch("app.worker.videos._setup_file_paths")
@@ -152,6 +162,7 @@ class TestProcessVideoSync:
         mock_setup,
         mock_process,
         mock_cleanup,
+        mock_finish,
         tmp_path,
     ):
         """Test successful video processing with local storage"""
@@ -163,7 +174,7 @@ class TestProcessVideoSync:
         mock_session_local.return_value = mock_db
 
         # Mock video object
-        mock_video = Mock()
+        mock_video = Mock(source_sha256=None)
         mock_video.id = "video123"
         mock_video.status = "pending"
         mock_video.original_file_path = str(tmp_path / "orig.mp4")
@@ -175,13 +186,17 @@ class TestProcessVideoSync:
         orig_path = str(tmp_path / "orig.mp4")
         proc_path = str(tmp_path / "proc.mp4")
         mock_setup.return_value = (orig_path, proc_path, None, None)
+        mock_process.return_value = ("overlay", 1.5)
 
-        result = process_video_sync("video123")
+        result = process_video_sync("video123", "worker-1")
 
         assert result["status"] == "success"
-        assert mock_video.status == "processed"
-        assert mock_video.is_published is True
-        mock_db.commit.assert_called()
+        assert mock_finish.call_args.args == (mock_db, "video123", "worker-1", "processed")
+        values = mock_finish.call_args.kwargs
+        assert values["is_published"] is True
+        # The strategy and its CPU cost are recorded on the video
+        assert values["transcode_strategy"] == "overlay"
+        assert values["transcode_cpu_seconds"] == 1.5
 
     @patch("app.worker.videos._cleanup_temp_files")
     @patch("app.worker.videos.SessionLocal")
@@ -191,11 +206,12 @@ class TestProcessVideoSync:
         mock_session_local.return_value = mock_db
         mock_db.query.return_value.filter.return_value.first.return_value = None
 
-        result = process_video_sync("nonexistent")
+        result = process_video_sync("nonexistent", "worker-1")
 
         assert result["status"] == "failed"
         assert result["error"] == "Video not found"
 
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
     @patch("app.worker.videos._cleanup_temp_files")
     @patch("app.worker.videos._setup_file_paths")
     @patch("app.worker.videos.SessionLocal")
@@ -206,7 +222,7 @@ class TestProcessVideoSync:
         mock_db = MagicMock()
         mock_session_local.return_value = mock_db
 
-        mock_video = Mock()
+        mock_video = Mock(source_sha256=None)
         mock_video.id = "video123"
         mock_video.status = "pending"
         mock_db.query.return_value.filter.return_value.first.return_value = mock_video
@@ -214,7 +230,189 @@ class TestProcessVideoSync:
         # Make setup raise an exception
         mock_setup.side_effect = Exception("Processing failed")
 
-        result = process_video_sync("video123")
+        result = process_video_sync("video123", "worker-1")
 
         assert result["status"] == "failed"
         assert "Processing failed" in result["error"]
+
+
+class TestProcessingLease:
+    """Tests for the processing lease taken by process_video_sync"""
+
+    @patch("app.worker.videos.claim_video", return_value=False)
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_lost_claim_is_skipped(self, mock_session_local, mock_setup, mock_claim):
+        """Test a video another worker holds is skipped without touching it"""
+        video = Mock(status="processing")
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = video
+
+        result = process_video_sync("video123", "worker-1")
+
+        assert result["status"] == "skipped"
+        mock_claim.assert_called_once_with(db, "video123", "worker-1")
+        mock_setup.assert_not_called()
+        assert video.status == "processing"
+
+    @patch("app.worker.videos.claim_video", Mock(return_value=False))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_duplicate_of_processed_video_succeeds(self, mock_session_local, mock_setup):
+        """Test a redelivered message of a processed video is acknowledged"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock(status="processed")
+
+        assert process_video_sync("video123", "worker-1")["status"] == "success"
+        mock_setup.assert_not_called()
+
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._cleanup_temp_files")
+    @patch("app.worker.videos._process_video_file", return_value=("copy", 0.1))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_lease_released_when_done(
+        self, mock_session_local, mock_setup, mock_process, mock_cleanup, mock_finish, tmp_path
+    ):
+        """Test the final status is set by the lease owner only, success or failure"""
+        for failure, status in ((None, "processed"), (Exception("Processing failed"), "failed")):
+            db = mock_session_local.return_value
+            db.query.return_value.filter.return_value.first.return_value = Mock(source_sha256=None)
+            mock_setup.return_value = ("in.mp4", str(tmp_path / "out.mp4"), None, None)
+            mock_process.side_effect = failure
+
+            process_video_sync("video123", "worker-1")
+
+            assert mock_finish.call_args.args == (db, "video123", "worker-1", status)
+
+    @patch("app.worker.videos.finish_video", return_value=False)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._cleanup_temp_files")
+    @patch("app.worker.videos._process_video_file", Mock(return_value=("copy", 0.1)))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_lease_lost_is_skipped(self, mock_session_local, mock_setup, _, mock_finish, tmp_path):
+        """Test a video taken over mid-transcode is left to its new owner"""
+        db = mock_session_local.return_value
+        db.query.return_value.filter.return_value.first.return_value = Mock(source_sha256=None)
+        mock_setup.return_value = ("in.mp4", str(tmp_path / "out.mp4"), None, None)
+
+        assert process_video_sync("video123", "worker-1")["status"] == "skipped"
+        mock_finish.assert_called_once()
+
+
+class TestOutputReuse:
+    """Tests for reusing cached outputs of the same source and pipeline version"""
+
+    @pytest.fixture
+    def user(self, db):
+        user = models.User(
+            first_name="Reuse",
+            last_name="User",
+            email="reuse@example.com",
+            password="password",
+            city="City",
+            country="Country",
+        )
+        db.add(user)
+        db.commit()
+        return user
+
+    @pytest.fixture
+    def entry(self, db):
+        entry = models.ProcessedOutput(
+            source_sha256="a" * 64,
+            pipeline_version=_output_version(),
+            processed_file_path="processed/p.mp4",
+            renditions=[{"height": 720, "width": 1280, "bandwidth": 1, "path": "p.mp4"}],
+            poster_path="processed/p_poster.jpg",
+            sprite={"path": "processed/p_sprite.jpg"},
+            hls_playlist_path="processed/p_hls/master.m3u8",
+        )
+        db.add(entry)
+        db.commit()
+        return entry
+
+    def _video(self, db, user, status="pending", sha256="a" * 64):
+        video = models.Video(
+            user_id=user.id,
+            title="Clip",
+            original_file_path=f"uploads/{sha256}.mp4",
+            processed_file_path=f"processed/{models.generate_uuid()}.mp4",
+            status=status,
+            source_sha256=sha256,
+            lease_owner="worker-1",
+        )
+        db.add(video)
+        db.commit()
+        return video
+
+    @patch("app.worker.cache.storage")
+    def test_reuses_cached_output(self, mock_storage, db, user, entry):
+        """Test every output column is shared and the video is published without a transcode"""
+        mock_storage.file_exists.return_value = True
+        video = self._video(db, user)
+
+        assert _reuse_cached_output(db, video, "worker-1") is True
+
+        db.refresh(video)
+        for column in OUTPUT_COLUMNS:
+            assert getattr(video, column) == getattr(entry, column)
+        assert (video.status, video.is_published) == ("processed", True)
+        assert (video.transcode_strategy, video.transcode_cpu_seconds) == (REUSED, 0.0)
+        assert video.lease_owner is None
+
+    @patch("app.worker.cache.storage")
+    def test_reuse_keeps_video_taken_over(self, mock_storage, db, user, entry):
+        """Test a worker whose lease was taken over doesn't overwrite the new owner's video"""
+        mock_storage.file_exists.return_value = True
+        video = self._video(db, user, "processing")
+
+        assert _reuse_cached_output(db, video, "worker-2") is True
+
+        db.refresh(video)
+        assert (video.status, video.lease_owner) == ("processing", "worker-1")
+        assert video.processed_file_path != entry.processed_file_path
+
+    @patch("app.worker.cache.storage")
+    def test_other_source_or_version_misses(self, mock_storage, db, user, entry):
+        """Test a different source or processing parameters transcode again"""
+        mock_storage.file_exists.return_value = True
+
+        assert _reuse_cached_output(db, self._video(db, user, sha256="b" * 64), "worker-1") is False
+        other = next(name for name in PROFILES if name != settings.ENCODING_PROFILE)
+        assert _reuse_cached_output(db, self._video(db, user), "worker-1", other) is False
+
+    @patch("app.worker.videos.settings")
+    def test_disabled(self, mock_settings, db, user, entry):
+        """Test PROCESSED_OUTPUT_CACHE=False always transcodes"""
+        mock_settings.PROCESSED_OUTPUT_CACHE = False
+
+        assert _reuse_cached_output(db, self._video(db, user), "worker-1") is False
+
+    @patch("app.worker.cache.storage")
+    def test_stores_outputs_once_uploaded(self, mock_storage, db, user):
+        """Test a transcoded video's outputs become a cache entry for the next upload"""
+        mock_storage.file_exists.return_value = True
+        outputs = {column: None for column in OUTPUT_COLUMNS}
+        outputs.update(processed_file_path="processed/v.mp4", poster_path="processed/v_poster.jpg")
+
+        _cache_output(db, "a" * 64, outputs)
+
+        reupload = self._video(db, user)
+        assert _reuse_cached_output(db, reupload, "worker-1") is True
+        db.refresh(reupload)
+        assert reupload.processed_file_path == "processed/v.mp4"
+        assert reupload.poster_path == "processed/v_poster.jpg"
+
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._reuse_cached_output", return_value=True)
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.SessionLocal")
+    def test_process_video_sync_skips_transcode(self, mock_session_local, mock_setup, _):
+        """Test a reused video succeeds without fetching or transcoding its source"""
+        result = process_video_sync("video123", "worker-1")
+
+        assert result["status"] == "success"
+        mock_setup.assert_not_called()
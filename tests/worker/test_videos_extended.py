@@ -1,18 +1,24 @@
 """Extended tests for video processing worker to achieve 100% coverage"""
+from dataclasses import replace
 from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
-from app.worker.videos import _setup_file_paths, process_video_sync
+from app.worker.transcoding import DEFAULT_SPEC, PreviewSpec
+from app.worker.videos import (
+    _describe_previews,
+    _rendition_manifest,
+    _setup_file_paths,
+    process_video_sync,
+)
 
 
 class TestSetupFilePathsExtended:
     """Extended tests for _setup_file_paths function"""
 
-    @patch("app.worker.videos.tempfile.NamedTemporaryFile")
-    @patch("app.worker.videos.storage")
-    def test_setup_file_paths_s3_with_write(self, mock_storage, mock_tempfile):
-        """Test S3 setup with actual file writes"""
+    @patch("app.worker.videos.fetch_source")
+    def test_setup_file_paths_s3_with_write(self, mock_fetch, tmp_path):
+        """Test S3 setup fetches the original into the job's scratch directory"""
         # Mock settings
         mock_settings = Mock()
         mock_settings.STORAGE_BACKEND = "s3"
@@ -23,34 +29,16 @@ class TestSetupFilePathsExtended:
         mock_video.original_file_path = "uploads/test.mp4"
         mock_video.processed_file_path = "processed/test.mp4"
 
-        # Mock temp files
-        mock_temp_orig = Mock()
-        mock_temp_orig.name = "/tmp/orig.mp4"
-        mock_temp_orig.write = Mock()
-        mock_temp_orig.flush = Mock()
-
-        mock_temp_proc = Mock()
-        mock_temp_proc.name = "/tmp/proc.mp4"
-
-        # Setup context managers
-        mock_temp_orig.__enter__ = Mock(return_value=mock_temp_orig)
-        mock_temp_orig.__exit__ = Mock(return_value=None)
-        mock_temp_proc.__enter__ = Mock(return_value=mock_temp_proc)
-        mock_temp_proc.__exit__ = Mock(return_value=None)
+        # Mock the ranged fetch
+        mock_fetch.return_value = Mock(bytes_read=1024)
 
-        mock_tempfile.side_effect = [mock_temp_orig, mock_temp_proc]
+        result = _setup_file_paths(mock_video, mock_settings, str(tmp_path))
 
-        # Mock storage download
-        mock_storage.download_file.return_value = b"video content"
-
-        result = _setup_file_paths(mock_video, mock_settings)
-
-        assert result[0] == "/tmp/orig.mp4"
-        assert result[1] == "/tmp/proc.mp4"
-        assert result[2] == "/tmp/orig.mp4"
-        assert result[3] == "/tmp/proc.mp4"
-        mock_temp_orig.write.assert_called_once_with(b"video content")
-        mock_temp_orig.flush.assert_called_once()
+        original = str(tmp_path / "original.mp4")
+        processed = str(tmp_path / "processed.mp4")
+        assert result == (original, processed, original, processed)
+        mock_fetch.assert_called_once_with("uploads/test.mp4", original, 30)
+        assert mock_video.source_bytes_read == 1024
 
     def test_setup_file_paths_local_permission_error(self, tmp_path):
         """Test local setup with permission error fallback"""
@@ -106,6 +94,8 @@ class TestSetupFilePathsExtended:
 class TestProcessVideoSyncExtended:
     """Extended tests for process_video_sync function"""
 
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
     @patch("app.worker.videos._cleanup_temp_files")
     @patch("app.worker.videos._process_video_file")
     @patch("app.worker.videos._setup_file_paths")
@@ -120,18 +110,20 @@ class TestProcessVideoSyncExtended:
         mock_setup,
         mock_process,
         mock_cleanup,
+        mock_finish,
         tmp_path,
     ):
         """Test video processing with S3 backend"""
         # Mock settings
         mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.HLS_PACKAGING = False
 
         # Mock database
         mock_db = MagicMock()
         mock_session_local.return_value = mock_db
 
         # Mock video
-        mock_video = Mock()
+        mock_video = Mock(source_sha256=None)
         mock_video.id = "video123"
         mock_video.status = "pending"
         mock_video.processed_file_path = "s3://bucket/processed/video123.mp4"
@@ -144,17 +136,20 @@ class TestProcessVideoSyncExtended:
         (tmp_path / "temp_proc.mp4").write_text("processed content")
 
         mock_setup.return_value = (temp_orig, temp_proc, temp_orig, temp_proc)
+        mock_process.return_value = ("full", 12.0)
 
         # Mock storage upload
-        mock_storage.upload_file.return_value = None
+        mock_storage.upload_fileobj.return_value = None
 
-        result = process_video_sync("video123")
+        result = process_video_sync("video123", "worker-1")
 
         assert result["status"] == "success"
-        assert mock_video.status == "processed"
-        # Verify file was uploaded to S3
-        mock_storage.upload_file.assert_called_once()
+        assert mock_finish.call_args.args[3] == "processed"
+        # Verify file was streamed to S3
+        mock_storage.upload_fileobj.assert_called_once()
+        mock_storage.upload_file.assert_not_called()
 
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
     @patch("app.worker.videos._cleanup_temp_files")
     @patch("app.worker.videos._process_video_file")
     @patch("app.worker.videos._setup_file_paths")
@@ -167,7 +162,7 @@ class TestProcessVideoSyncExtended:
         mock_session_local.return_value = mock_db
 
         # First call returns video, second call (in except block) returns None
-        mock_video = Mock()
+        mock_video = Mock(source_sha256=None)
         mock_video.id = "video123"
         mock_video.status = "pending"
 
@@ -189,7 +184,142 @@ class TestProcessVideoSyncExtended:
         # Make setup raise exception
         mock_setup.side_effect = Exception("Processing failed")
 
-        result = process_video_sync("video123")
+        result = process_video_sync("video123", "worker-1")
 
         assert result["status"] == "failed"
         assert "Processing failed" in result["error"]
+
+
+@patch("app.worker.videos.DEFAULT_SPEC", replace(DEFAULT_SPEC, renditions=(480, 360)))
+class TestRenditions:
+    """Tests for the rendition manifest and rendition uploads"""
+
+    def test_manifest_lists_written_renditions(self, tmp_path):
+        """Test every rendition on disk is described, top first, with storage paths"""
+        (tmp_path / "out.mp4").write_bytes(b"x" * 3000)
+        (tmp_path / "out_360p.mp4").write_bytes(b"x" * 750)
+
+        manifest = _rendition_manifest(str(tmp_path / "out.mp4"), "processed/a.mp4")
+
+        # 480p was not written; unprobeable files fall back to the spec's numbers
+        assert manifest == [
+            {"height": 720, "width": None, "bandwidth": 800, "path": "processed/a.mp4"},
+            {"height": 360, "width": None, "bandwidth": 200, "path": "processed/a_360p.mp4"},
+        ]
+
+    def test_single_output_has_no_manifest(self, tmp_path):
+        """Test engines that only write the main output leave renditions empty"""
+        (tmp_path / "out.mp4").write_bytes(b"x")
+
+        assert _rendition_manifest(str(tmp_path / "out.mp4"), "processed/a.mp4") is None
+
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._cleanup_temp_files")
+    @patch("app.worker.videos._process_video_file", return_value=("full", 1.0))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.storage")
+    @patch("app.worker.videos.SessionLocal")
+    @patch("app.worker.videos.settings")
+    def test_s3_uploads_every_rendition(
+        self,
+        mock_settings,
+        mock_session_local,
+        mock_storage,
+        mock_setup,
+        _,
+        __,
+        mock_finish,
+        tmp_path,
+    ):
+        """Test renditions are uploaded next to the processed video and recorded"""
+        mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.HLS_PACKAGING = False
+        video = Mock(processed_file_path="processed/a.mp4", source_sha256=None)
+        mock_session_local.return_value.query.return_value.filter.return_value.first.return_value = (
+            video
+        )
+        processed = tmp_path / "processed.mp4"
+        processed.write_bytes(b"x" * 100)
+        (tmp_path / "processed_360p.mp4").write_bytes(b"x" * 10)
+        mock_setup.return_value = ("in.mp4", str(processed), "in.mp4", str(processed))
+
+        assert process_video_sync("a", "worker-1")["status"] == "success"
+
+        keys = [c.args[1] for c in mock_storage.upload_fileobj.call_args_list]
+        assert keys == ["processed/a.mp4", "processed/a_360p.mp4"]
+        renditions = mock_finish.call_args.kwargs["renditions"]
+        assert [r["height"] for r in renditions] == [720, 360]
+
+
+@patch(
+    "app.worker.videos.DEFAULT_SPEC",
+    replace(DEFAULT_SPEC, max_duration=30, renditions=(), previews=PreviewSpec()),
+)
+class TestPreviewImages:
+    """Tests for the poster and sprite sheet of processed videos"""
+
+    def test_describe_previews(self, tmp_path):
+        """Test the sprite's grid and thumbnail size are recorded with storage paths"""
+        from PIL import Image
+
+        (tmp_path / "out_poster.jpg").write_bytes(b"x")
+        Image.new("RGB", (800, 270)).save(tmp_path / "out_sprite.jpg")
+
+        poster, sprite = _describe_previews(str(tmp_path / "out.mp4"), "processed/a.mp4")
+
+        assert poster == "processed/a_poster.jpg"
+        assert sprite == {
+            "path": "processed/a_sprite.jpg",
+            "interval": 2,
+            "columns": 5,
+            "rows": 3,
+            "width": 160,
+            "height": 90,
+        }
+
+    def test_no_previews_written(self, tmp_path):
+        """Test engines that don't write previews leave both empty"""
+        assert _describe_previews(str(tmp_path / "out.mp4"), "processed/a.mp4") == (None, None)
+
+    @patch("app.worker.videos.finish_video", return_value=True)
+    @patch("app.worker.videos.claim_video", Mock(return_value=True))
+    @patch("app.worker.videos._cleanup_temp_files")
+    @patch("app.worker.videos._process_video_file", return_value=("full", 1.0))
+    @patch("app.worker.videos._setup_file_paths")
+    @patch("app.worker.videos.storage")
+    @patch("app.worker.videos.SessionLocal")
+    @patch("app.worker.videos.settings")
+    def test_s3_uploads_previews(
+        self,
+        mock_settings,
+        mock_session_local,
+        mock_storage,
+        mock_setup,
+        _,
+        __,
+        mock_finish,
+        tmp_path,
+    ):
+        """Test poster and sprite are uploaded next to the processed video and recorded"""
+        from PIL import Image
+
+        mock_settings.STORAGE_BACKEND = "s3"
+        mock_settings.HLS_PACKAGING = False
+        video = Mock(processed_file_path="processed/a.mp4", source_sha256=None)
+        mock_session_local.return_value.query.return_value.filter.return_value.first.return_value = (
+            video
+        )
+        processed = tmp_path / "processed.mp4"
+        processed.write_bytes(b"x" * 100)
+        (tmp_path / "processed_poster.jpg").write_bytes(b"x")
+        Image.new("RGB", (800, 270)).save(tmp_path / "processed_sprite.jpg")
+        mock_setup.return_value = ("in.mp4", str(processed), "in.mp4", str(processed))
+
+        assert process_video_sync("a", "worker-1")["status"] == "success"
+
+        keys = [c.args[1] for c in mock_storage.upload_fileobj.call_args_list]
+        assert keys == ["processed/a.mp4", "processed/a_poster.jpg", "processed/a_sprite.jpg"]
+        values = mock_finish.call_args.kwargs
+        assert values["poster_path"] == "processed/a_poster.jpg"
+        assert values["sprite"]["path"] == "processed/a_sprite.jpg"
@@ -0,0 +1,111 @@
+"""Tests for the watermark overlay cache"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from app.core.storage import LocalStorage, StorageDownloadError
+from app.worker import watermark
+from app.worker.watermark import WatermarkCache, WatermarkKey, render_watermark
+
+TEXT = "ANF Rising Stars Showcase"
+
+
+@pytest.fixture
+def render_spy():
+    with patch.object(watermark, "render_watermark", wraps=render_watermark) as spy:
+        yield spy
+
+
+class TestRenderWatermark:
+    """Tests for render_watermark"""
+
+    def test_renders_transparent_png(self, tmp_path):
+        """Test the watermark is a tightly cropped RGBA image"""
+        path = render_watermark(TEXT, 36, str(tmp_path / "wm.png"))
+
+        image = Image.open(path)
+        assert image.mode == "RGBA"
+        assert image.width > image.height > 0
+        # Transparent background with opaque text pixels
+        alphas = {pixel[3] for pixel in image.getdata()}
+        assert 0 in alphas and 255 in alphas
+
+
+class TestWatermarkKey:
+    """Tests for WatermarkKey"""
+
+    def test_font_scales_with_height(self):
+        """Test the font size is defined at 720p and scaled for other heights"""
+        assert WatermarkKey(TEXT, "", 36, 720).scaled_font_size == 36
+        assert WatermarkKey(TEXT, "", 36, 360).scaled_font_size == 18
+        assert WatermarkKey(TEXT, "", 36, 1080).scaled_font_size == 54
+
+    def test_digest_covers_every_field(self):
+        """Test any change in text, font, size or height gives a new file"""
+        base = WatermarkKey(TEXT, "", 36, 720)
+        variants = [
+            WatermarkKey("other", "", 36, 720),
+            WatermarkKey(TEXT, "/fonts/a.ttf", 36, 720),
+            WatermarkKey(TEXT, "", 40, 720),
+            WatermarkKey(TEXT, "", 36, 480),
+        ]
+
+        assert len({base.filename} | {v.filename for v in variants}) == 5
+
+
+class TestWatermarkCache:
+    """Tests for WatermarkCache"""
+
+    def test_renders_once_per_key(self, tmp_path, render_spy):
+        """Test repeated lookups reuse the rendered PNG"""
+        cache = WatermarkCache(str(tmp_path), storage_prefix="")
+
+        first = cache.get(TEXT, 36, 720)
+        second = cache.get(TEXT, 36, 720)
+        other = cache.get(TEXT, 36, 480)
+
+        assert first == second != other
+        assert render_spy.call_count == 2
+        assert Image.open(other).height < Image.open(first).height
+
+    def test_shared_directory(self, tmp_path, render_spy):
+        """Test a second cache (another pool process) reuses the file on disk"""
+        path = WatermarkCache(str(tmp_path), storage_prefix="").get(TEXT, 36, 720)
+
+        assert WatermarkCache(str(tmp_path), storage_prefix="").get(TEXT, 36, 720) == path
+        assert render_spy.call_count == 1
+        # No temp files left behind
+        assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+    def test_rerenders_deleted_file(self, tmp_path, render_spy):
+        """Test a PNG removed from the cache directory is rendered again"""
+        cache = WatermarkCache(str(tmp_path), storage_prefix="")
+        os.unlink(cache.get(TEXT, 36, 720))
+
+        assert os.path.exists(cache.get(TEXT, 36, 720))
+        assert render_spy.call_count == 2
+
+    def test_storage_round_trip(self, tmp_path, render_spy):
+        """Test the PNG is uploaded once and downloaded by other workers"""
+        prefix = str(tmp_path / "storage")
+        with patch.object(watermark, "storage", LocalStorage()):
+            rendered = WatermarkCache(str(tmp_path / "worker-a"), prefix).get(TEXT, 36, 720)
+            downloaded = WatermarkCache(str(tmp_path / "worker-b"), prefix).get(TEXT, 36, 720)
+
+        assert render_spy.call_count == 1
+        assert os.listdir(prefix) == [os.path.basename(rendered)]
+        assert open(rendered, "rb").read() == open(downloaded, "rb").read()
+
+    def test_storage_errors_fall_back_to_rendering(self, tmp_path, render_spy):
+        """Test storage outages only cost a local render"""
+        with patch.object(watermark, "storage") as mock_storage:
+            mock_storage.file_exists.return_value = True
+            mock_storage.download_file.side_effect = StorageDownloadError("down")
+
+            path = WatermarkCache(str(tmp_path), "assets/watermarks").get(TEXT, 36, 720)
+
+        assert os.path.exists(path)
+        assert render_spy.call_count == 1